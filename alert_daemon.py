@@ -0,0 +1,251 @@
+import argparse
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+
+from binance_client import MAX_KLINES_PER_REQUEST, BinanceClient
+from incremental import IncrementalIndicators
+from kline_store import INTERVAL_MS, align_open_time
+from prefetch import next_close_time
+from scanner import load_symbols
+
+
+class StdoutSink:
+    """每个事件输出一行JSON到标准输出"""
+
+    def __call__(self, event):
+        print(json.dumps(event, ensure_ascii=False), flush=True)
+
+
+class JsonlSink:
+    """每个事件追加一行JSON到文件"""
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, event):
+        with self._lock, open(self.path, 'a') as f:
+            f.write(json.dumps(event, ensure_ascii=False) + '\n')
+
+
+class WebhookSink:
+    """每个事件以JSON POST到指定地址"""
+
+    def __init__(self, url, timeout=5):
+        self.url = url
+        self.timeout = timeout
+        self.session = requests.Session()
+
+    def __call__(self, event):
+        try:
+            self.session.post(self.url, json=event, timeout=self.timeout).raise_for_status()
+        except requests.exceptions.RequestException as e:
+            print(f"Webhook发送错误: {e}", file=sys.stderr)
+
+
+class AlertDaemon:
+    """
+    K线收盘时的均线密集提醒
+    每个 (交易对, 周期) 维护一个增量指标引擎（IncrementalIndicators），启动时用历史K线初始化一次；
+    之后只在各周期K线收盘时唤醒，只获取上次处理之后新收盘的K线并逐根写入引擎，
+    密集区域开始或结束时输出 enter / exit 事件。每根K线的计算量与历史长度无关。
+    """
+
+    def __init__(self, client, watchlist, tolerance=0.03, sinks=None, seed_bars=500, fetch_workers=8, delay=2.0):
+        """
+        :param client: BinanceClient
+        :param watchlist: [(symbol, interval), ...]
+        :param tolerance: 密集容差（小数）
+        :param sinks: 事件输出函数列表，默认输出到标准输出
+        :param seed_bars: 初始化时获取的历史K线数量
+        :param fetch_workers: 并发获取K线的线程数
+        :param delay: 收盘后等待的秒数（给交易所生成新K线的时间）
+        """
+        self.client = client
+        self.tolerance = tolerance
+        self.sinks = sinks if sinks is not None else [StdoutSink()]
+        self.seed_bars = seed_bars
+        self.fetch_workers = fetch_workers
+        self.delay = delay
+        self.entries = {
+            (symbol, interval): {'symbol': symbol, 'interval': interval, 'engine': None, 'last_open_time': None}
+            for symbol, interval in watchlist if interval in INTERVAL_MS
+        }
+        self._stop = threading.Event()
+
+    def _closed_klines(self, symbol, interval, limit):
+        """获取最近 limit 根K线并去掉未收盘的一根"""
+        df = self.client.get_klines(symbol, interval, limit)
+        if df is None:
+            return None
+        return df[df['close_time'] < int(time.time() * 1000)].reset_index(drop=True)
+
+    def _seed(self, entry):
+        df = self._closed_klines(entry['symbol'], entry['interval'], self.seed_bars)
+        if df is None or df.empty:
+            print(f"跳过 {entry['symbol']} {entry['interval']}: 无法获取数据", file=sys.stderr)
+            return
+        engine = IncrementalIndicators(tolerance=self.tolerance)
+        engine.seed(df)
+        entry['engine'] = engine
+        entry['last_open_time'] = int(df['open_time'].iloc[-1])
+
+    def seed(self):
+        """并发初始化所有监控项"""
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+            list(pool.map(self._seed, self.entries.values()))
+        return sum(entry['engine'] is not None for entry in self.entries.values())
+
+    def _update(self, entry):
+        """
+        获取并处理一个监控项自上次以来新收盘的K线
+        :return: 事件列表
+        """
+        if entry['engine'] is None:
+            self._seed(entry)
+            return []
+
+        interval = entry['interval']
+        step = INTERVAL_MS[interval]
+        current_open = align_open_time(int(time.time() * 1000), interval)
+        # 新收盘的K线数量 + 当前未收盘的一根
+        missing = (current_open - entry['last_open_time']) // step
+        if missing <= 1:
+            return []
+        if missing > MAX_KLINES_PER_REQUEST:
+            # 停机太久，直接重新初始化
+            self._seed(entry)
+            return []
+
+        df = self.client.get_klines(entry['symbol'], interval, missing)
+        if df is None:
+            return []
+        # 只取上次处理之后、已经收盘的K线
+        open_times = df['open_time'].to_numpy()
+        closes = df['close'].to_numpy(dtype=float)
+        new = (open_times > entry['last_open_time']) & (df['close_time'].to_numpy() < int(time.time() * 1000))
+
+        events = []
+        engine = entry['engine']
+        for open_time, close in zip(open_times[new].tolist(), closes[new].tolist()):
+            previous = engine.zone
+            row = engine.append(close)
+            zone = engine.zone
+            if (previous['type'] if previous else None) != (zone['type'] if zone else None):
+                events.extend(self._transition(entry, previous, zone, row, open_time, close))
+            entry['last_open_time'] = open_time
+        return events
+
+    def _transition(self, entry, previous, zone, row, open_time, close):
+        """密集区域状态变化时生成事件：离开区域为 exit，进入区域为 enter，多空类型切换时两者都有"""
+        close_time = open_time + INTERVAL_MS[entry['interval']]
+        base = {
+            'symbol': entry['symbol'],
+            'interval': entry['interval'],
+            'open_time': open_time,
+            'time': datetime.fromtimestamp(close_time / 1000, timezone.utc).isoformat(),
+            'close': close,
+        }
+        events = []
+        if previous is not None:
+            events.append(dict(base, event='exit', type=previous['type'], zone_bars=previous['length']))
+        if zone is not None:
+            convergence = row['convergence']
+            events.append(dict(base, event='enter', type=zone['type'],
+                               max_diff_pct=float(convergence['max_diff_pct']),
+                               convergence_strength=float(convergence['convergence_strength'])))
+        return events
+
+    def check(self, intervals=None):
+        """
+        处理指定周期（默认全部）的所有监控项并输出事件
+        :return: 事件列表
+        """
+        entries = [entry for entry in self.entries.values() if intervals is None or entry['interval'] in intervals]
+        with ThreadPoolExecutor(max_workers=self.fetch_workers) as pool:
+            events = list(itertools.chain.from_iterable(pool.map(self._update, entries)))
+        for event in events:
+            for sink in self.sinks:
+                sink(event)
+        return events
+
+    def run(self):
+        """主循环：睡到最近一个周期的收盘时间，收盘后只处理该周期的监控项"""
+        intervals = {entry['interval'] for entry in self.entries.values()}
+        while not self._stop.is_set() and intervals:
+            now_ms = int(time.time() * 1000)
+            closes = {interval: next_close_time(interval, now_ms) for interval in intervals}
+            if self._stop.wait((min(closes.values()) - now_ms) / 1000 + self.delay):
+                break
+            now_ms = int(time.time() * 1000)
+            self.check({interval for interval, close in closes.items() if close <= now_ms})
+
+    def stop(self):
+        self._stop.set()
+
+
+def load_watchlist(path):
+    """
+    读取监控列表文件：每行 '交易对 周期'（空格或逗号分隔），#开头为注释
+    :return: [(symbol, interval), ...]
+    """
+    watchlist = []
+    with open(path) as f:
+        for line in f:
+            line = line.split('#', 1)[0].replace(',', ' ').split()
+            if len(line) >= 2:
+                watchlist.append((line[0].upper(), line[1]))
+    return watchlist
+
+
+def main():
+    parser = argparse.ArgumentParser(description="均线密集区域的收盘提醒守护进程")
+    parser.add_argument('--watchlist', help="监控列表文件，每行 '交易对 周期'；默认为全部USDT交易对 x --intervals")
+    parser.add_argument('--symbols-file', help="交易对列表文件，每行一个（与 --intervals 组合）")
+    parser.add_argument('--intervals', nargs='+', default=['4h'])
+    parser.add_argument('--tolerance', type=float, default=3.0, help="密集容差(%%)")
+    parser.add_argument('--seed-bars', type=int, default=500, help="初始化时获取的历史K线数量")
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--delay', type=float, default=2.0, help="收盘后等待的秒数")
+    parser.add_argument('--jsonl', help="事件追加写入的JSONL文件")
+    parser.add_argument('--webhook', help="事件POST到的地址")
+    parser.add_argument('--quiet', action='store_true', help="不输出到标准输出")
+    parser.add_argument('--store-dir', default=os.environ.get('KLINE_STORE_DIR'), help="本地K线存储目录")
+    args = parser.parse_args()
+
+    client = BinanceClient(store_dir=args.store_dir)
+    if args.watchlist:
+        watchlist = load_watchlist(args.watchlist)
+    else:
+        symbols = load_symbols(client, args.symbols_file)
+        watchlist = [(symbol, interval) for symbol in symbols for interval in args.intervals]
+
+    sinks = [] if args.quiet else [StdoutSink()]
+    if args.jsonl:
+        sinks.append(JsonlSink(args.jsonl))
+    if args.webhook:
+        sinks.append(WebhookSink(args.webhook))
+
+    daemon = AlertDaemon(client, watchlist, args.tolerance / 100, sinks, args.seed_bars, args.fetch_workers,
+                         args.delay)
+    start = time.perf_counter()
+    seeded = daemon.seed()
+    print(f"已初始化 {seeded}/{len(daemon.entries)} 个监控项，耗时 {time.perf_counter() - start:.1f}s",
+          file=sys.stderr)
+
+    try:
+        daemon.run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
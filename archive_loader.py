@@ -0,0 +1,219 @@
+import argparse
+import os
+import re
+import sys
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+
+from kline_store import INTERVAL_MS, KLINE_DTYPE, KlineStore, parse_klines, records_to_frame
+
+# 归档文件名：BTCUSDT-1m-2023-01.zip（月度）或 BTCUSDT-1m-2023-01-15.zip（每日）
+ARCHIVE_NAME_RE = re.compile(r'^(?P<symbol>[A-Z0-9]+)-(?P<interval>\w+)-(?P<date>\d{4}-\d{2}(?:-\d{2})?)\.zip$')
+
+# 每次从压缩流中读取的字节数
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+# 2025年起的现货归档时间戳为微秒，大于该值的时间戳按微秒处理
+MICROSECOND_THRESHOLD = 10 ** 14
+
+# 每个序列最多列出的缺口数
+MAX_REPORTED_GAPS = 20
+
+_NEWLINE_TO_COMMA = bytes.maketrans(b'\n', b',')
+
+
+def parse_archive_name(path):
+    """
+    :return: (symbol, interval, date)，文件名不符合归档格式时返回None
+    """
+    match = ARCHIVE_NAME_RE.match(os.path.basename(path))
+    if match is None:
+        return None
+    return match['symbol'], match['interval'], match['date']
+
+
+def parse_csv_chunk(data):
+    """
+    将若干完整的CSV行解析为 KLINE_DTYPE 结构化数组（字段顺序与 /api/v3/klines 相同）
+    换行替换为逗号后交给 parse_klines 整体解析；跳过表头行，微秒时间戳换算为毫秒
+    :param data: 以换行结尾的CSV内容（bytes）
+    :return: 结构化数组
+    """
+    if data[:1].isalpha():
+        data = data.split(b'\n', 1)[1] if b'\n' in data else b''
+    records = parse_klines(data.translate(_NEWLINE_TO_COMMA, b'\r').strip(b','))
+    if len(records) and records['open_time'][0] >= MICROSECOND_THRESHOLD:
+        records['open_time'] //= 1000
+        records['close_time'] //= 1000
+    return records
+
+
+def iter_archive_records(path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    流式解压并解析归档中的CSV，每次只在内存中保留一个数据块
+    :param path: zip 文件路径
+    :param chunk_bytes: 每次读取的解压后字节数
+    :return: 结构化数组的迭代器
+    """
+    with zipfile.ZipFile(path) as archive:
+        for member in archive.namelist():
+            if not member.endswith('.csv'):
+                continue
+            with archive.open(member) as f:
+                remainder = b''
+                while True:
+                    block = f.read(chunk_bytes)
+                    if not block:
+                        break
+                    data = remainder + block
+                    end = data.rfind(b'\n') + 1
+                    remainder = data[end:]
+                    if end:
+                        yield parse_csv_chunk(data[:end])
+                if remainder.strip():
+                    yield parse_csv_chunk(remainder + b'\n')
+
+
+def check_continuity(open_times, step, previous=None):
+    """
+    检查 open_time 是否按固定间隔连续
+    :param open_times: open_time 数组
+    :param step: K线间隔（毫秒）
+    :param previous: 上一个数据块的最后一个 open_time
+    :return: (缺口列表 [(缺失的第一个open_time, 缺失的最后一个open_time)], 重复或乱序的位置数)
+    """
+    if previous is not None:
+        open_times = np.r_[previous, open_times]
+    diffs = np.diff(open_times)
+    gap_positions = np.flatnonzero(diffs > step)
+    gaps = [(int(open_times[pos]) + step, int(open_times[pos + 1]) - step) for pos in gap_positions]
+    return gaps, int((diffs <= 0).sum())
+
+
+def load_archive(path, part_path, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    将一个归档解析为二进制记录文件（在进程池中执行），同时校验连续性
+    :param path: zip 文件路径
+    :param part_path: 输出的记录文件
+    :return: 统计字典：rows, first, last, gaps, unordered, bytes
+    """
+    symbol, interval, _ = parse_archive_name(path)
+    step = INTERVAL_MS[interval]
+    summary = {'path': path, 'part': part_path, 'symbol': symbol, 'interval': interval, 'rows': 0,
+               'first': None, 'last': None, 'gaps': [], 'unordered': 0, 'bytes': os.path.getsize(path)}
+    with open(part_path, 'wb') as out:
+        for records in iter_archive_records(path, chunk_bytes):
+            if len(records) == 0:
+                continue
+            gaps, unordered = check_continuity(records['open_time'], step, summary['last'])
+            summary['gaps'].extend(gaps)
+            summary['unordered'] += unordered
+            if summary['first'] is None:
+                summary['first'] = int(records['open_time'][0])
+            summary['last'] = int(records['open_time'][-1])
+            summary['rows'] += len(records)
+            out.write(records.tobytes())
+    return summary
+
+
+def archive_to_frame(path, columns=None, price_dtype=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    读取单个归档为 get_klines 相同格式的DataFrame（不写入本地存储）
+    :param columns: 返回的字段，同 get_klines
+    :param price_dtype: 价格和成交量列的数据类型，同 get_klines
+    """
+    chunks = list(iter_archive_records(path, chunk_bytes))
+    return records_to_frame(np.concatenate(chunks or [np.empty(0, dtype=KLINE_DTYPE)]), columns, price_dtype)
+
+
+def ingest(paths, store, workers=None, chunk_bytes=DEFAULT_CHUNK_BYTES):
+    """
+    并行导入多个归档到本地K线存储
+    各进程把归档流式解析为临时记录文件，全部完成后按时间顺序追加到对应的存储文件
+    （每个存储文件只有主进程一个写入方），并检查归档之间的连续性
+    :param paths: zip 文件路径列表
+    :param store: KlineStore
+    :param workers: 进程数，默认为CPU核数
+    :return: {(symbol, interval): 汇总字典}
+    """
+    jobs = []
+    for path in paths:
+        parsed = parse_archive_name(path)
+        if parsed is None or parsed[1] not in INTERVAL_MS:
+            print(f"跳过 {path}: 无法识别的归档文件名或不支持的周期", file=sys.stderr)
+            continue
+        symbol, interval, _ = parsed
+        part_dir = os.path.join(store.root_dir, symbol)
+        os.makedirs(part_dir, exist_ok=True)
+        jobs.append((path, os.path.join(part_dir, f'{interval}.{os.getpid()}.{len(jobs)}.part')))
+
+    summaries = []
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count() or 1) as pool:
+        futures = {pool.submit(load_archive, path, part_path, chunk_bytes): path for path, part_path in jobs}
+        for future in as_completed(futures):
+            try:
+                summaries.append(future.result())
+            except Exception as e:
+                print(f"导入 {futures[future]} 错误: {e}", file=sys.stderr)
+
+    series = {}
+    for summary in sorted(summaries, key=lambda s: (s['symbol'], s['interval'], s['first'] or 0)):
+        key = (summary['symbol'], summary['interval'])
+        step = INTERVAL_MS[summary['interval']]
+        total = series.setdefault(key, {'archives': 0, 'rows': 0, 'first': None, 'last': None, 'gaps': [],
+                                        'unordered': 0, 'bytes': 0})
+        if summary['rows']:
+            records = np.fromfile(summary['part'], dtype=KLINE_DTYPE)
+            store.append(summary['symbol'], summary['interval'], records)
+            # 归档之间的缺口和重叠（例如月度与每日归档重复）
+            if total['last'] is not None:
+                gaps, unordered = check_continuity(np.array([summary['first']]), step, total['last'])
+                total['gaps'].extend(gaps)
+                total['unordered'] += unordered
+            total['first'] = summary['first'] if total['first'] is None else total['first']
+            total['last'] = summary['last'] if total['last'] is None else max(total['last'], summary['last'])
+        os.remove(summary['part'])
+        total['archives'] += 1
+        total['rows'] += summary['rows']
+        total['gaps'].extend(summary['gaps'])
+        total['unordered'] += summary['unordered']
+        total['bytes'] += summary['bytes']
+
+    # 有重叠或乱序时排序去重一次
+    for (symbol, interval), total in series.items():
+        if total['unordered']:
+            store.compact(symbol, interval)
+    return series
+
+
+def main():
+    parser = argparse.ArgumentParser(description="批量导入 Binance 公开K线归档（data.binance.vision 的 zip 格式）")
+    parser.add_argument('archives', nargs='+', help="归档文件，如 BTCUSDT-1m-2023-01.zip")
+    parser.add_argument('--store-dir', default=os.environ.get('KLINE_STORE_DIR', 'data/klines'), help="本地K线存储目录")
+    parser.add_argument('--workers', type=int, default=None, help="解析进程数，默认为CPU核数")
+    parser.add_argument('--chunk-mb', type=float, default=DEFAULT_CHUNK_BYTES / 1024 / 1024, help="每次解压的数据块大小(MB)")
+    args = parser.parse_args()
+
+    store = KlineStore(args.store_dir)
+    start = time.perf_counter()
+    series = ingest(args.archives, store, args.workers, int(args.chunk_mb * 1024 * 1024))
+    elapsed = time.perf_counter() - start
+
+    rows = sum(total['rows'] for total in series.values())
+    compressed = sum(total['bytes'] for total in series.values())
+    for (symbol, interval), total in sorted(series.items()):
+        first = np.datetime64(total['first'], 'ms') if total['first'] is not None else '-'
+        last = np.datetime64(total['last'], 'ms') if total['last'] is not None else '-'
+        print(f"{symbol} {interval}: {total['archives']} 个归档, {total['rows']} 根K线, {first} ~ {last}, "
+              f"缺口 {len(total['gaps'])} 处, 重叠/乱序 {total['unordered']} 处")
+        for gap_start, gap_end in total['gaps'][:MAX_REPORTED_GAPS]:
+            print(f"  缺失 {np.datetime64(gap_start, 'ms')} ~ {np.datetime64(gap_end, 'ms')}")
+    print(f"共导入 {rows} 根K线，耗时 {elapsed:.2f}s（{rows / elapsed if elapsed else 0:,.0f} 根/秒，"
+          f"{compressed / 1024 / 1024 / elapsed if elapsed else 0:.1f} MB/s 压缩数据）", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
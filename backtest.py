@@ -0,0 +1,219 @@
+import argparse
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from binance_client import BinanceClient
+from indicators import add_all_indicators, detect_line_convergence
+from scanner import load_symbols
+from sweep import fetch_closes
+
+# 汇总表的列顺序
+BACKTEST_COLUMNS = [
+    'tolerance', 'min_zone_bars', 'exit', 'direction', 'horizon', 'trades', 'hit_rate', 'avg_return',
+    'total_return', 'max_drawdown', 'series'
+]
+
+
+def find_zones(convergences):
+    """
+    把密集点合并为连续的同类型区域
+    :param convergences: detect_line_convergence 的结果
+    :return: (开始位置, 结束位置, 是否多头) 三个数组
+    """
+    if convergences.empty:
+        return np.empty(0, dtype=int), np.empty(0, dtype=int), np.empty(0, dtype=bool)
+    index = convergences['index'].to_numpy()
+    bullish = (convergences['type'] == 'bullish_convergence').to_numpy()
+    new_zone = np.r_[True, (np.diff(index) != 1) | (bullish[1:] != bullish[:-1])]
+    starts = np.flatnonzero(new_zone)
+    ends = np.r_[starts[1:], len(index)] - 1
+    return index[starts], index[ends], bullish[starts]
+
+
+def zone_signals(convergences, min_zone_bars=1, direction='both'):
+    """
+    由密集区域生成入场信号：区域持续 min_zone_bars 根K线时以该K线收盘价入场，多头区域做多、空头区域做空
+    :param convergences: detect_line_convergence 的结果
+    :param min_zone_bars: 区域至少持续的K线数
+    :param direction: both / long / short
+    :return: (入场位置, 方向 +1/-1, 区域结束后第一根K线的位置) 三个数组
+    """
+    starts, ends, bullish = find_zones(convergences)
+    keep = ends - starts + 1 >= min_zone_bars
+    if direction == 'long':
+        keep &= bullish
+    elif direction == 'short':
+        keep &= ~bullish
+    entry = starts[keep] + min_zone_bars - 1
+    return entry, np.where(bullish[keep], 1.0, -1.0), ends[keep] + 1
+
+
+def simulate(close, entry, sign, exit_, horizon, fee):
+    """
+    按入场/出场位置计算每笔交易的收益和组合净值曲线
+    重叠的交易各占 1/horizon 的资金（分批持仓），净值按每根K线的持仓和收益率累乘，换手按 fee 扣费
+    :param close: 收盘价数组
+    :param entry: 入场位置数组
+    :param sign: 方向数组（+1做多，-1做空）
+    :param exit_: 出场位置数组（需小于 len(close)）
+    :param horizon: 持仓周期（决定每笔交易的资金占比）
+    :param fee: 单边手续费率
+    :return: (每笔交易的净收益率, 净值曲线)
+    """
+    n_bars = len(close)
+    trade_returns = sign * (close[exit_] / close[entry] - 1) - 2 * fee
+
+    # 交易在入场K线收盘后开始持仓，持有到出场K线收盘
+    delta = np.zeros(n_bars + 1)
+    np.add.at(delta, entry + 1, sign / horizon)
+    np.add.at(delta, exit_ + 1, -sign / horizon)
+    position = np.clip(np.cumsum(delta)[:n_bars], -1, 1)
+
+    bar_returns = np.r_[0.0, close[1:] / close[:-1] - 1]
+    turnover = np.abs(np.diff(np.r_[0.0, position]))
+    equity = np.cumprod(1 + position * bar_returns - fee * turnover)
+    return trade_returns, equity
+
+
+def backtest_series(closes, param_sets):
+    """
+    对一条收盘价序列回测多组参数（在进程池中执行），指标只计算一次
+    :param closes: 收盘价数组
+    :param param_sets: 参数字典列表，键为 tolerance, min_zone_bars, exit (horizon/zone_end), direction,
+                       horizons, fee
+    :return: 结果字典列表，每个 (参数, 持仓周期) 一行
+    """
+    close = np.asarray(closes, dtype=float)
+    df = add_all_indicators(pd.DataFrame({'close': close}))
+
+    results = []
+    for params in param_sets:
+        convergences = detect_line_convergence(df, params['tolerance'])
+        entry, sign, zone_exit = zone_signals(convergences, params['min_zone_bars'], params['direction'])
+        for horizon in params['horizons']:
+            exit_ = entry + horizon
+            if params['exit'] == 'zone_end':
+                exit_ = np.minimum(exit_, zone_exit)
+            # 出场位置超出数据范围的交易尚未结束，不计入
+            complete = exit_ < len(close)
+            trade_returns, equity = simulate(
+                close, entry[complete], sign[complete], exit_[complete], horizon, params['fee']
+            )
+            drawdown = 1 - equity / np.maximum.accumulate(equity)
+            results.append({
+                'tolerance': params['tolerance'],
+                'min_zone_bars': params['min_zone_bars'],
+                'exit': params['exit'],
+                'direction': params['direction'],
+                'horizon': horizon,
+                'trades': len(trade_returns),
+                'wins': int((trade_returns > 0).sum()),
+                'return_sum': float(trade_returns.sum()),
+                'total_return': float(equity[-1] - 1) if len(equity) else 0.0,
+                'max_drawdown': float(drawdown.max()) if len(drawdown) else 0.0,
+                'bars': len(close),
+            })
+    return results
+
+
+def summarize(results):
+    """
+    按参数汇总所有序列：胜率和平均收益按交易数加权，总收益和最大回撤取各序列的平均值
+    :param results: backtest_series 的结果列表
+    :return: 按平均总收益排序的DataFrame
+    """
+    if not results:
+        return pd.DataFrame(columns=BACKTEST_COLUMNS)
+    keys = ['tolerance', 'min_zone_bars', 'exit', 'direction', 'horizon']
+    summary = pd.DataFrame(results).groupby(keys, sort=False).agg(
+        trades=('trades', 'sum'),
+        wins=('wins', 'sum'),
+        return_sum=('return_sum', 'sum'),
+        total_return=('total_return', 'mean'),
+        max_drawdown=('max_drawdown', 'mean'),
+        series=('trades', 'size'),
+    ).reset_index()
+    traded = summary['trades'].where(summary['trades'] > 0)
+    summary['hit_rate'] = (summary['wins'] / traded).fillna(0.0)
+    summary['avg_return'] = (summary['return_sum'] / traded).fillna(0.0)
+    return summary[BACKTEST_COLUMNS].sort_values('total_return', ascending=False).reset_index(drop=True)
+
+
+def build_param_sets(tolerances, min_zone_bars, exits, directions, horizons, fee):
+    """参数网格的笛卡尔积（持仓周期在每组参数内部一起计算）"""
+    return [
+        {'tolerance': tolerance, 'min_zone_bars': bars, 'exit': exit_, 'direction': direction,
+         'horizons': list(horizons), 'fee': fee}
+        for tolerance, bars, exit_, direction in itertools.product(tolerances, min_zone_bars, exits, directions)
+    ]
+
+
+def run_backtest(series, param_sets, workers=None):
+    """
+    多进程并行回测多个交易对、多组参数
+    :param series: {名称: 收盘价数组}
+    :param param_sets: build_param_sets 的结果
+    :param workers: 进程数，默认为CPU核数
+    :return: (汇总DataFrame, 吞吐量 根K线/秒)
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = -(-len(param_sets) // max(1, workers // max(1, len(series))))
+    chunks = [param_sets[i:i + chunk_size] for i in range(0, len(param_sets), chunk_size)]
+
+    start = time.perf_counter()
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(backtest_series, closes, chunk)
+            for closes in series.values() for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    elapsed = time.perf_counter() - start
+
+    # 每组 (参数, 持仓周期) 都完整处理一遍序列
+    processed_bars = sum(result['bars'] for result in results)
+    return summarize(results), processed_bars / elapsed if elapsed else 0.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="均线密集区域信号回测")
+    parser.add_argument('--symbols-file', help="交易对列表文件，每行一个；默认使用全部USDT交易对")
+    parser.add_argument('--interval', default='4h')
+    parser.add_argument('--limit', type=int, default=1000, help="每个交易对获取的K线数量")
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[1.0, 2.0, 3.0], help="密集容差(%%)")
+    parser.add_argument('--min-zone-bars', type=int, nargs='+', default=[1, 3],
+                        help="区域持续多少根K线后入场")
+    parser.add_argument('--exits', nargs='+', choices=['horizon', 'zone_end'], default=['horizon'],
+                        help="horizon: 持有固定周期；zone_end: 区域结束时提前出场")
+    parser.add_argument('--directions', nargs='+', choices=['both', 'long', 'short'], default=['both'])
+    parser.add_argument('--horizons', type=int, nargs='+', default=[5, 10, 20], help="持仓K线数")
+    parser.add_argument('--fee', type=float, default=0.1, help="单边手续费(%%)")
+    parser.add_argument('--workers', type=int, default=None, help="计算进程数，默认为CPU核数")
+    parser.add_argument('--top', type=int, default=None, help="只输出排名前N的结果")
+    parser.add_argument('--store-dir', default=os.environ.get('KLINE_STORE_DIR'), help="本地K线存储目录")
+    args = parser.parse_args()
+
+    client = BinanceClient(store_dir=args.store_dir)
+    symbols = load_symbols(client, args.symbols_file)
+    series = fetch_closes(client, symbols, args.interval, args.limit)
+
+    param_sets = build_param_sets([tolerance / 100 for tolerance in args.tolerances], args.min_zone_bars,
+                                  args.exits, args.directions, args.horizons, args.fee / 100)
+    summary, throughput = run_backtest(series, param_sets, args.workers)
+
+    if args.top:
+        summary = summary.head(args.top)
+    print(summary.to_string(index=False))
+    print(f"{len(series)} 个交易对 x {len(param_sets) * len(args.horizons)} 组参数，"
+          f"吞吐量 {throughput:,.0f} 根K线/秒", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
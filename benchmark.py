@@ -0,0 +1,921 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlparse
+
+import numpy as np
+import pandas as pd
+
+from binance_client import BinanceClient
+from incremental import IncrementalIndicators
+from indicator_backends import PandasBackend, available_backends, get_backend, set_backend
+from indicators import (
+    CONVERGENCE_LINES,
+    DEFAULT_PERIODS,
+    LINE_SPREAD,
+    add_all_indicators,
+    batch_ema,
+    batch_ma,
+    calculate_ema,
+    calculate_line_spread,
+    calculate_ma,
+    detect_crossover,
+    detect_crossover_loop,
+    detect_line_convergence,
+    detect_line_convergence_loop,
+    find_all_crossovers,
+)
+from kline_store import INTERVAL_MS, KLINE_FRAME_COLUMNS, align_open_time, parse_klines, records_to_frame
+from rate_limiter import klines_weight
+from transport import HttpTransport
+
+
+def make_indicator_frame(n_bars, seed=42):
+    """
+    生成带有6条均线的合成K线数据（几何随机游走收盘价）
+    :param n_bars: K线数量
+    :param seed: 随机种子
+    :return: 添加指标后的DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    return add_all_indicators(pd.DataFrame({'close': close}))
+
+
+def make_klines(n_bars, seed=42, interval_ms=3_600_000, start_ms=1_600_000_000_000):
+    """
+    生成几何布朗运动的合成K线，列与 get_klines 返回的DataFrame相同
+    :param n_bars: K线数量
+    :param seed: 随机种子
+    :param interval_ms: K线周期（毫秒）
+    :param start_ms: 第一根K线的开盘时间（毫秒）
+    :return: K线DataFrame
+    """
+    rng = np.random.default_rng(seed)
+    close = 100 * np.exp(np.cumsum(rng.normal(0, 0.01, n_bars)))
+    open_ = np.r_[100.0, close[:-1]]
+    wick = np.abs(rng.normal(0, 0.005, n_bars))
+    open_time = start_ms + np.arange(n_bars, dtype=np.int64) * interval_ms
+    df = pd.DataFrame({
+        'open_time': open_time,
+        'open': open_,
+        'high': np.maximum(open_, close) * (1 + wick),
+        'low': np.minimum(open_, close) * (1 - wick),
+        'close': close,
+        'volume': rng.uniform(100, 10_000, n_bars),
+        'close_time': open_time + interval_ms - 1,
+    })
+    df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
+    return df
+
+
+def time_call(func, *args, repeat=3):
+    """
+    多次执行取最快耗时
+    :return: (最快耗时秒数, 最后一次返回值)
+    """
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def check_parity(df, tolerance):
+    """校验向量化实现与循环参考实现的结果逐位一致"""
+    pd.testing.assert_frame_equal(
+        detect_line_convergence(df, tolerance),
+        detect_line_convergence_loop(df, tolerance),
+        check_exact=True
+    )
+    pd.testing.assert_frame_equal(
+        detect_crossover(df['MA_20'], df['EMA_60'], tolerance),
+        detect_crossover_loop(df['MA_20'], df['EMA_60'], tolerance),
+        check_exact=True
+    )
+
+
+def bench_detection(sizes, tolerance, loop_max):
+    """
+    对比循环版与向量化版的检测耗时
+    超过 loop_max 的规模不再实际运行循环版，按已测得的最大规模线性外推
+    """
+    print(f"{'bars':>10} {'kind':>12} {'loop(s)':>12} {'vector(s)':>12} {'speedup':>10}")
+    per_bar = {}
+    for n_bars in sizes:
+        df = make_indicator_frame(n_bars)
+        for kind, loop_func, vector_func, args in [
+            ('convergence', detect_line_convergence_loop, detect_line_convergence, (df, tolerance)),
+            ('crossover', detect_crossover_loop, detect_crossover, (df['MA_20'], df['EMA_60'], tolerance)),
+        ]:
+            vector_time, _ = time_call(vector_func, *args)
+            if n_bars <= loop_max:
+                loop_time, _ = time_call(loop_func, *args, repeat=1)
+                per_bar[kind] = loop_time / n_bars
+                loop_label = f"{loop_time:12.4f}"
+            elif kind in per_bar:
+                loop_time = per_bar[kind] * n_bars
+                loop_label = f"~{loop_time:11.2f}"
+            else:
+                print(f"{n_bars:>10} {kind:>12} {'-':>12} {vector_time:12.4f} {'-':>10}")
+                continue
+            print(f"{n_bars:>10} {kind:>12} {loop_label} {vector_time:12.4f} {loop_time / vector_time:9.0f}x")
+
+
+def bench_incremental(n_bars, seed_bars, tolerance):
+    """
+    校验增量引擎与批量计算结果一致，并对比每根K线的增量更新耗时与全量重算耗时
+    """
+    df = make_indicator_frame(n_bars)
+    engine = IncrementalIndicators(tolerance=tolerance)
+    engine.seed(df.iloc[:seed_bars])
+
+    rows = []
+    start = time.perf_counter()
+    for close in df['close'].iloc[seed_bars:]:
+        engine.update(close)
+        rows.append(engine.append(close))
+    per_bar = (time.perf_counter() - start) / (n_bars - seed_bars)
+
+    # EMA递推与pandas逐位一致；MA为滚动求和，允许浮点舍入误差
+    incremental_df = pd.DataFrame(rows)
+    for col in CONVERGENCE_LINES:
+        np.testing.assert_allclose(
+            incremental_df[col].to_numpy(), df[col].to_numpy()[seed_bars:], rtol=1e-12
+        )
+    batch_indices = detect_line_convergence(df, tolerance)['index']
+    incremental_indices = [row['index'] for row in rows if row['convergence'] is not None]
+    assert incremental_indices == batch_indices[batch_indices >= seed_bars].tolist()
+    print("parity: ok")
+
+    full_time, _ = time_call(
+        lambda: detect_line_convergence(add_all_indicators(df[['close']]), tolerance)
+    )
+    print(f"bars={n_bars} incremental={per_bar * 1e6:.1f}us/bar full_recompute={full_time * 1e3:.2f}ms")
+
+
+def make_zone_convergences(df, n_zones):
+    """
+    构造恰好包含 n_zones 个密集区域的检测结果（多空交替，每个区域3根K线）
+    """
+    positions = np.arange(n_zones * 3) * (len(df) // (n_zones * 3 + 1))
+    zone_ids = np.arange(len(positions)) // 3
+    return pd.DataFrame({
+        'index': positions,
+        'type': np.where(zone_ids % 2 == 0, 'bullish_convergence', 'bearish_convergence').astype(object),
+        'avg_price': df['close'].to_numpy()[positions],
+        'max_diff_pct': 0.0,
+        'convergence_strength': 1.0
+    })
+
+
+def bench_figure(n_bars, zone_counts):
+    """
+    对比原始渲染（逐个 add_vrect + Scatter）与快速渲染（批量 shapes + Scattergl）的构建耗时和JSON大小
+    """
+    # chart_app 依赖 Dash/Plotly，只在需要时导入
+    from chart_app import build_figure
+
+    df = add_all_indicators(make_klines(n_bars))
+
+    print(f"{'zones':>8} {'mode':>8} {'build(s)':>10} {'json(s)':>10} {'bytes':>12} {'annotations':>12}")
+    for n_zones in zone_counts:
+        crossovers = {'LINE_CONVERGENCE': make_zone_convergences(df, n_zones)}
+        for mode, fast in [('classic', False), ('fast', True)]:
+            build_time, fig = time_call(build_figure, df, crossovers, 'BENCH', '1h', fast, repeat=1)
+            json_time, payload = time_call(fig.to_json, repeat=1)
+            print(f"{n_zones:>8} {mode:>8} {build_time:10.4f} {json_time:10.4f} {len(payload):>12} "
+                  f"{len(fig.layout.annotations):>12}")
+
+
+def bench_batch(sizes, n_periods):
+    """
+    对比逐个周期的 rolling/ewm 与批量 batch_ma/batch_ema 的耗时，并校验结果在浮点误差范围内一致
+    """
+    periods = list(range(5, 5 * (n_periods + 1), 5))
+    print(f"{'bars':>10} {'periods':>8} {'ma_loop(s)':>11} {'ma_batch(s)':>12} {'ema_loop(s)':>12} "
+          f"{'ema_batch(s)':>13}")
+    for n_bars in sizes:
+        close = make_indicator_frame(n_bars)['close']
+        ma_loop_time, ma_loop = time_call(lambda: np.array([calculate_ma(close, p).to_numpy() for p in periods]))
+        ema_loop_time, ema_loop = time_call(lambda: np.array([calculate_ema(close, p).to_numpy() for p in periods]))
+        ma_batch_time, ma_batch = time_call(batch_ma, close.to_numpy(), periods)
+        ema_batch_time, ema_batch = time_call(batch_ema, close.to_numpy(), periods)
+        np.testing.assert_allclose(ma_batch, ma_loop, rtol=1e-9)
+        np.testing.assert_allclose(ema_batch, ema_loop, rtol=1e-12)
+        print(f"{n_bars:>10} {n_periods:>8} {ma_loop_time:11.4f} {ma_batch_time:12.4f} {ema_loop_time:12.4f} "
+              f"{ema_batch_time:13.4f}")
+    print("parity: ok")
+
+
+def make_backend_frames(n_bars, seed=42):
+    """
+    生成后端校验用的数据：随机游走 + 横盘段（制造均线密集和交叉），开头和中间各含一段NaN
+    :return: (无NaN的收盘价, 含NaN的收盘价)
+    """
+    rng = np.random.default_rng(seed)
+    steps = rng.normal(0, 0.01, n_bars)
+    steps[n_bars // 3:n_bars // 3 + n_bars // 10] *= 0.05
+    close = pd.Series(100 * np.exp(np.cumsum(steps)))
+    gappy = close.copy()
+    gappy.iloc[:5] = np.nan
+    gappy.iloc[n_bars // 2:n_bars // 2 + 3] = np.nan
+    return close, gappy
+
+
+def check_backend_parity(name, n_bars, tolerance):
+    """
+    校验指定后端与 pandas 参考后端、循环参考实现的结果一致
+    MA 为滚动求和，允许浮点舍入误差；EMA、交叉和密集检测的结果要求逐位相同
+    :return: 不一致的检查项列表
+    """
+    failures = []
+    close, gappy = make_backend_frames(n_bars)
+    reference = PandasBackend()
+    set_backend(name)
+    backend = get_backend()
+
+    for label, data in [('close', close), ('nan', gappy)]:
+        for period in DEFAULT_PERIODS + [1, n_bars + 1]:
+            for kind, rtol in [('ma', 1e-9), ('ema', 1e-12)]:
+                expected = getattr(reference, kind)(data, period)
+                actual = getattr(backend, kind)(data, period)
+                try:
+                    pd.testing.assert_index_equal(actual.index, expected.index)
+                    np.testing.assert_allclose(actual.to_numpy(), expected.to_numpy(), rtol=rtol, atol=0)
+                except AssertionError as e:
+                    failures.append(f"{kind}({label}, {period}): {str(e).strip().splitlines()[0]}")
+
+    df = add_all_indicators(pd.DataFrame({'close': close}))
+    checks = [
+        ('crossover', lambda: detect_crossover(df['MA_20'], df['EMA_60'], tolerance),
+         lambda: detect_crossover_loop(df['MA_20'], df['EMA_60'], tolerance)),
+        ('crossover_short', lambda: detect_crossover(df['MA_20'].iloc[:1], df['EMA_60'].iloc[:1], tolerance),
+         lambda: detect_crossover_loop(df['MA_20'].iloc[:1], df['EMA_60'].iloc[:1], tolerance)),
+        ('convergence', lambda: detect_line_convergence(df, tolerance),
+         lambda: detect_line_convergence_loop(df, tolerance)),
+        ('convergence_spread', lambda: detect_line_convergence(df.assign(**{LINE_SPREAD: calculate_line_spread(df)}),
+                                                               tolerance),
+         lambda: detect_line_convergence_loop(df, tolerance)),
+    ]
+    for kind, actual, expected in checks:
+        try:
+            pd.testing.assert_frame_equal(actual(), expected(), check_exact=True)
+        except AssertionError as e:
+            failures.append(f"{kind}: {str(e).strip().splitlines()[0]}")
+    return failures
+
+
+def bench_backends(names, sizes, tolerance, parity_bars):
+    """
+    逐个后端校验结果一致性，并测量完整指标计算和两种检测的耗时
+    :return: 是否全部一致
+    """
+    ok = True
+    for name in names:
+        failures = check_backend_parity(name, parity_bars, tolerance)
+        print(f"{name:>8} parity: {'ok' if not failures else 'FAILED'}")
+        for failure in failures:
+            print(f"         {failure}")
+        ok = ok and not failures
+
+    print(f"{'backend':>8} {'bars':>10} {'indicators(s)':>14} {'crossover(s)':>13} {'convergence(s)':>15}")
+    for n_bars in sizes:
+        close, _ = make_backend_frames(n_bars)
+        frame = pd.DataFrame({'close': close})
+        for name in names:
+            set_backend(name)
+            # 第一次调用包含 Numba 编译等一次性开销，不计入
+            df = add_all_indicators(frame)
+            detect_crossover(df['MA_20'], df['EMA_60'], tolerance)
+            detect_line_convergence(df, tolerance)
+
+            indicator_time, df = time_call(add_all_indicators, frame)
+            crossover_time, _ = time_call(detect_crossover, df['MA_20'], df['EMA_60'], tolerance)
+            convergence_time, _ = time_call(detect_line_convergence, df, tolerance)
+            print(f"{name:>8} {n_bars:>10} {indicator_time:14.4f} {crossover_time:13.4f} {convergence_time:15.4f}")
+    return ok
+
+
+def bench_payload(sizes, tick_size, tolerance):
+    """
+    对比 update_chart 图表输出在 json 与 compact 两种编码、是否 gzip 下的字节数和编码耗时
+    """
+    import gzip
+    from plotly.io.json import to_json_plotly
+
+    # chart_app 依赖 Dash/Plotly，只在需要时导入
+    from chart_app import CHART_POINT_BUDGET, LIVE_LINE_TRACES, build_figure, build_spread_data
+    from downsample import KlinePyramid
+    from payload import compact_figure
+
+    print(f"{'bars':>10} {'mode':>8} {'encode(s)':>10} {'figure':>10} {'spread':>10} {'total':>10} {'gzip':>10}")
+    for n_bars in sizes:
+        df = add_all_indicators(make_klines(n_bars))
+        crossovers = find_all_crossovers(df, tolerance)
+        view = KlinePyramid(df, LIVE_LINE_TRACES, CHART_POINT_BUDGET).view() if n_bars > CHART_POINT_BUDGET else None
+        fig = build_figure(df, crossovers, 'BENCH', '1h', view=view)
+        for mode, compact in [('json', False), ('compact', True)]:
+            def encode():
+                figure = compact_figure(fig, tick_size) if compact else fig
+                return to_json_plotly(figure), to_json_plotly(build_spread_data(df, compact))
+            elapsed, (figure_json, spread_json) = time_call(encode)
+            total = len(figure_json) + len(spread_json)
+            compressed = len(gzip.compress((figure_json + spread_json).encode(), compresslevel=5))
+            print(f"{n_bars:>10} {mode:>8} {elapsed:10.4f} {len(figure_json):>10} {len(spread_json):>10} "
+                  f"{total:>10} {compressed:>10}")
+
+
+# 冷启动导入耗时的测量对象；chart_app:create_app 表示导入后再创建Dash应用
+IMPORT_TARGETS = ['kline_store', 'archive_loader', 'binance_client', 'indicators', 'chart_data', 'scanner', 'sweep',
+                  'backtest', 'alert_daemon', 'chart_app', 'chart_app:create_app']
+# 只有Web进程（chart_app）需要的重量级依赖，其他进程导入时不应加载
+WEB_ONLY_MODULES = ['dash', 'plotly', 'dash_bootstrap_components', 'flask', 'websockets', 'numba', 'polars']
+
+
+def measure_import(target, repeat):
+    """
+    在全新的子进程中导入模块，多次执行取最快耗时
+    :param target: 模块名，或 '模块:函数' 表示导入后再调用该函数
+    :return: (最快耗时秒数, 导入后 sys.modules 中的模块名集合)
+    """
+    module, _, func = target.partition(':')
+    code = (f"import sys, time\n"
+            f"start = time.perf_counter()\n"
+            f"import {module}\n"
+            + (f"{module}.{func}()\n" if func else "") +
+            f"print(time.perf_counter() - start)\n"
+            f"print(' '.join(sys.modules))\n")
+    best = float('inf')
+    modules = set()
+    for _ in range(repeat):
+        result = subprocess.run([sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True, check=True)
+        lines = result.stdout.strip().splitlines()
+        best = min(best, float(lines[-2]))
+        modules = set(lines[-1].split())
+    return best, modules
+
+
+def bench_imports(targets, repeat, max_seconds):
+    """
+    测量各入口模块的冷启动导入耗时，并检查非Web进程是否加载了Dash/Plotly等重量级依赖
+    :param max_seconds: chart_app 以外的模块导入耗时上限，为None时不检查
+    :return: 是否全部通过
+    """
+    ok = True
+    print(f"{'target':>22} {'import(s)':>10} {'modules':>8} {'pandas':>7}  web-only")
+    for target in targets:
+        seconds, modules = measure_import(target, repeat)
+        web_only = [name for name in WEB_ONLY_MODULES if name in modules]
+        print(f"{target:>22} {seconds:10.3f} {len(modules):>8} {'yes' if 'pandas' in modules else 'no':>7}  "
+              f"{','.join(web_only) or '-'}")
+        if target.partition(':')[0] == 'chart_app':
+            continue
+        if web_only:
+            print(f"  {target} 加载了只有Web进程需要的模块: {', '.join(web_only)}", file=sys.stderr)
+            ok = False
+        if max_seconds is not None and seconds > max_seconds:
+            print(f"  {target} 导入耗时 {seconds:.3f}s 超过上限 {max_seconds}s", file=sys.stderr)
+            ok = False
+    return ok
+
+
+def make_klines_payload(n_bars, seed=42):
+    """
+    生成与 /api/v3/klines 响应格式相同的原始JSON内容（数值字段为字符串，末尾带 ignore 字段）
+    """
+    df = make_klines(n_bars, seed)
+    trades = np.random.default_rng(seed).integers(100, 5000, n_bars)
+    return json.dumps(kline_rows(df, trades), separators=(',', ':')).encode()
+
+
+def kline_rows(df, trades):
+    """
+    :param df: make_klines 生成的K线
+    :param trades: 每根K线的成交笔数
+    :return: /api/v3/klines 响应格式的二维列表
+    """
+    return [
+        [open_time, f"{open_:.8f}", f"{high:.8f}", f"{low:.8f}", f"{close:.8f}", f"{volume:.8f}", close_time,
+         f"{volume * close:.8f}", count, f"{volume / 2:.8f}", f"{volume * close / 2:.8f}", "0"]
+        for open_time, open_, high, low, close, volume, close_time, count in zip(
+            df['open_time'].tolist(), df['open'].tolist(), df['high'].tolist(), df['low'].tolist(),
+            df['close'].tolist(), df['volume'].tolist(), df['close_time'].tolist(), trades.tolist())
+    ]
+
+
+def parse_klines_legacy(payload):
+    """原始实现：JSON列表 -> 12列object DataFrame -> 逐列 to_numeric，附加Python对象的 date 列"""
+    df = pd.DataFrame(json.loads(payload), columns=[
+        'open_time', 'open', 'high', 'low', 'close', 'volume',
+        'close_time', 'quote_asset_volume', 'number_of_trades',
+        'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
+    ])
+    for col in ['open', 'high', 'low', 'close', 'volume']:
+        df[col] = pd.to_numeric(df[col])
+    df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
+    df['date'] = df['datetime'].dt.date
+    return df
+
+
+def bench_parse(n_bars):
+    """
+    对比原始K线解析与 parse_klines 的耗时和内存（均按每1000根K线折算）
+    """
+    payload = make_klines_payload(n_bars)
+    legacy = parse_klines_legacy(payload)
+    parsed = records_to_frame(parse_klines(payload))
+    pd.testing.assert_frame_equal(parsed[KLINE_FRAME_COLUMNS + ['datetime']],
+                                  legacy[KLINE_FRAME_COLUMNS + ['datetime']], check_exact=True, check_dtype=False)
+    print("parity: ok")
+
+    parsers = [
+        ('legacy', parse_klines_legacy),
+        ('numpy', lambda data: records_to_frame(parse_klines(data))),
+        ('numpy-f32', lambda data: records_to_frame(parse_klines(data), price_dtype=np.float32)),
+    ]
+    per_k = 1000 / n_bars
+    print(f"{'parser':>10} {'ms/1000 bars':>14} {'KB/1000 bars':>14} {'columns':>8}")
+    for name, parser in parsers:
+        elapsed, df = time_call(parser, payload, repeat=5)
+        memory = df.memory_usage(index=True, deep=True).sum()
+        print(f"{name:>10} {elapsed * 1e3 * per_k:14.3f} {memory / 1024 * per_k:14.1f} {len(df.columns):>8}")
+
+
+class CannedTransport:
+    """返回固定响应内容的传输层，离线测量 get_klines 的解析耗时"""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+    def get_content(self, endpoint, params=None, weight=1):
+        return self.payload
+
+
+class StandInBinance:
+    """
+    本地模拟的 Binance REST 服务器（只实现 /api/v3/klines）
+    按 startTime/endTime/limit 返回固定的一段历史K线，响应头带累计的 X-MBX-USED-WEIGHT-1M；
+    可以让接下来的若干个请求返回 429，用于检查分页边界、权重同步和退避重试
+    """
+
+    def __init__(self, df, interval, external_weight=0):
+        """
+        :param df: make_klines 生成的K线（开盘时间需要按 interval 对齐）
+        :param interval: K线周期
+        :param external_weight: 模拟其他进程已用掉的权重，计入返回的已用权重
+        """
+        self.interval = interval
+        self.open_times = df['open_time'].to_numpy()
+        self.rows = kline_rows(df, np.arange(len(df)))
+        self.used_weight = external_weight
+        self.requests = []
+        self.fail_next = 0
+        self.retry_after = None
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.url = f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def do_GET(self):
+                url = urlparse(self.path)
+                status, body, headers = stand_in.respond(url.path, dict(parse_qsl(url.query)))
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+        return Handler
+
+    def respond(self, path, params):
+        """
+        :return: (状态码, 响应JSON, 响应头)
+        """
+        with self._lock:
+            self.requests.append(params)
+            if self.fail_next:
+                self.fail_next -= 1
+                headers = {'Retry-After': str(self.retry_after)} if self.retry_after is not None else {}
+                return 429, {'code': -1003, 'msg': 'Too many requests'}, headers
+            limit = int(params.get('limit', 500))
+            self.used_weight += klines_weight(limit)
+            headers = {'X-MBX-USED-WEIGHT-1M': str(self.used_weight)}
+        if path != '/api/v3/klines' or params.get('interval') != self.interval or limit > 1000:
+            return 400, {'code': -1100, 'msg': 'Illegal parameters'}, headers
+        start = np.searchsorted(self.open_times, int(params.get('startTime', 0)))
+        end = np.searchsorted(self.open_times, int(params.get('endTime', self.open_times[-1])), side='right')
+        if 'startTime' in params:
+            end = min(end, start + limit)
+        else:
+            start = max(start, end - limit)
+        return 200, self.rows[start:end], headers
+
+    def __enter__(self):
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def check_rest(interval='1h'):
+    """
+    用本地模拟服务器检查 get_klines_range 的分页边界、X-MBX-USED-WEIGHT-1M 同步到令牌桶、429 退避重试
+    :return: 是否全部通过
+    """
+    ok = True
+
+    def expect(condition, message):
+        nonlocal ok
+        print(f"{'ok' if condition else 'FAIL':>4}  {message}")
+        ok = ok and bool(condition)
+
+    step = INTERVAL_MS[interval]
+    start_ms = align_open_time(1_600_000_000_000, interval) + step
+    df = make_klines(5_000, interval_ms=step, start_ms=start_ms)
+    open_times = df['open_time'].to_numpy()
+
+    # 分页边界：整页、多一根、少一根、起止时间落在K线中间、超出数据范围
+    cases = [
+        ('1 page exact', 0, 999, 0, 0),
+        ('1 page + 1', 0, 1000, 0, 0),
+        ('2 pages - 1', 0, 1998, 0, 0),
+        ('mid-bar bounds', 10, 2510, step // 2, step // 2),
+        ('past data end', 4_000, 4_999, 0, 10 * step),
+    ]
+    for name, first, last, start_skew, end_skew in cases:
+        with StandInBinance(df, interval) as server:
+            client = BinanceClient(base_url=server.url)
+            # 开始时间落在K线中间时从下一根开始，结束时间落在K线中间时包含该K线
+            start_time = int(open_times[first]) - start_skew
+            end_time = int(open_times[last]) + end_skew
+            result = client.get_klines_range('BENCHUSDT', interval, start_time, end_time)
+            got = result['open_time'].to_numpy() if result is not None else np.empty(0)
+            expected = open_times[first:last + 1]
+            pages = -(-((align_open_time(end_time, interval) - int(open_times[first])) // step + 1) // 1000)
+            expect(np.array_equal(got, expected) and len(server.requests) == pages,
+                   f"paging {name}: {len(got)} bars in {len(server.requests)} requests "
+                   f"(expected {len(expected)} in {pages})")
+
+    # 服务端返回的已用权重（含其他进程）同步到令牌桶，接近上限时主动等待
+    with StandInBinance(df, interval, external_weight=545) as server:
+        transport = HttpTransport(server.url, weight_limit=600)
+        client = BinanceClient(transport=transport)
+        client.get_klines_range('BENCHUSDT', interval, int(open_times[0]), int(open_times[999]))
+        stats = transport.stats()
+        expect(stats['used_weight'] == server.used_weight == 547 and transport.rate_limiter.tokens <= 540 - 547,
+               f"weight sync: used_weight={stats['used_weight']} tokens={transport.rate_limiter.tokens:.1f}")
+        started = time.perf_counter()
+        client.get_klines_range('BENCHUSDT', interval, int(open_times[0]), int(open_times[999]))
+        waited = time.perf_counter() - started
+        expect(transport.stats()['throttle_seconds'] > 0 and waited >= 0.3,
+               f"weight throttle: waited {waited:.2f}s before the next request")
+
+    # 429：遵守 Retry-After 重试后成功；重试耗尽时返回None
+    with StandInBinance(df, interval) as server:
+        transport = HttpTransport(server.url, max_retries=3)
+        client = BinanceClient(transport=transport)
+        server.fail_next, server.retry_after = 2, 0.2
+        started = time.perf_counter()
+        result = client.get_klines_range('BENCHUSDT', interval, int(open_times[0]), int(open_times[99]))
+        waited = time.perf_counter() - started
+        expect(result is not None and len(result) == 100 and transport.stats()['retries'] == 2 and waited >= 0.4,
+               f"429 Retry-After: {transport.stats()['retries']} retries, {waited:.2f}s")
+
+        server.fail_next, server.retry_after = 2, None
+        transport.backoff_base = 0.1
+        started = time.perf_counter()
+        result = client.get_klines_range('BENCHUSDT', interval, int(open_times[0]), int(open_times[99]))
+        waited = time.perf_counter() - started
+        expect(result is not None and transport.stats()['retries'] == 4 and waited >= 0.05 + 0.1,
+               f"429 exponential backoff: {waited:.2f}s")
+
+        server.fail_next = 10
+        result = client.get_klines_range('BENCHUSDT', interval, int(open_times[0]), int(open_times[99]))
+        expect(result is None and transport.stats()['errors'] == 1,
+               f"429 retries exhausted: {transport.stats()['retries'] - 4} retries, returns None")
+    return ok
+
+
+def kline_message(symbol, interval, open_time, close, closed, interval_ms):
+    """组合流中的一条K线推送消息"""
+    return json.dumps({'stream': f"{symbol.lower()}@kline_{interval}", 'data': {
+        'e': 'kline', 's': symbol, 'k': {
+            't': open_time, 'T': open_time + interval_ms - 1, 's': symbol, 'i': interval,
+            'o': f"{close:.8f}", 'h': f"{close * 1.001:.8f}", 'l': f"{close * 0.999:.8f}", 'c': f"{close:.8f}",
+            'x': closed,
+        }}})
+
+
+def check_stream(interval='1m', seed_bars=300, tolerance=0.03):
+    """
+    用本地模拟的 WebSocket 服务器检查实时K线推送：订阅、未收盘/收盘K线的更新、断线重连后重新订阅
+    并忽略重放的旧K线、推送后的MA/EMA与全量计算一致，以及 stream_chart 输出的 Patch
+    :return: 是否全部通过
+    """
+    # live_stream 依赖 websockets，chart_app 依赖 Dash/Plotly，只在需要时导入
+    from websockets.sync.server import serve
+
+    import chart_app
+    from live_stream import LiveKlineFeed, stream_name
+
+    ok = True
+
+    def expect(condition, message):
+        nonlocal ok
+        print(f"{'ok' if condition else 'FAIL':>4}  {message}")
+        ok = ok and bool(condition)
+
+    symbol = 'BENCHUSDT'
+    step = INTERVAL_MS[interval]
+    df = make_klines(seed_bars, interval_ms=step, start_ms=align_open_time(1_600_000_000_000, interval))
+    last_open = int(df['open_time'].iloc[-1])
+    closes = [101.0, 102.0, 103.0, 104.0, 105.0]
+    bar1, bar2, bar3 = last_open + step, last_open + 2 * step, last_open + 3 * step
+    # 第一个连接推送后断开；重连后先重放已收盘的旧K线（应被忽略），再继续推送，
+    # 其中同一根K线的收盘事件重复推送一次（不能被增量引擎计入两次）
+    scripts = [
+        [(bar1, closes[0], False), (bar1, closes[1], True), (bar2, closes[2], False)],
+        [(last_open, float(df['close'].iloc[-1]), True), (bar1, 99.0, True), (bar2, closes[3], True),
+         (bar2, closes[3], True), (bar3, closes[4], False)],
+    ]
+    subscriptions = []
+    done = threading.Event()
+
+    def handler(websocket):
+        connection = len(subscriptions)
+        subscriptions.append(json.loads(websocket.recv())['params'])
+        for open_time, close, closed in scripts[min(connection, len(scripts) - 1)]:
+            websocket.send(kline_message(symbol, interval, open_time, close, closed, step))
+        if connection == 0:
+            return
+        done.set()
+        for _ in websocket:
+            pass
+
+    with serve(handler, '127.0.0.1', 0) as server:
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        feed = LiveKlineFeed(stream_url=f"ws://127.0.0.1:{server.socket.getsockname()[1]}", tolerance=tolerance)
+        try:
+            feed.watch(symbol, interval, df)
+            deadline = time.time() + 10
+            while time.time() < deadline:
+                bars = feed.bars_since(symbol, interval, bar3)
+                if done.is_set() and bars and bars[0]['close'] == closes[4]:
+                    break
+                time.sleep(0.05)
+
+            expect(subscriptions == [[stream_name(symbol, interval)]] * 2,
+                   f"subscribe + resubscribe after reconnect: {subscriptions}")
+            bars = feed.bars_since(symbol, interval, bar1)
+            got = [(bar['open_time'], bar['close'], bar['closed']) for bar in bars]
+            expected = [(bar1, closes[1], True), (bar2, closes[3], True), (bar3, closes[4], False)]
+            expect(got == expected, f"buffered bars after reconnect (replayed and duplicate closes ignored): {len(got)} bars")
+
+            # 增量指标与全量重算一致（未收盘K线按当前收盘价计算）
+            full = add_all_indicators(pd.DataFrame({'close': np.r_[df['close'].to_numpy(), closes[1], closes[3],
+                                                                   closes[4]]}))
+            worst = 0.0
+            for offset, bar in enumerate(bars, start=seed_bars):
+                for name in chart_app.LIVE_LINE_TRACES:
+                    expected_value = full[name].iloc[offset]
+                    worst = max(worst, abs(bar[name] - expected_value) / abs(expected_value))
+            expect(worst < 1e-9, f"incremental MA/EMA vs full recompute: max rel diff {worst:.2e}")
+
+            # stream_chart：新K线追加到各条曲线末尾，同一根K线按下标原地更新
+            chart_app.live_feed = feed
+            live_state = {'symbol': symbol, 'interval': interval, 'points': seed_bars, 'last_open_time': last_open}
+            patched, live_state = chart_app.stream_chart(1, live_state)
+            operations = patched.to_plotly_json()['operations']
+            appends = [op for op in operations if op['operation'] == 'Append' and op['location'] == ['data', 0, 'close']]
+            expect([op['params']['value'] for op in appends] == [closes[1], closes[3], closes[4]]
+                   and live_state == {'symbol': symbol, 'interval': interval, 'points': seed_bars + 3,
+                                      'last_open_time': bar3},
+                   f"stream_chart appends new bars: {len(appends)} appended, points={live_state['points']}")
+
+            feed.buffers[(symbol, interval)].apply(json.loads(
+                kline_message(symbol, interval, bar3, 106.0, False, step))['data']['k'])
+            patched, live_state = chart_app.stream_chart(2, live_state)
+            operations = patched.to_plotly_json()['operations']
+            assigns = [op for op in operations if op['operation'] == 'Assign' and op['location'][:3] == ['data', 0, 'close']]
+            expect(len(operations) == len(['open', 'high', 'low', 'close']) + len(chart_app.LIVE_LINE_TRACES)
+                   and [(op['location'][3], op['params']['value']) for op in assigns] == [(seed_bars + 2, 106.0)],
+                   f"stream_chart updates the forming bar in place: {len(operations)} operations")
+        finally:
+            feed.stop()
+            server.shutdown()
+    return ok
+
+
+def build_chart_payload(df, tolerance):
+    """
+    update_chart 中构建图表的部分：密集检测、（超过点数预算时）降采样、构建图表和统计信息、序列化为JSON
+    :return: 图表JSON字符串
+    """
+    from chart_app import CHART_POINT_BUDGET, LIVE_LINE_TRACES, build_crossover_info, build_figure
+    from downsample import KlinePyramid
+
+    crossovers = find_all_crossovers(df, tolerance)
+    view = None
+    if len(df) > CHART_POINT_BUDGET:
+        view = KlinePyramid(df, LIVE_LINE_TRACES, CHART_POINT_BUDGET).view()
+    fig = build_figure(df, crossovers, 'BENCH', '1h', view=view)
+    build_crossover_info(crossovers)
+    return fig.to_json()
+
+
+def run_suite(sizes, repeat, tolerance):
+    """
+    用合成K线离线测量热路径各阶段的耗时，不访问网络
+    :param sizes: K线数量列表
+    :param repeat: 每个阶段重复次数（取最快）
+    :param tolerance: 密集容差（小数）
+    :return: 结果列表 [{'stage', 'bars', 'seconds', 'bytes'}]
+    """
+    # 提前导入 chart_app（会加载 Dash/Plotly），不计入第一次图表构建的耗时
+    import chart_app
+
+    results = []
+
+    def record(stage, n_bars, seconds, size=None):
+        results.append({'stage': stage, 'bars': n_bars, 'seconds': seconds, 'bytes': size})
+        print(f"{stage:>24} {n_bars:>10} {seconds:10.4f} {seconds / n_bars * 1e6:10.3f}"
+              f"{'' if size is None else f' {size:>12}'}", flush=True)
+
+    print(f"{'stage':>24} {'bars':>10} {'seconds':>10} {'us/bar':>10} {'bytes':>12}")
+    for n_bars in sizes:
+        payload = make_klines_payload(n_bars)
+        client = BinanceClient(transport=CannedTransport(payload))
+        elapsed, df = time_call(client.get_klines, 'BENCH', '1h', n_bars, repeat=repeat)
+        record('fetch_parse', n_bars, elapsed, len(payload))
+
+        elapsed, df = time_call(add_all_indicators, df, repeat=repeat)
+        record('add_all_indicators', n_bars, elapsed)
+
+        elapsed, _ = time_call(detect_line_convergence, df, tolerance, repeat=repeat)
+        record('detect_line_convergence', n_bars, elapsed)
+
+        elapsed, _ = time_call(detect_crossover, df['MA_20'], df['EMA_60'], tolerance, repeat=repeat)
+        record('detect_crossover', n_bars, elapsed)
+
+        elapsed, figure_json = time_call(build_chart_payload, df, tolerance, repeat=repeat)
+        record('figure_build', n_bars, elapsed, len(figure_json))
+    return results
+
+
+def save_results(path, results, repeat, tolerance):
+    """将基准结果和运行环境写入JSON文件"""
+    report = {
+        'created': datetime.now(timezone.utc).isoformat(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'repeat': repeat,
+        'tolerance': tolerance,
+        'results': results,
+    }
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def compare_results(baseline_path, results, threshold, min_delta):
+    """
+    与基线结果逐项比较，耗时增加超过 threshold 比例且绝对增加超过 min_delta 秒时标记为性能回退
+    :return: 回退项列表
+    """
+    with open(baseline_path) as f:
+        baseline = {(item['stage'], item['bars']): item['seconds'] for item in json.load(f)['results']}
+
+    regressions = []
+    print(f"{'stage':>24} {'bars':>10} {'baseline':>10} {'current':>10} {'ratio':>8}")
+    for item in results:
+        before = baseline.get((item['stage'], item['bars']))
+        if before is None:
+            continue
+        ratio = item['seconds'] / before if before else float('inf')
+        regressed = ratio > 1 + threshold and item['seconds'] - before > min_delta
+        if regressed:
+            regressions.append(item)
+        print(f"{item['stage']:>24} {item['bars']:>10} {before:10.4f} {item['seconds']:10.4f} {ratio:7.2f}x"
+              f"{'  REGRESSION' if regressed else ''}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指标计算与均线密集检测性能基准")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    detection = subparsers.add_parser('detection', help="向量化检测 vs 循环参考实现")
+    detection.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    detection.add_argument('--tolerance', type=float, default=0.03)
+    detection.add_argument('--loop-max', type=int, default=100_000,
+                           help="循环版实际运行的最大规模，更大规模按线性外推（标记为 ~）")
+
+    incremental = subparsers.add_parser('incremental', help="增量指标引擎 vs 全量重算")
+    incremental.add_argument('--bars', type=int, default=10_000)
+    incremental.add_argument('--seed-bars', type=int, default=500)
+    incremental.add_argument('--tolerance', type=float, default=0.03)
+
+    figure = subparsers.add_parser('figure', help="图表构建耗时和JSON大小随密集区域数量的变化")
+    figure.add_argument('--bars', type=int, default=1000)
+    figure.add_argument('--zones', type=int, nargs='+', default=[10, 50, 200])
+
+    parse = subparsers.add_parser('parse', help="K线响应解析耗时和内存占用")
+    parse.add_argument('--bars', type=int, default=10_000)
+
+    batch = subparsers.add_parser('batch', help="多周期MA/EMA批量计算 vs 逐周期计算")
+    batch.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000])
+    batch.add_argument('--periods', type=int, default=40, help="周期数量（5, 10, 15, ...）")
+
+    payload = subparsers.add_parser('payload', help="图表输出 json / compact 编码及 gzip 后的字节数")
+    payload.add_argument('--sizes', type=int, nargs='+', default=[600, 1000, 20_000])
+    payload.add_argument('--tick-size', type=float, default=0.01, help="最小价格变动单位")
+    payload.add_argument('--tolerance', type=float, default=0.03)
+
+    imports = subparsers.add_parser('imports', help="各入口模块在新进程中的冷启动导入耗时")
+    imports.add_argument('--targets', nargs='+', default=IMPORT_TARGETS,
+                         help="模块名，或 模块:函数（导入后调用该函数）")
+    imports.add_argument('--repeat', type=int, default=3)
+    imports.add_argument('--max-seconds', type=float, help="chart_app 以外的模块导入耗时上限，超过时以非0状态退出")
+
+    backends = subparsers.add_parser('backends', help="各计算后端的结果一致性校验和耗时对比")
+    backends.add_argument('--backends', nargs='+', help="要测试的后端，默认为当前环境中可用的全部后端")
+    backends.add_argument('--sizes', type=int, nargs='+', default=[1_000, 100_000, 1_000_000])
+    backends.add_argument('--parity-bars', type=int, default=5_000)
+    backends.add_argument('--tolerance', type=float, default=0.03)
+
+    subparsers.add_parser('rest', help="用本地模拟的REST服务器检查分页边界、权重同步和429退避")
+    subparsers.add_parser('stream', help="用本地模拟的WebSocket服务器检查实时K线推送、重连和 stream_chart 的 Patch")
+
+    suite = subparsers.add_parser('suite', help="离线测量热路径各阶段耗时，保存为JSON并与基线比较")
+    suite.add_argument('--sizes', type=int, nargs='+', default=[1_000, 10_000, 100_000, 1_000_000])
+    suite.add_argument('--repeat', type=int, default=3)
+    suite.add_argument('--tolerance', type=float, default=0.03)
+    suite.add_argument('--output', help="结果JSON文件路径")
+    suite.add_argument('--baseline', help="用于比较的基线结果JSON")
+    suite.add_argument('--threshold', type=float, default=0.2, help="耗时增加超过该比例视为回退")
+    suite.add_argument('--min-delta', type=float, default=0.001, help="忽略绝对增加小于该秒数的波动")
+
+    args = parser.parse_args()
+
+    if args.command == 'detection':
+        check_parity(make_indicator_frame(5_000), args.tolerance)
+        print("parity: ok")
+        bench_detection(args.sizes, args.tolerance, args.loop_max)
+    elif args.command == 'incremental':
+        bench_incremental(args.bars, args.seed_bars, args.tolerance)
+    elif args.command == 'figure':
+        bench_figure(args.bars, args.zones)
+    elif args.command == 'suite':
+        results = run_suite(args.sizes, args.repeat, args.tolerance)
+        if args.output:
+            save_results(args.output, results, args.repeat, args.tolerance)
+        if args.baseline:
+            regressions = compare_results(args.baseline, results, args.threshold, args.min_delta)
+            if regressions:
+                print(f"{len(regressions)} 项性能回退", file=sys.stderr)
+                sys.exit(1)
+    elif args.command == 'batch':
+        bench_batch(args.sizes, args.periods)
+    elif args.command == 'parse':
+        bench_parse(args.bars)
+    elif args.command == 'payload':
+        bench_payload(args.sizes, args.tick_size, args.tolerance)
+    elif args.command == 'imports':
+        if not bench_imports(args.targets, args.repeat, args.max_seconds):
+            sys.exit(1)
+    elif args.command == 'rest':
+        if not check_rest():
+            sys.exit(1)
+    elif args.command == 'stream':
+        if not check_stream():
+            sys.exit(1)
+    elif args.command == 'backends':
+        if not bench_backends(args.backends or available_backends(), args.sizes, args.tolerance, args.parity_bars):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
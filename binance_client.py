@@ -1,23 +1,125 @@
 import requests
-import pandas as pd
+import numpy as np
 from datetime import datetime, timedelta
 import time
+from concurrent.futures import ThreadPoolExecutor
+
+from exchange_info import FALLBACK_SYMBOLS, ExchangeInfoCache
+from kline_store import INTERVAL_MS, KLINE_DTYPE, KlineStore, align_open_time, parse_klines, records_to_frame
+from metrics import timed
+from rate_limiter import klines_weight
+from transport import HttpTransport
+
+# 单次 /api/v3/klines 请求最多返回的K线数量
+MAX_KLINES_PER_REQUEST = 1000
 
 class BinanceClient:
-    def __init__(self):
-        self.base_url = "https://api.binance.com"
+    def __init__(self, store_dir=None, base_url="https://api.binance.com", transport=None, exchange_info_path=None):
+        """
+        :param store_dir: 本地K线存储目录，为None时不启用本地存储
+        :param base_url: API地址，可指向本地模拟服务器
+        :param transport: 共享的HTTP传输层，默认新建（连接池、超时、重试、权重限速）
+        :param exchange_info_path: 交易所元数据的落盘文件，为None时只缓存在内存中
+        """
+        self.transport = transport or HttpTransport(base_url)
+        self.exchange_info = ExchangeInfoCache(self.transport, exchange_info_path)
+        self.store = KlineStore(store_dir) if store_dir else None
+        self._known_gaps = {}
     
-    def get_klines(self, symbol, interval='1h', limit=500, start_time=None, end_time=None):
+    def get_klines(self, symbol, interval='1h', limit=500, start_time=None, end_time=None, columns=None,
+                   price_dtype=None):
         """
         获取K线数据
+        启用本地存储时，已收盘K线优先从本地读取，只向API请求缺失的时间段和未收盘K线
         :param symbol: 交易对符号，如 'BTCUSDT'
         :param interval: 时间间隔 1m,3m,5m,15m,30m,1h,2h,4h,6h,8h,12h,1d,3d,1w,1M
         :param limit: 返回数据条数，默认500，最大1000
         :param start_time: 开始时间戳（毫秒）
         :param end_time: 结束时间戳（毫秒）
+        :param columns: 返回的字段，默认只包含开盘时间、OHLCV和收盘时间（见 KLINE_FRAME_COLUMNS）
+        :param price_dtype: 价格和成交量列的数据类型，如 np.float32，默认 float64
+        """
+        try:
+            if self.store is not None and interval in INTERVAL_MS:
+                records = self._get_klines_from_store(symbol, interval, limit, start_time, end_time)
+            else:
+                records = self._request_klines(symbol, interval, limit, start_time, end_time)
+            return records_to_frame(records, columns, price_dtype)
+            
+        except requests.exceptions.RequestException as e:
+            print(f"请求错误: {e}")
+            return None
+        except Exception as e:
+            print(f"数据处理错误: {e}")
+            return None
+
+    def get_klines_range(self, symbol, interval, start_time, end_time=None, max_workers=4, columns=None,
+                         price_dtype=None):
+        """
+        分页并发获取任意长度的历史K线，突破单次1000条的限制
+        按 start_time/end_time 切分为多页，用有界线程池并发请求，结果拼接、去重并按时间排序；
+        所有请求共享客户端的令牌桶，不会超出请求权重限制。
+        :param symbol: 交易对符号
+        :param interval: 时间间隔
+        :param start_time: 开始时间戳（毫秒）
+        :param end_time: 结束时间戳（毫秒），默认为当前时间
+        :param max_workers: 最大并发请求数
+        :param columns: 返回的字段，同 get_klines
+        :param price_dtype: 价格和成交量列的数据类型，同 get_klines
+        :return: K线数据DataFrame，失败时返回None
         """
+        try:
+            now = int(time.time() * 1000)
+            if end_time is None:
+                end_time = now
+
+            if interval in INTERVAL_MS:
+                step = INTERVAL_MS[interval]
+                first_open = align_open_time(start_time + step - 1, interval)
+                last_open = align_open_time(min(end_time, now), interval)
+                page_span = MAX_KLINES_PER_REQUEST * step
+                pages = [
+                    (page_start, min(page_start + page_span - 1, last_open + step - 1))
+                    for page_start in range(first_open, last_open + 1, page_span)
+                ]
+                with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                    results = list(executor.map(
+                        lambda page: self._request_klines(symbol, interval, MAX_KLINES_PER_REQUEST, *page),
+                        pages
+                    ))
+            else:
+                # 1M 等不定长周期无法预先切分，按顺序翻页
+                results = []
+                page_start = start_time
+                while page_start <= end_time:
+                    records = self._request_klines(symbol, interval, MAX_KLINES_PER_REQUEST, page_start, end_time)
+                    if len(records) == 0:
+                        break
+                    results.append(records)
+                    if len(records) < MAX_KLINES_PER_REQUEST:
+                        break
+                    page_start = int(records['close_time'][-1]) + 1
+
+            records = np.concatenate(results or [np.empty(0, dtype=KLINE_DTYPE)])
+            # 逆序后 unique 保留每个 open_time 最后一页返回的记录
+            reversed_records = records[::-1]
+            _, first = np.unique(reversed_records['open_time'], return_index=True)
+            records = reversed_records[first]
+
+            if self.store is not None and interval in INTERVAL_MS:
+                self.store.append(symbol, interval, records[records['close_time'] < now])
+            return records_to_frame(records, columns, price_dtype)
+
+        except requests.exceptions.RequestException as e:
+            print(f"请求错误: {e}")
+            return None
+        except Exception as e:
+            print(f"数据处理错误: {e}")
+            return None
+
+    def _request_klines(self, symbol, interval, limit, start_time=None, end_time=None):
+        """请求 /api/v3/klines，返回 KLINE_DTYPE 结构化数组"""
         endpoint = "/api/v3/klines"
-        url = self.base_url + endpoint
         
         params = {
             'symbol': symbol,
@@ -29,78 +131,90 @@ class BinanceClient:
             params['startTime'] = start_time
         if end_time:
             params['endTime'] = end_time
-            
-        try:
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 转换为DataFrame
-            df = pd.DataFrame(data, columns=[
-                'open_time', 'open', 'high', 'low', 'close', 'volume',
-                'close_time', 'quote_asset_volume', 'number_of_trades',
-                'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume', 'ignore'
-            ])
-            
-            # 数据类型转换
-            numeric_columns = ['open', 'high', 'low', 'close', 'volume']
-            for col in numeric_columns:
-                df[col] = pd.to_numeric(df[col])
-            
-            # 时间转换
-            df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
-            df['date'] = df['datetime'].dt.date
-            
-            return df
-            
-        except requests.exceptions.RequestException as e:
-            print(f"请求错误: {e}")
-            return None
-        except Exception as e:
-            print(f"数据处理错误: {e}")
-            return None
+
+        with timed('binance_request'):
+            content = self.transport.get_content(endpoint, params, weight=klines_weight(limit))
+        with timed('parse'):
+            return parse_klines(content)
+
+    def _get_klines_from_store(self, symbol, interval, limit, start_time, end_time):
+        """
+        按 get_klines 的语义计算需要的K线范围，补齐本地缺失的已收盘K线后从本地读取
+        :return: KLINE_DTYPE 结构化数组
+        """
+        step = INTERVAL_MS[interval]
+        now = int(time.time() * 1000)
+        current_open = align_open_time(now, interval)
+
+        if start_time is not None:
+            first_open = align_open_time(start_time + step - 1, interval)
+            last_open = first_open + (limit - 1) * step
+            if end_time is not None:
+                last_open = min(last_open, align_open_time(end_time, interval))
+            last_open = min(last_open, current_open)
+        else:
+            last_open = current_open if end_time is None else min(align_open_time(end_time, interval), current_open)
+            first_open = last_open - (limit - 1) * step
+        closed_last = min(last_open, current_open - step)
+
+        key = (symbol, interval)
+        ranges = [
+            (begin, end) for begin, end in self.store.missing_ranges(symbol, interval, first_open, closed_last)
+            if not any(gap_begin <= begin and end <= gap_end
+                       for gap_begin, gap_end in self._known_gaps.get(key, []))
+        ]
+        # 未收盘K线不落盘，合并到最后一段请求里一起获取
+        include_open = last_open >= current_open
+        if include_open:
+            if ranges and ranges[-1][1] == closed_last:
+                ranges[-1] = (ranges[-1][0], current_open)
+            else:
+                ranges.append((current_open, current_open))
+
+        open_records = []
+        for begin, end in ranges:
+            page_start = begin
+            while page_start <= end:
+                records = self._request_klines(symbol, interval, MAX_KLINES_PER_REQUEST, page_start, end + step - 1)
+                if len(records) == 0:
+                    break
+                closed = records['close_time'] < now
+                self.store.append(symbol, interval, records[closed])
+                open_records.append(records[~closed])
+                if len(records) < MAX_KLINES_PER_REQUEST:
+                    break
+                page_start = int(records['open_time'][-1]) + step
+
+        # 请求后仍然缺失的区间视为交易所本身的数据空洞，本进程内不再重复请求
+        for gap in self.store.missing_ranges(symbol, interval, first_open, closed_last):
+            if any(begin <= gap[0] and gap[1] <= end for begin, end in ranges):
+                self._known_gaps.setdefault(key, []).append(gap)
+
+        with timed('store_read'):
+            records = self.store.read(symbol, interval, first_open, closed_last)
+        if include_open:
+            records = np.concatenate([records] + open_records)
+        return records
     
     def get_symbol_info(self, symbol):
-        """获取交易对信息"""
-        endpoint = "/api/v3/exchangeInfo"
-        url = self.base_url + endpoint
-        
-        try:
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            for symbol_info in data['symbols']:
-                if symbol_info['symbol'] == symbol:
-                    return symbol_info
-            return None
-            
-        except Exception as e:
-            print(f"获取交易对信息错误: {e}")
+        """
+        获取交易对信息（来自交易所元数据缓存，首次调用且没有磁盘缓存时请求一次 exchangeInfo）
+        :return: 交易对信息字典，不存在或获取失败时返回None
+        """
+        if not self.exchange_info.ensure_loaded():
             return None
-    
-    def get_all_symbols(self):
-        """获取所有交易对列表"""
-        # 直接返回备用交易对列表，确保总是有数据
-        return [
-            {'symbol': 'BTCUSDT', 'baseAsset': 'BTC', 'quoteAsset': 'USDT'},
-            {'symbol': 'ETHUSDT', 'baseAsset': 'ETH', 'quoteAsset': 'USDT'},
-            {'symbol': 'SOLUSDT', 'baseAsset': 'SOL', 'quoteAsset': 'USDT'},
-            {'symbol': 'ADAUSDT', 'baseAsset': 'ADA', 'quoteAsset': 'USDT'},
-            {'symbol': 'BNBUSDT', 'baseAsset': 'BNB', 'quoteAsset': 'USDT'},
-            {'symbol': 'DOGEUSDT', 'baseAsset': 'DOGE', 'quoteAsset': 'USDT'},
-            {'symbol': 'MATICUSDT', 'baseAsset': 'MATIC', 'quoteAsset': 'USDT'},
-            {'symbol': 'AVAXUSDT', 'baseAsset': 'AVAX', 'quoteAsset': 'USDT'},
-            {'symbol': 'DOTUSDT', 'baseAsset': 'DOT', 'quoteAsset': 'USDT'},
-            {'symbol': 'LINKUSDT', 'baseAsset': 'LINK', 'quoteAsset': 'USDT'},
-            {'symbol': 'ATOMUSDT', 'baseAsset': 'ATOM', 'quoteAsset': 'USDT'},
-            {'symbol': 'UNIUSDT', 'baseAsset': 'UNI', 'quoteAsset': 'USDT'},
-            {'symbol': 'LTCUSDT', 'baseAsset': 'LTC', 'quoteAsset': 'USDT'},
-            {'symbol': 'BCHUSDT', 'baseAsset': 'BCH', 'quoteAsset': 'USDT'},
-            {'symbol': 'XLMUSDT', 'baseAsset': 'XLM', 'quoteAsset': 'USDT'},
-            {'symbol': 'XRPUSDT', 'baseAsset': 'XRP', 'quoteAsset': 'USDT'},
-            {'symbol': 'TRXUSDT', 'baseAsset': 'TRX', 'quoteAsset': 'USDT'},
-            {'symbol': 'EOSUSDT', 'baseAsset': 'EOS', 'quoteAsset': 'USDT'},
-            {'symbol': 'VETUSDT', 'baseAsset': 'VET', 'quoteAsset': 'USDT'},
-            {'symbol': 'FILUSDT', 'baseAsset': 'FIL', 'quoteAsset': 'USDT'}
-        ]
\ No newline at end of file
+        return self.exchange_info.get(symbol)
+
+    def get_all_symbols(self, quote_asset='USDT', wait=True):
+        """
+        获取某个计价资产下所有交易中的交易对
+        :param quote_asset: 计价资产
+        :param wait: 元数据尚未加载时是否同步请求；为False时直接返回内置的常用交易对列表
+        :return: 交易对信息列表（包含 symbol/baseAsset/quoteAsset）
+        """
+        loaded = self.exchange_info.ensure_loaded() if wait else self.exchange_info.loaded
+        symbols = self.exchange_info.symbols(quote_asset) if loaded else []
+        if not symbols and quote_asset == 'USDT':
+            # 确保总是有数据
+            return list(FALLBACK_SYMBOLS)
+        return symbols
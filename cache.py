@@ -0,0 +1,178 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+
+
+def estimate_size(value):
+    """
+    粗略估算缓存值占用的内存字节数
+    DataFrame 按实际数据大小计算，ndarray 及其他提供 nbytes 的对象（如 KlinePyramid）按 nbytes 计算，
+    Plotly 图表按各曲线数组大小计算，容器递归求和
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True).sum())
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(item) for item in value.values())
+    if hasattr(value, 'data') and hasattr(value, 'layout'):
+        size = sys.getsizeof(value)
+        for trace in value.data:
+            for prop in ('x', 'y', 'open', 'high', 'low', 'close'):
+                array = getattr(trace, prop, None)
+                if array is not None:
+                    size += 8 * len(array)
+        return size
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """
+    线程安全的 LRU + TTL 缓存
+    - 每个条目有独立的过期时间（绝对时间戳，秒）
+    - 超过条目数或内存上限时淘汰最久未使用的条目
+    - 统计命中、未命中、过期和淘汰次数
+    """
+
+    def __init__(self, name, max_entries=256, max_bytes=64 * 1024 * 1024, default_ttl=None):
+        """
+        :param name: 缓存名称（用于统计输出）
+        :param max_entries: 最大条目数
+        :param max_bytes: 估算内存上限（字节）
+        :param default_ttl: 默认存活秒数，None表示不过期
+        """
+        self.name = name
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0}
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats['misses'] += 1
+                return default
+            value, expires_at, size = entry
+            if expires_at is not None and time.time() >= expires_at:
+                self._remove(key)
+                self._stats['expired'] += 1
+                self._stats['misses'] += 1
+                return default
+            self._entries.move_to_end(key)
+            self._stats['hits'] += 1
+            return value
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        写入缓存
+        :param ttl: 存活秒数，默认使用 default_ttl
+        :param expires_at: 绝对过期时间戳（秒），优先于 ttl
+        """
+        if expires_at is None:
+            ttl = self.default_ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        size = estimate_size(value)
+        # 单个条目超过内存上限时不缓存
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, expires_at, size)
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self._stats['evictions'] += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, key):
+        _, _, size = self._entries.pop(key)
+        self._bytes -= size
+
+    def stats(self):
+        """
+        :return: 统计数据快照（含当前条目数、估算内存和命中率）
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['entries'] = len(self._entries)
+            stats['bytes'] = self._bytes
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
+
+
+class SingleFlight:
+    """
+    合并同一个键上并发进行的调用
+    第一个调用方执行函数，执行期间到达的调用方等待并共享同一个结果（或异常），不重复执行
+    """
+
+    def __init__(self, name):
+        """
+        :param name: 名称（用于统计输出）
+        """
+        self.name = name
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'calls': 0, 'shared': 0}
+
+    def do(self, key, fn):
+        """
+        :param key: 调用的键
+        :param fn: 无参函数
+        :return: fn 的返回值（可能来自其他线程的同一次调用）
+        """
+        with self._lock:
+            self._stats['calls'] += 1
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = {'done': threading.Event(), 'result': None, 'error': None}
+            else:
+                self._stats['shared'] += 1
+
+        if not leader:
+            call['done'].wait()
+            if call['error'] is not None:
+                raise call['error']
+            return call['result']
+
+        try:
+            call['result'] = fn()
+        except BaseException as e:
+            call['error'] = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call['done'].set()
+        return call['result']
+
+    def stats(self):
+        """
+        :return: 调用次数、合并到进行中调用的次数和当前进行中的调用数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats['in_flight'] = len(self._calls)
+        return stats
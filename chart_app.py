@@ -1,117 +1,401 @@
 import dash
-from dash import dcc, html, Input, Output, callback
+from dash import dcc, html, Input, Output, State, Patch, callback, clientside_callback
 import plotly.graph_objects as go
 from plotly.subplots import make_subplots
+import numpy as np
 import pandas as pd
 import dash_bootstrap_components as dbc
 from datetime import datetime, timedelta
+import os
+import gzip
+import re
+import threading
+import time
+from flask import Response, g, request
 
-from binance_client import BinanceClient
-from indicators import add_all_indicators, find_all_crossovers
+import chart_data
+from cache import LRUCache
+from chart_data import compute_indicators, fetch_klines, indicator_cache, prefetcher
+from indicators import CONVERGENCE_LINES, DEFAULT_PERIODS, LINE_SPREAD, calculate_line_average, find_all_crossovers
+from live_stream import LiveKlineFeed
+from payload import compact_figure, encode_array, encode_candles, encode_line, encode_time_axis
+from downsample import DEFAULT_POINT_BUDGET, KlinePyramid
+from metrics import (CALLBACK_BYTES, PAYLOAD_BYTES, PROFILE_KINDS, REGISTRY, STAGE_SECONDS, RequestProfiler,
+                     cache_collector, singleflight_collector, timed, transport_collector)
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+# 图表允许的最大K线数量，超过单次请求上限时分页回补
+MAX_CHART_BARS = 20000
 
-# 初始化Binance客户端
-binance_client = BinanceClient()
+# K线获取、指标计算及其缓存在 chart_data（不依赖Dash）中；这里只有图表缓存（按全部输入）
+figure_cache = LRUCache('figures', max_entries=128, max_bytes=128 * 1024 * 1024, default_ttl=3600)
+
+# 是否允许按请求开启性能剖析（默认关闭：剖析由客户端触发，且每个请求都会写一个文件）
+PROFILE_ENABLED = os.environ.get('KLINE_PROFILE_ENABLED', '0') == '1'
+# 性能剖析结果的输出目录
+PROFILE_DIR = os.environ.get('KLINE_PROFILE_DIR', 'profiles')
+
+CALLBACK_SECONDS = REGISTRY.histogram('dash_callback_seconds', "Dash回调请求的总耗时", ['trigger'])
+
+# 实时K线推送（开启实时模式后才会建立WebSocket连接）
+live_feed = LiveKlineFeed()
+
+# 实时模式的刷新间隔（毫秒）
+LIVE_INTERVAL_MS = 1000
+
+# 单个视图发送给浏览器的K线/均线点数上限，超过时按缩放范围降采样
+CHART_POINT_BUDGET = DEFAULT_POINT_BUDGET
+
+# 图表数据的编码方式：json 为 plotly 默认的数值列表；compact 为类型化数组 + 按价格精度取整 + 共用时间轴
+# （需要 dcc.Graph 自带的 plotly.js 为 2.28 及以上版本）。实时模式需要按下标增量更新，始终使用 json
+CHART_PAYLOAD = os.environ.get('CHART_PAYLOAD', 'json')
+
+# 回调响应不小于该字节数且浏览器支持时使用 gzip 压缩（CHART_GZIP=0 关闭）
+GZIP_RESPONSES = os.environ.get('CHART_GZIP', '1') != '0'
+GZIP_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+
+
+def get_symbol_options():
+    """全部USDT交易对的下拉选项（元数据尚未加载时为内置的常用交易对）"""
+    return [{'label': f"{symbol['baseAsset']}/USDT ({symbol['symbol']})", 'value': symbol['symbol']}
+            for symbol in chart_data.binance_client.get_all_symbols(wait=False)]
 
-# 获取所有交易对
-print("正在获取交易对列表...")
-all_symbols = binance_client.get_all_symbols()
-symbol_options = [{'label': f"{symbol['baseAsset']}/USDT ({symbol['symbol']})", 'value': symbol['symbol']} 
-                  for symbol in all_symbols]
-print(f"已获取 {len(symbol_options)} 个交易对")
 
 # 定义布局
-app.layout = dbc.Container([
-    dbc.Row([
-        dbc.Col([
-            html.H1("加密货币K线图 - MA/EMA双均线分析", className="text-center mb-4"),
-        ])
-    ]),
+def serve_layout():
+    """每次打开页面时生成布局，交易对列表使用最新的交易所元数据"""
+    return dbc.Container([
+        dbc.Row([
+            dbc.Col([
+                html.H1("加密货币K线图 - MA/EMA双均线分析", className="text-center mb-4"),
+            ])
+        ]),
     
-    dbc.Row([
-        dbc.Col([
-            dbc.Card([
-                dbc.CardBody([
-                    html.H5("交易对设置", className="card-title"),
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Label("交易对:"),
-                            dcc.Dropdown(
-                                id="symbol-dropdown",
-                                options=symbol_options,
-                                value="SOLUSDT",
-                                searchable=True,
-                                placeholder="搜索交易对...",
-                                clearable=False,
-                                style={'fontSize': '14px'}
-                            )
-                        ], width=4),
-                        dbc.Col([
-                            dbc.Label("时间间隔:"),
-                            dcc.Dropdown(
-                                id="interval-dropdown",
-                                options=[
-                                    {'label': '1小时', 'value': '1h'},
-                                    {'label': '4小时', 'value': '4h'},
-                                    {'label': '1天', 'value': '1d'},
-                                    {'label': '1周', 'value': '1w'}
-                                ],
-                                value='4h'
-                            )
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Label("数据条数:"),
-                            dbc.Input(
-                                id="limit-input",
-                                type="number",
-                                value=600,
-                                min=50,
-                                max=1000
-                            )
-                        ], width=3),
-                        dbc.Col([
-                            dbc.Label("密集容差(%):"),
-                            dbc.Input(
-                                id="tolerance-input",
-                                type="number",
-                                value=3.0,
-                                min=0.1,
-                                max=10.0,
-                                step=0.1
-                            )
-                        ], width=2)
-                    ]),
-                    html.Br(),
-                    dbc.Row([
-                        dbc.Col([
-                            dbc.Button("更新图表", id="update-button", color="primary", className="me-2"),
-                            dbc.Button("重置", id="reset-button", color="secondary")
+        dbc.Row([
+            dbc.Col([
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H5("交易对设置", className="card-title"),
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Label("交易对:"),
+                                dcc.Dropdown(
+                                    id="symbol-dropdown",
+                                    options=get_symbol_options(),
+                                    value="SOLUSDT",
+                                    searchable=True,
+                                    placeholder="搜索交易对...",
+                                    clearable=False,
+                                    style={'fontSize': '14px'}
+                                )
+                            ], width=4),
+                            dbc.Col([
+                                dbc.Label("时间间隔:"),
+                                dcc.Dropdown(
+                                    id="interval-dropdown",
+                                    options=[
+                                        {'label': '1小时', 'value': '1h'},
+                                        {'label': '4小时', 'value': '4h'},
+                                        {'label': '1天', 'value': '1d'},
+                                        {'label': '1周', 'value': '1w'}
+                                    ],
+                                    value='4h'
+                                )
+                            ], width=3),
+                            dbc.Col([
+                                dbc.Label("数据条数:"),
+                                dbc.Input(
+                                    id="limit-input",
+                                    type="number",
+                                    value=600,
+                                    min=50,
+                                    max=MAX_CHART_BARS
+                                )
+                            ], width=3),
+                            dbc.Col([
+                                dbc.Label("密集容差(%):"),
+                                dbc.Input(
+                                    id="tolerance-input",
+                                    type="number",
+                                    value=3.0,
+                                    min=0.1,
+                                    max=10.0,
+                                    step=0.1
+                                )
+                            ], width=2)
+                        ]),
+                        html.Br(),
+                        dbc.Row([
+                            dbc.Col([
+                                dbc.Button("更新图表", id="update-button", color="primary", className="me-2"),
+                                dbc.Button("重置", id="reset-button", color="secondary")
+                            ], width="auto"),
+                            dbc.Col([
+                                dbc.Switch(id="live-toggle", label="实时模式", value=False)
+                            ], width="auto", className="d-flex align-items-center")
                         ])
                     ])
                 ])
-            ])
-        ], width=12)
-    ], className="mb-4"),
+            ], width=12)
+        ], className="mb-4"),
+    
+        dbc.Row([
+            dbc.Col([
+                dcc.Loading(
+                    id="loading",
+                    children=[
+                        dcc.Graph(id="kline-chart", style={'height': '1000px'})
+                    ],
+                    type="default",
+                )
+            ], width=12)
+        ]),
+    
+        dbc.Row([
+            dbc.Col([
+                html.Div(id="crossover-info", className="mt-3")
+            ], width=12)
+        ]),
+
+        dcc.Interval(id="live-interval", interval=LIVE_INTERVAL_MS, disabled=True),
+        # 实时模式下图表当前的绘制状态: 交易对、周期、K线数量、最后一根K线的开盘时间
+        dcc.Store(id="live-state"),
+        # 每根K线的6线离散度和多空方向，调整容差时在浏览器端重新划分密集区域
+        dcc.Store(id="spread-store"),
+        # 降采样显示时当前图表对应的数据: 交易对、周期、K线数量、数据版本（缩放时据此取出金字塔）
+        dcc.Store(id="chart-view")
+    ], fluid=True)
+
+
+# 密集区域的背景色和标注样式
+ZONE_STYLES = {
+    'bullish_convergence': {'fillcolor': "rgba(0, 102, 255, 0.1)", 'text': "多头密集", 'font_color': "blue"},
+    'bearish_convergence': {'fillcolor': "rgba(255, 102, 0, 0.1)", 'text': "空头密集", 'font_color': "orange"},
+}
+
+# 快速渲染模式下，密集区域超过该数量时不再逐个添加文字标注
+ZONE_ANNOTATION_LIMIT = 30
+
+def merge_convergence_zones(df, convergences_df):
+    """
+    将连续的同类型密集点合并为区域（多头区域在前、空头区域在后，各自按时间排序）
+    :param df: K线数据（用于把位置转换为时间）
+    :param convergences_df: detect_line_convergence 的结果
+    :return: [(类型, (开始时间, 结束时间)), ...]
+    """
+    times = df['datetime'].to_numpy()[convergences_df['index'].to_numpy()]
+    types = convergences_df['type'].to_numpy()
+    
+    # 类型变化的位置即为新区域的开始
+    starts = np.flatnonzero(np.r_[True, types[1:] != types[:-1]])
+    ends = np.r_[starts[1:] - 1, len(types) - 1]
+    zones = [(types[s], (pd.Timestamp(times[s]), pd.Timestamp(times[e]))) for s, e in zip(starts, ends)]
+    
+    return ([zone for zone in zones if zone[0] == 'bullish_convergence'] +
+            [zone for zone in zones if zone[0] != 'bullish_convergence'])
+
+def build_zone_shapes(zones, annotation_limit=ZONE_ANNOTATION_LIMIT):
+    """
+    一次性生成所有密集区域的 layout.shapes 和 layout.annotations（与 add_vrect 生成的结构相同）
+    :param zones: merge_convergence_zones 的结果
+    :param annotation_limit: 区域数量超过该值时不生成文字标注
+    :return: (shapes, annotations)
+    """
+    shapes = []
+    annotations = []
+    with_annotations = len(zones) <= annotation_limit
+    for zone_type, (start_time, end_time) in zones:
+        style = ZONE_STYLES[zone_type]
+        shapes.append(dict(
+            type="rect", xref="x", yref="y domain", x0=start_time, x1=end_time, y0=0, y1=1,
+            fillcolor=style['fillcolor'], layer="below", line=dict(width=0)
+        ))
+        if with_annotations:
+            annotations.append(dict(
+                x=start_time, xref="x", y=1, yref="y domain", xanchor="left", yanchor="top",
+                text=style['text'], showarrow=False, font=dict(size=10, color=style['font_color'])
+            ))
+    return shapes, annotations
+
+def build_figure(df, crossovers, symbol, interval, fast=True, annotation_limit=ZONE_ANNOTATION_LIMIT,
+                 view=None):
+    """
+    根据指标数据和密集检测结果构建K线图
+    :param df: 添加指标后的K线数据
+    :param crossovers: find_all_crossovers 的结果
+    :param fast: 快速渲染模式：6条均线使用 WebGL (Scattergl)，密集区域一次性批量写入 layout.shapes；
+                 为False时使用逐个 add_vrect 的原始方式
+    :param annotation_limit: 快速模式下密集区域数量超过该值时不再添加区域文字标注
+    :param view: KlinePyramid.view 的结果，指定时K线和均线使用降采样后的数据（密集区域和Y轴范围仍按全量数据计算）
+    :return: go.Figure
+    """
+    # 创建单一图表 - 只显示K线
+    fig = go.Figure()
+    
+    candles = view['candles'] if view is not None else df
+    
+    def line_points(col_name):
+        if view is not None:
+            return view['lines'][col_name]
+        return df['datetime'], df[col_name]
+    
+    # 添加K线图
+    fig.add_trace(
+        go.Candlestick(
+            x=candles['datetime'],
+            open=candles['open'],
+            high=candles['high'],
+            low=candles['low'],
+            close=candles['close'],
+            name='K线',
+            increasing_line_color='#00ff00',
+            decreasing_line_color='#ff0000'
+        )
+    )
+    
+    # 均线数量多时用 WebGL 渲染
+    line_trace = go.Scattergl if fast else go.Scatter
     
-    dbc.Row([
-        dbc.Col([
-            dcc.Loading(
-                id="loading",
-                children=[
-                    dcc.Graph(id="kline-chart", style={'height': '1000px'})
-                ],
-                type="default",
+    # 添加MA线
+    colors_ma = ['#FF6B6B', '#4ECDC4', '#45B7D1']
+    for i, period in enumerate(DEFAULT_PERIODS):
+        col_name = f'MA_{period}'
+        if col_name in df.columns:
+            x, y = line_points(col_name)
+            fig.add_trace(
+                line_trace(
+                    x=x,
+                    y=y,
+                    mode='lines',
+                    name=f'MA{period}',
+                    line=dict(color=colors_ma[i], width=2)
+                )
+            )
+    
+    # 添加EMA线
+    colors_ema = ['#FF9FF3', '#54A0FF', '#5F27CD']
+    for i, period in enumerate(DEFAULT_PERIODS):
+        col_name = f'EMA_{period}'
+        if col_name in df.columns:
+            x, y = line_points(col_name)
+            fig.add_trace(
+                line_trace(
+                    x=x,
+                    y=y,
+                    mode='lines',
+                    name=f'EMA{period}',
+                    line=dict(color=colors_ema[i], width=2, dash='dash')
+                )
+            )
+    
+    # 添加均线密集区域背景色
+    for pair_name, convergences_df in crossovers.items():
+        if not convergences_df.empty:
+            # 将连续的密集区域合并
+            zones = merge_convergence_zones(df, convergences_df)
+            
+            if fast:
+                shapes, annotations = build_zone_shapes(zones, annotation_limit)
+                fig.update_layout(shapes=shapes, annotations=annotations)
+                continue
+            
+            for zone_type, (start_time, end_time) in zones:
+                style = ZONE_STYLES[zone_type]
+                fig.add_vrect(
+                    x0=start_time, x1=end_time,
+                    fillcolor=style['fillcolor'],
+                    layer="below",
+                    line_width=0,
+                    annotation_text=style['text'],
+                    annotation_position="top left",
+                    annotation=dict(font_size=10, font_color=style['font_color'])
+                )
+    
+    
+    # 计算Y轴范围，确保所有均线都可见
+    range_columns = [col for col in CONVERGENCE_LINES + ['high', 'low']
+                     if col in df.columns]
+    range_values = df[range_columns].to_numpy(dtype=float)
+    
+    if len(range_values) and not np.isnan(range_values).all():
+        y_min = np.nanmin(range_values) * 0.98  # 留出2%的边距
+        y_max = np.nanmax(range_values) * 1.02  # 留出2%的边距
+    else:
+        y_min = None
+        y_max = None
+
+    # 更新布局
+    fig.update_layout(
+        title=f'{symbol} - {interval} K线图分析',
+        xaxis_rangeslider_visible=False,
+        height=1000,
+        showlegend=True,
+        legend=dict(
+            orientation="h",
+            yanchor="bottom",
+            y=1.02,
+            xanchor="right",
+            x=1
+        ),
+        xaxis_title="时间",
+        yaxis_title="价格",
+        yaxis=dict(
+            range=[y_min, y_max] if y_min and y_max else None,
+            autorange=True,
+            fixedrange=False
+        ),
+        xaxis=dict(
+            autorange=True,
+            fixedrange=False
+        ),
+        # 同一交易对和时间间隔重新生成图表（刷新、缩放时替换数据）时保留用户的缩放范围
+        uirevision=f'{symbol}-{interval}'
+    )
+
+    return fig
+
+def build_crossover_info(crossovers):
+    """
+    生成均线密集统计信息卡片
+    :param crossovers: find_all_crossovers 的结果
+    :return: 信息组件列表
+    """
+    # 生成均线密集信息
+    crossover_info = []
+    total_convergences = 0
+    
+    for pair_name, convergences_df in crossovers.items():
+        if not convergences_df.empty:
+            total_convergences += len(convergences_df)
+            bullish_convergences = len(convergences_df[convergences_df['type'] == 'bullish_convergence'])
+            bearish_convergences = len(convergences_df[convergences_df['type'] == 'bearish_convergence'])
+            
+            # 构建最近密集信息
+            recent_convergence = convergences_df.iloc[-1]
+            convergence_type_name = "多头密集" if recent_convergence['type'] == 'bullish_convergence' else "空头密集"
+            recent_info = f"最近密集: {convergence_type_name} (强度: {recent_convergence['convergence_strength']:.1%})"
+            
+            crossover_info.append(
+                dbc.Card([
+                    dbc.CardBody([
+                        html.H6("均线密集区域", className="card-title"),
+                        html.P([
+                            f"多头密集: {bullish_convergences} 次 | 空头密集: {bearish_convergences} 次",
+                            html.Br(),
+                            recent_info
+                        ])
+                    ])
+                ], color="primary", outline=True, className="mb-2")
             )
-        ], width=12)
-    ]),
     
-    dbc.Row([
-        dbc.Col([
-            html.Div(id="crossover-info", className="mt-3")
-        ], width=12)
-    ])
-], fluid=True)
+    if total_convergences == 0:
+        crossover_info = [dbc.Alert("在当前设置下未检测到均线密集区域", color="info")]
+    else:
+        crossover_info.insert(0, 
+            dbc.Alert(f"总共检测到 {total_convergences} 个均线密集区域", color="success")
+        )
+
+    return crossover_info
 
 # 重置按钮回调
 @callback(
@@ -127,16 +411,28 @@ def reset_inputs(n_clicks):
         return "SOLUSDT", "4h", 600, 3.0
     return dash.no_update, dash.no_update, dash.no_update, dash.no_update
 
+@callback(
+    Output('live-interval', 'disabled'),
+    Input('live-toggle', 'value')
+)
+def toggle_live(live):
+    return not live
+
 @callback(
     [Output('kline-chart', 'figure'),
-     Output('crossover-info', 'children')],
+     Output('crossover-info', 'children'),
+     Output('live-state', 'data'),
+     Output('spread-store', 'data'),
+     Output('chart-view', 'data')],
     [Input('symbol-dropdown', 'value'),
      Input('interval-dropdown', 'value'),
      Input('limit-input', 'value'),
-     Input('tolerance-input', 'value'),
-     Input('update-button', 'n_clicks')]
+     Input('update-button', 'n_clicks'),
+     Input('live-toggle', 'value')],
+    # 容差只影响阈值判断，由下方的客户端回调处理，不触发服务端重算
+    State('tolerance-input', 'value')
 )
-def update_chart(symbol, interval, limit, tolerance, update_clicks):
+def update_chart(symbol, interval, limit, update_clicks, live=False, tolerance=None):
     # 如果参数为None，使用默认值
     if symbol is None:
         symbol = "SOLUSDT"
@@ -146,215 +442,98 @@ def update_chart(symbol, interval, limit, tolerance, update_clicks):
         limit = 600
     if tolerance is None:
         tolerance = 3.0
-    
+
+    # 点击更新按钮时跳过K线缓存，强制获取最新数据
+    refresh = dash.ctx.triggered_id == 'update-button'
+    result = render_chart(symbol, interval, limit, tolerance, live, refresh)
+    # 之后到响应生成之间的耗时即为Dash的JSON序列化耗时
+    g.callback_finished = time.perf_counter()
+    return result
+
+def get_pyramid(df, version):
+    """构建K线/均线的多分辨率金字塔，按数据版本缓存"""
+    key = (version, 'pyramid')
+    pyramid = indicator_cache.get(key)
+    if pyramid is None:
+        pyramid = KlinePyramid(df, LIVE_LINE_TRACES, CHART_POINT_BUDGET)
+        indicator_cache.set(key, pyramid)
+    return pyramid
+
+def build_spread_data(df, compact=False):
+    """
+    生成客户端重新划分密集区域所需的数据
+    :param df: 添加指标后的K线数据
+    :param compact: 为True时时间轴按 encode_time_axis 编码，离散度和多空方向使用类型化数组
+    :return: {'x': 时间, 'spread': 6线离散度(NaN为None), 'bullish': 收盘价是否高于均线平均值,
+              'annotation_limit': 区域文字标注数量上限}
+    """
+    spread = df[LINE_SPREAD]
+    if compact:
+        return dict(
+            encode_time_axis(df['datetime']),
+            spread=encode_array(spread.to_numpy(dtype=float)),
+            bullish=encode_array((df['close'] > calculate_line_average(df)).to_numpy(), 'u1'),
+            annotation_limit=ZONE_ANNOTATION_LIMIT
+        )
+    return {
+        'x': df['datetime'].dt.strftime('%Y-%m-%dT%H:%M:%S').tolist(),
+        'spread': spread.astype(object).where(spread.notna(), None).tolist(),
+        'bullish': (df['close'] > calculate_line_average(df)).tolist(),
+        'annotation_limit': ZONE_ANNOTATION_LIMIT
+    }
+
+def render_chart(symbol, interval, limit, tolerance, live=False, refresh=False):
+    """
+    获取数据、计算指标、检测密集区域并构建图表，各阶段结果分层缓存
+    :return: (图表, 密集信息组件, 实时模式状态, 离散度数据, 降采样视图状态)
+    """
     try:
-        # 获取K线数据
-        df = binance_client.get_klines(symbol, interval, limit)
-        if df is None or df.empty:
-            return go.Figure(), dbc.Alert("无法获取数据，请检查交易对名称", color="danger")
+        with timed('fetch'):
+            df, version = fetch_klines(symbol, interval, limit, refresh)
+        if df is None:
+            return go.Figure(), dbc.Alert("无法获取数据，请检查交易对名称", color="danger"), None, None, None
+        prefetcher.record(symbol, interval, limit)
         
         # 添加技术指标
-        df = add_all_indicators(df)
-        
-        # 检测交叉点
-        crossovers = find_all_crossovers(df, tolerance/100)
+        with timed('indicators'):
+            df = compute_indicators(df, version)
         
-        # 创建单一图表 - 只显示K线
-        fig = go.Figure()
+        # 实时模式按下标增量更新每一根K线，需要完整数据，不做降采样
+        downsampled = not live and len(df) > CHART_POINT_BUDGET
+        compact = CHART_PAYLOAD == 'compact' and not live
         
-        # 添加K线图
-        fig.add_trace(
-            go.Candlestick(
-                x=df['datetime'],
-                open=df['open'],
-                high=df['high'],
-                low=df['low'],
-                close=df['close'],
-                name='K线',
-                increasing_line_color='#00ff00',
-                decreasing_line_color='#ff0000'
-            )
-        )
-        
-        # 添加MA线
-        colors_ma = ['#FF6B6B', '#4ECDC4', '#45B7D1']
-        for i, period in enumerate([20, 60, 120]):
-            col_name = f'MA_{period}'
-            if col_name in df.columns:
-                fig.add_trace(
-                    go.Scatter(
-                        x=df['datetime'],
-                        y=df[col_name],
-                        mode='lines',
-                        name=f'MA{period}',
-                        line=dict(color=colors_ma[i], width=2)
-                    )
-                )
-        
-        # 添加EMA线
-        colors_ema = ['#FF9FF3', '#54A0FF', '#5F27CD']
-        for i, period in enumerate([20, 60, 120]):
-            col_name = f'EMA_{period}'
-            if col_name in df.columns:
-                fig.add_trace(
-                    go.Scatter(
-                        x=df['datetime'],
-                        y=df[col_name],
-                        mode='lines',
-                        name=f'EMA{period}',
-                        line=dict(color=colors_ema[i], width=2, dash='dash')
-                    )
-                )
-        
-        # 添加均线密集区域背景色
-        for pair_name, convergences_df in crossovers.items():
-            if not convergences_df.empty:
-                # 将连续的密集区域合并
-                bullish_zones = []
-                bearish_zones = []
-                
-                current_bullish_start = None
-                current_bearish_start = None
-                
-                for i, (_, convergence) in enumerate(convergences_df.iterrows()):
-                    conv_time = df.iloc[convergence['index']]['datetime']
-                    
-                    if convergence['type'] == 'bullish_convergence':
-                        # 处理空头区域结束
-                        if current_bearish_start is not None:
-                            bearish_zones.append((current_bearish_start, prev_time))
-                            current_bearish_start = None
-                        
-                        # 开始或继续多头区域
-                        if current_bullish_start is None:
-                            current_bullish_start = conv_time
-                    
-                    else:  # bearish_convergence
-                        # 处理多头区域结束
-                        if current_bullish_start is not None:
-                            bullish_zones.append((current_bullish_start, prev_time))
-                            current_bullish_start = None
-                        
-                        # 开始或继续空头区域
-                        if current_bearish_start is None:
-                            current_bearish_start = conv_time
-                    
-                    prev_time = conv_time
-                
-                # 处理最后的区域
-                if current_bullish_start is not None:
-                    bullish_zones.append((current_bullish_start, prev_time))
-                if current_bearish_start is not None:
-                    bearish_zones.append((current_bearish_start, prev_time))
-                
-                # 添加多头密集背景
-                for start_time, end_time in bullish_zones:
-                    fig.add_vrect(
-                        x0=start_time, x1=end_time,
-                        fillcolor="rgba(0, 102, 255, 0.1)",
-                        layer="below",
-                        line_width=0,
-                        annotation_text="多头密集",
-                        annotation_position="top left",
-                        annotation=dict(font_size=10, font_color="blue")
-                    )
-                
-                # 添加空头密集背景
-                for start_time, end_time in bearish_zones:
-                    fig.add_vrect(
-                        x0=start_time, x1=end_time,
-                        fillcolor="rgba(255, 102, 0, 0.1)",
-                        layer="below",
-                        line_width=0,
-                        annotation_text="空头密集",
-                        annotation_position="top left",
-                        annotation=dict(font_size=10, font_color="orange")
-                    )
-        
-        
-        # 计算Y轴范围，确保所有均线都可见
-        all_ma_values = []
-        for period in [20, 60, 120]:
-            ma_col = f'MA_{period}'
-            ema_col = f'EMA_{period}'
-            if ma_col in df.columns:
-                all_ma_values.extend(df[ma_col].dropna().tolist())
-            if ema_col in df.columns:
-                all_ma_values.extend(df[ema_col].dropna().tolist())
-        
-        # 添加K线的高低点
-        all_ma_values.extend(df['high'].tolist())
-        all_ma_values.extend(df['low'].tolist())
-        
-        if all_ma_values:
-            y_min = min(all_ma_values) * 0.98  # 留出2%的边距
-            y_max = max(all_ma_values) * 1.02  # 留出2%的边距
-        else:
-            y_min = None
-            y_max = None
-
-        # 更新布局
-        fig.update_layout(
-            title=f'{symbol} - {interval} K线图分析',
-            xaxis_rangeslider_visible=False,
-            height=1000,
-            showlegend=True,
-            legend=dict(
-                orientation="h",
-                yanchor="bottom",
-                y=1.02,
-                xanchor="right",
-                x=1
-            ),
-            xaxis_title="时间",
-            yaxis_title="价格",
-            yaxis=dict(
-                range=[y_min, y_max] if y_min and y_max else None,
-                autorange=True,
-                fixedrange=False
-            ),
-            xaxis=dict(
-                autorange=True,
-                fixedrange=False
-            )
-        )
-        
-        # 生成均线密集信息
-        crossover_info = []
-        total_convergences = 0
-        
-        for pair_name, convergences_df in crossovers.items():
-            if not convergences_df.empty:
-                total_convergences += len(convergences_df)
-                bullish_convergences = len(convergences_df[convergences_df['type'] == 'bullish_convergence'])
-                bearish_convergences = len(convergences_df[convergences_df['type'] == 'bearish_convergence'])
-                
-                # 构建最近密集信息
-                recent_convergence = convergences_df.iloc[-1]
-                convergence_type_name = "多头密集" if recent_convergence['type'] == 'bullish_convergence' else "空头密集"
-                recent_info = f"最近密集: {convergence_type_name} (强度: {recent_convergence['convergence_strength']:.1%})"
-                
-                crossover_info.append(
-                    dbc.Card([
-                        dbc.CardBody([
-                            html.H6("均线密集区域", className="card-title"),
-                            html.P([
-                                f"多头密集: {bullish_convergences} 次 | 空头密集: {bearish_convergences} 次",
-                                html.Br(),
-                                recent_info
-                            ])
-                        ])
-                    ], color="primary", outline=True, className="mb-2")
-                )
-        
-        if total_convergences == 0:
-            crossover_info = [dbc.Alert("在当前设置下未检测到均线密集区域", color="info")]
+        figure_key = (version, tolerance, downsampled, compact)
+        cached = figure_cache.get(figure_key)
+        if cached is not None:
+            fig, crossover_info = cached
         else:
-            crossover_info.insert(0, 
-                dbc.Alert(f"总共检测到 {total_convergences} 个均线密集区域", color="success")
-            )
+            # 检测交叉点
+            with timed('detection'):
+                crossovers = find_all_crossovers(df, tolerance/100)
+            
+            with timed('figure'):
+                view = get_pyramid(df, version).view() if downsampled else None
+                fig = build_figure(df, crossovers, symbol, interval, view=view)
+                if compact:
+                    fig = compact_figure(fig, chart_data.binance_client.exchange_info.tick_size(symbol))
+                crossover_info = build_crossover_info(crossovers)
+            figure_cache.set(figure_key, (fig, crossover_info))
         
-        return fig, crossover_info
+        live_state = None
+        if live:
+            live_feed.watch(symbol, interval, df)
+            live_state = {
+                'symbol': symbol,
+                'interval': interval,
+                'points': len(df),
+                'last_open_time': int(df['open_time'].iloc[-1])
+            }
+
+        chart_view = None
+        if downsampled:
+            chart_view = {'symbol': symbol, 'interval': interval, 'limit': limit, 'version': version}
+
+        return fig, crossover_info, live_state, build_spread_data(df, compact), chart_view
         
     except Exception as e:
         error_fig = go.Figure()
@@ -363,7 +542,370 @@ def update_chart(symbol, interval, limit, tolerance, update_clicks):
             xref="paper", yref="paper",
             x=0.5, y=0.5, showarrow=False
         )
-        return error_fig, dbc.Alert(f"发生错误: {str(e)}", color="danger")
+        return error_fig, dbc.Alert(f"发生错误: {str(e)}", color="danger"), None, None, None
+
+# 调整容差时在浏览器端对预先计算的离散度重新做阈值判断，
+# 按与 build_figure / build_crossover_info 相同的规则重绘密集区域和统计信息，无需请求服务端
+clientside_callback(
+    """
+    function(tolerance, spreadData, figure) {
+        const noUpdate = window.dash_clientside.no_update;
+        if (!spreadData || !figure || tolerance === null || tolerance === undefined || tolerance <= 0) {
+            return [noUpdate, noUpdate];
+        }
+        const threshold = tolerance / 100;
+        // compact 编码时数组为 base64 类型化数组，等间隔的时间轴只有 x0/dx
+        const decode = function(values) {
+            if (!values || values.bdata === undefined) {
+                return values;
+            }
+            const binary = atob(values.bdata);
+            const bytes = new Uint8Array(binary.length);
+            for (let i = 0; i < binary.length; i++) {
+                bytes[i] = binary.charCodeAt(i);
+            }
+            const types = {f8: Float64Array, f4: Float32Array, u1: Uint8Array};
+            return new types[values.dtype](bytes.buffer);
+        };
+        const spread = decode(spreadData.spread), bullish = decode(spreadData.bullish);
+        let x = decode(spreadData.x);
+        if (x === undefined) {
+            x = Array.from(spread, function(_, i) { return spreadData.x0 + i * spreadData.dx; });
+        }
+
+        // 连续的同类型密集点合并为一个区域
+        const zones = {bullish: [], bearish: []};
+        const counts = {bullish: 0, bearish: 0};
+        let current = null, start = null, prev = null, last = -1;
+        for (let i = 0; i < spread.length; i++) {
+            if (spread[i] === null || !(spread[i] <= threshold)) {
+                continue;
+            }
+            const type = bullish[i] ? 'bullish' : 'bearish';
+            counts[type] += 1;
+            last = i;
+            if (type !== current) {
+                if (current !== null) {
+                    zones[current].push([start, prev]);
+                }
+                current = type;
+                start = x[i];
+            }
+            prev = x[i];
+        }
+        if (current !== null) {
+            zones[current].push([start, prev]);
+        }
+
+        const styles = {
+            bullish: {fill: 'rgba(0, 102, 255, 0.1)', text: '多头密集', color: 'blue'},
+            bearish: {fill: 'rgba(255, 102, 0, 0.1)', text: '空头密集', color: 'orange'}
+        };
+        const shapes = [], annotations = [];
+        const withAnnotations = zones.bullish.length + zones.bearish.length <= spreadData.annotation_limit;
+        ['bullish', 'bearish'].forEach(function(type) {
+            zones[type].forEach(function(zone) {
+                shapes.push({
+                    type: 'rect', xref: 'x', yref: 'y domain', x0: zone[0], x1: zone[1], y0: 0, y1: 1,
+                    fillcolor: styles[type].fill, layer: 'below', line: {width: 0}
+                });
+                if (!withAnnotations) {
+                    return;
+                }
+                annotations.push({
+                    x: zone[0], xref: 'x', y: 1, yref: 'y domain', xanchor: 'left', yanchor: 'top',
+                    text: styles[type].text, showarrow: false,
+                    font: {size: 10, color: styles[type].color}
+                });
+            });
+        });
+        const newFigure = Object.assign({}, figure, {
+            layout: Object.assign({}, figure.layout, {shapes: shapes, annotations: annotations})
+        });
+
+        const dbc = 'dash_bootstrap_components', html = 'dash_html_components';
+        const total = counts.bullish + counts.bearish;
+        let info;
+        if (total === 0) {
+            info = [{namespace: dbc, type: 'Alert', props: {
+                color: 'info', children: '在当前设置下未检测到均线密集区域'}}];
+        } else {
+            const recentType = bullish[last] ? '多头密集' : '空头密集';
+            const strength = ((1 - spread[last] / threshold) * 100).toFixed(1);
+            info = [
+                {namespace: dbc, type: 'Alert', props: {
+                    color: 'success', children: '总共检测到 ' + total + ' 个均线密集区域'}},
+                {namespace: dbc, type: 'Card', props: {
+                    color: 'primary', outline: true, className: 'mb-2',
+                    children: [{namespace: dbc, type: 'CardBody', props: {children: [
+                        {namespace: html, type: 'H6', props: {
+                            className: 'card-title', children: '均线密集区域'}},
+                        {namespace: html, type: 'P', props: {children: [
+                            '多头密集: ' + counts.bullish + ' 次 | 空头密集: ' + counts.bearish + ' 次',
+                            {namespace: html, type: 'Br', props: {}},
+                            '最近密集: ' + recentType + ' (强度: ' + strength + '%)'
+                        ]}}
+                    ]}}]
+                }}
+            ];
+        }
+        return [newFigure, info];
+    }
+    """,
+    [Output('kline-chart', 'figure', allow_duplicate=True),
+     Output('crossover-info', 'children', allow_duplicate=True)],
+    Input('tolerance-input', 'value'),
+    [State('spread-store', 'data'),
+     State('kline-chart', 'figure')],
+    prevent_initial_call=True
+)
+
+# 图表中各条曲线的顺序（与 update_chart 添加曲线的顺序一致）
+LIVE_LINE_TRACES = [f'MA_{period}' for period in DEFAULT_PERIODS] + [f'EMA_{period}' for period in DEFAULT_PERIODS]
+
+@callback(
+    [Output('kline-chart', 'figure', allow_duplicate=True),
+     Output('live-state', 'data', allow_duplicate=True)],
+    Input('live-interval', 'n_intervals'),
+    State('live-state', 'data'),
+    prevent_initial_call=True
+)
+def stream_chart(n_intervals, live_state):
+    """
+    实时模式：只把最新K线和均线点以 Patch 增量发送给浏览器，不重建整个图表
+    同一根K线按下标原地更新，新K线追加到各条曲线末尾
+    """
+    if not live_state:
+        return dash.no_update, dash.no_update
+
+    bars = live_feed.bars_since(live_state['symbol'], live_state['interval'], live_state['last_open_time'])
+    if not bars:
+        return dash.no_update, dash.no_update
+
+    patched = Patch()
+    points = live_state['points']
+    candle_fields = ['open', 'high', 'low', 'close']
+    for bar in bars:
+        if bar['open_time'] == live_state['last_open_time']:
+            position = points - 1
+            for field in candle_fields:
+                patched['data'][0][field][position] = bar[field]
+            for trace, name in enumerate(LIVE_LINE_TRACES, start=1):
+                patched['data'][trace]['y'][position] = bar[name]
+        else:
+            patched['data'][0]['x'].append(bar['datetime'])
+            for field in candle_fields:
+                patched['data'][0][field].append(bar[field])
+            for trace, name in enumerate(LIVE_LINE_TRACES, start=1):
+                patched['data'][trace]['x'].append(bar['datetime'])
+                patched['data'][trace]['y'].append(bar[name])
+            points += 1
+            live_state['last_open_time'] = bar['open_time']
+
+    live_state['points'] = points
+    return patched, live_state
+
+def parse_xaxis_range(relayout_data):
+    """
+    从 relayoutData 中解析X轴范围
+    :return: (开始时间, 结束时间)，恢复自动范围时为 (None, None)；与X轴无关的事件返回 False
+    """
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        return relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']
+    if 'xaxis.range' in relayout_data:
+        start, end = relayout_data['xaxis.range']
+        return start, end
+    if relayout_data.get('xaxis.autorange'):
+        return None, None
+    return False
+
+@callback(
+    Output('kline-chart', 'figure', allow_duplicate=True),
+    Input('kline-chart', 'relayoutData'),
+    State('chart-view', 'data'),
+    prevent_initial_call=True
+)
+def zoom_chart(relayout_data, chart_view):
+    """
+    缩放/平移时从金字塔中取出可见范围内满足点数预算的最细一层，以 Patch 替换K线和均线数据；
+    同时写入请求的X轴范围，替换数据后不会因为自动范围（包括覆盖全部历史的密集区域）而丢失缩放
+    """
+    if not chart_view or not relayout_data:
+        return dash.no_update
+    x_range = parse_xaxis_range(relayout_data)
+    if x_range is False:
+        return dash.no_update
+
+    pyramid = indicator_cache.get((chart_view['version'], 'pyramid'))
+    if pyramid is None:
+        # 金字塔被淘汰时按当前数据重建
+        df, version = fetch_klines(chart_view['symbol'], chart_view['interval'], chart_view['limit'])
+        if df is None:
+            return dash.no_update
+        pyramid = get_pyramid(compute_indicators(df, version), version)
+
+    view = pyramid.view(*x_range)
+    candles = view['candles']
+    patched = Patch()
+    if x_range == (None, None):
+        patched['layout']['xaxis']['autorange'] = True
+    else:
+        patched['layout']['xaxis']['range'] = list(x_range)
+        patched['layout']['xaxis']['autorange'] = False
+    if CHART_PAYLOAD == 'compact':
+        tick_size = chart_data.binance_client.exchange_info.tick_size(chart_view['symbol'])
+        patched['data'][0].update(encode_candles(candles['datetime'], candles, tick_size))
+        for trace, name in enumerate(LIVE_LINE_TRACES, start=1):
+            x, y = view['lines'][name]
+            patched['data'][trace].update(encode_line(x, y, tick_size, shared_axis=False))
+        return patched
+    patched['data'][0]['x'] = candles['datetime'].tolist()
+    for field in ['open', 'high', 'low', 'close']:
+        patched['data'][0][field] = candles[field].tolist()
+    for trace, name in enumerate(LIVE_LINE_TRACES, start=1):
+        x, y = view['lines'][name]
+        patched['data'][trace]['x'] = pd.to_datetime(x).tolist()
+        patched['data'][trace]['y'] = y.tolist()
+    return patched
+
+def callback_name():
+    """当前Dash回调请求的输出（多个输出时为 ..a.b...c.d.. 形式），用于区分不同的回调"""
+    body = request.get_json(silent=True) or {}
+    return body.get('output', 'unknown')
+
+def gzip_response(response):
+    """浏览器支持且响应足够大时用 gzip 压缩回调响应"""
+    if (not GZIP_RESPONSES or response.direct_passthrough or response.status_code != 200
+            or 'Content-Encoding' in response.headers
+            or 'gzip' not in request.headers.get('Accept-Encoding', '')):
+        return
+    data = response.get_data()
+    if len(data) < GZIP_MIN_BYTES:
+        return
+    response.set_data(gzip.compress(data, compresslevel=GZIP_LEVEL))
+    response.headers['Content-Encoding'] = 'gzip'
+    response.vary.add('Accept-Encoding')
+
+def callback_trigger():
+    """当前Dash回调请求的触发属性，如 update-button.n_clicks；页面初次加载时为 initial"""
+    body = request.get_json(silent=True) or {}
+    changed = body.get('changedPropIds') or ['initial']
+    return changed[0]
+
+def start_request_instrumentation():
+    """
+    记录回调请求的开始时间；开启 KLINE_PROFILE_ENABLED 后，带 X-Profile 请求头或 kline_profile cookie 时
+    对本次请求做性能剖析（已有其他请求在剖析时跳过）
+    """
+    if not request.path.endswith('_dash-update-component'):
+        return
+    g.request_started = time.perf_counter()
+    if not PROFILE_ENABLED:
+        return
+    kind = request.headers.get('X-Profile') or request.cookies.get('kline_profile')
+    if not kind:
+        return
+    if kind not in PROFILE_KINDS:
+        return Response(f"X-Profile 只能是 {'、'.join(PROFILE_KINDS)}\n", status=400,
+                        content_type='text/plain; charset=utf-8')
+    profiler = RequestProfiler(PROFILE_DIR, kind)
+    if profiler.start():
+        g.profiler = profiler
+
+def finish_request_instrumentation(response):
+    """记录回调的序列化耗时、总耗时和响应大小（压缩前和实际发送的字节数），保存性能剖析结果"""
+    if 'request_started' not in g:
+        return response
+    now = time.perf_counter()
+    trigger = callback_trigger()
+    if 'callback_finished' in g:
+        STAGE_SECONDS.observe(now - g.callback_finished, stage='serialize')
+    CALLBACK_SECONDS.observe(now - g.request_started, trigger=trigger)
+    if not response.direct_passthrough:
+        name = callback_name()
+        CALLBACK_BYTES.observe(response.calculate_content_length() or 0, callback=name, size='raw')
+        gzip_response(response)
+        sent = response.calculate_content_length() or 0
+        CALLBACK_BYTES.observe(sent, callback=name, size='wire')
+        PAYLOAD_BYTES.observe(sent, kind=trigger)
+    if 'profiler' in g:
+        path = g.profiler.stop(re.sub(r'[^\w.-]', '_', trigger))
+        print(f"性能剖析已保存: {path}")
+    return response
+
+def metrics_endpoint():
+    """Prometheus 指标"""
+    return Response(REGISTRY.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+def toggle_profile(kind):
+    """
+    为当前浏览器开启/关闭回调请求的性能剖析
+    /profile/cprofile、/profile/pyinstrument 开启，/profile/off 关闭
+    """
+    if kind == 'off':
+        response = Response("性能剖析已关闭\n", content_type='text/plain; charset=utf-8')
+        response.delete_cookie('kline_profile')
+        return response
+    if not PROFILE_ENABLED:
+        return Response("未开启性能剖析（设置环境变量 KLINE_PROFILE_ENABLED=1）\n", status=403,
+                        content_type='text/plain; charset=utf-8')
+    if kind not in PROFILE_KINDS:
+        return Response("kind 只能是 cprofile、pyinstrument 或 off\n", status=400,
+                        content_type='text/plain; charset=utf-8')
+    response = Response(f"已开启 {kind} 性能剖析，结果保存在 {PROFILE_DIR}/\n", content_type='text/plain; charset=utf-8')
+    response.set_cookie('kline_profile', kind)
+    return response
+
+_app = None
+_app_lock = threading.Lock()
+_collectors_registered = False
+
+def register_collectors():
+    """/metrics 输出时读取各级缓存、HTTP传输层和请求合并的统计（只注册一次）"""
+    global _collectors_registered
+    if _collectors_registered:
+        return
+    REGISTRY.register_collector(cache_collector(chart_data.data_caches() + [figure_cache]))
+    REGISTRY.register_collector(transport_collector(chart_data.binance_client.transport))
+    REGISTRY.register_collector(singleflight_collector([chart_data.kline_flight, chart_data.indicator_flight]))
+    _collectors_registered = True
+
+def create_app():
+    """
+    应用工厂：创建Dash应用，注册布局、请求钩子和路由，并启动后台线程
+    交易所元数据由后台线程读取磁盘缓存或请求交易所，创建应用时不等待；
+    元数据加载完成前打开的页面使用内置的常用交易对。
+    回调在导入本模块时注册到Dash的全局回调列表，每个进程只应创建一个应用（见 get_app）
+    :return: dash.Dash
+    """
+    app = dash.Dash(__name__, external_stylesheets=[dbc.themes.BOOTSTRAP])
+    app.layout = serve_layout
+    app.server.before_request(start_request_instrumentation)
+    app.server.after_request(finish_request_instrumentation)
+    app.server.add_url_rule('/metrics', view_func=metrics_endpoint)
+    app.server.add_url_rule('/profile/<kind>', view_func=toggle_profile)
+    register_collectors()
+    chart_data.start_background()
+    return app
+
+def get_app():
+    """本进程的Dash应用，首次调用时通过 create_app 创建"""
+    global _app
+    with _app_lock:
+        if _app is None:
+            _app = create_app()
+    return _app
+
+def __getattr__(name):
+    """
+    模块属性 app / server（WSGI入口，供 gunicorn chart_app:server 等多进程部署使用）在首次访问时才创建应用，
+    只导入本模块中的函数（如基准测试中的 build_figure）时不会创建应用或启动后台线程
+    """
+    if name == 'app':
+        return get_app()
+    if name == 'server':
+        return get_app().server
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 if __name__ == '__main__':
-    app.run_server(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
+    get_app().run_server(debug=True, host='0.0.0.0', port=8050)
\ No newline at end of file
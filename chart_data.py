@@ -0,0 +1,125 @@
+import os
+
+from binance_client import BinanceClient
+from cache import LRUCache, SingleFlight
+from indicators import add_all_indicators
+from prefetch import PrefetchScheduler
+from resample import KlineResampler
+from shared_cache import SharedCache
+
+# 图表的数据层：K线获取、指标计算和各级缓存，不依赖 Dash/Plotly，
+# 预取等后台进程可以只导入本模块；导入时不发起网络请求、不启动线程
+
+# 初始化Binance客户端（已收盘K线和交易所元数据缓存在本地，路径可通过 KLINE_STORE_DIR / EXCHANGE_INFO_PATH 配置）
+binance_client = BinanceClient(store_dir=os.environ.get('KLINE_STORE_DIR', 'data/klines'),
+                               exchange_info_path=os.environ.get('EXCHANGE_INFO_PATH', 'data/exchange_info.json'))
+
+# 4h/1d/1w 由1小时K线在本地聚合，切换周期时共用同一份基础数据
+kline_resampler = KlineResampler(binance_client, base_interval='1h')
+
+# 分层结果缓存：原始K线（到下一根K线收盘过期）、指标数据（按数据版本）
+kline_cache = LRUCache('klines', max_entries=256, max_bytes=256 * 1024 * 1024)
+indicator_cache = LRUCache('indicators', max_entries=128, max_bytes=256 * 1024 * 1024, default_ttl=3600)
+
+# 多进程部署（如 gunicorn 多个worker）时设置 SHARED_CACHE_PATH，各进程共用K线和指标数据，
+# 同一份数据只由一个进程请求和计算
+SHARED_CACHE_PATH = os.environ.get('SHARED_CACHE_PATH')
+shared_cache = SharedCache(SHARED_CACHE_PATH, default_ttl=3600) if SHARED_CACHE_PATH else None
+
+# 同时到达的相同请求只获取/计算一次，其余请求等待并共用结果
+kline_flight = SingleFlight('klines')
+indicator_flight = SingleFlight('indicators')
+
+
+def data_version(symbol, interval, df):
+    """K线数据的版本标识：范围、条数或最新价格变化时版本随之变化"""
+    return (f"{symbol}:{interval}:{int(df['open_time'].iloc[0])}:{int(df['open_time'].iloc[-1])}:"
+            f"{len(df)}:{df['close'].iloc[-1]!r}")
+
+
+def fetch_klines(symbol, interval, limit, refresh=False):
+    """
+    获取K线数据，按 (symbol, interval, limit) 缓存到最新一根K线收盘
+    :return: (K线DataFrame, 数据版本)，获取失败时返回 (None, None)
+    """
+    key = (symbol, interval, limit)
+    if not refresh:
+        cached = kline_cache.get(key)
+        if cached is not None:
+            return cached
+
+    return kline_flight.do((key, refresh), lambda: fetch_klines_uncached(symbol, interval, limit, refresh))
+
+
+def fetch_klines_uncached(symbol, interval, limit, refresh=False):
+    """从共享缓存或重采样器获取K线，并写入本进程缓存"""
+    key = (symbol, interval, limit)
+    if shared_cache is None:
+        result, expires_at = load_klines(symbol, interval, limit, refresh)
+    else:
+        result = shared_cache.get_or_compute(
+            ('klines',) + key, lambda: load_klines(symbol, interval, limit, refresh), refresh
+        )
+        expires_at = None if result is None else (int(result[0]['close_time'].iloc[-1]) + 1) / 1000
+    if result is None:
+        return None, None
+
+    kline_cache.set(key, result, expires_at=expires_at)
+    return result
+
+
+def load_klines(symbol, interval, limit, refresh=False):
+    """
+    向重采样器请求K线
+    :return: ((K线DataFrame, 数据版本), 过期时间戳)，获取失败时返回 (None, None)
+    """
+    df = kline_resampler.get_klines(symbol, interval, limit, refresh)
+    if df is None or df.empty:
+        return None, None
+    return (df, data_version(symbol, interval, df)), (int(df['close_time'].iloc[-1]) + 1) / 1000
+
+
+def compute_indicators(df, version):
+    """添加技术指标，按数据版本缓存（启用共享缓存时各进程共用计算结果）"""
+    indicator_df = indicator_cache.get(version)
+    if indicator_df is None:
+        indicator_df = indicator_flight.do(version, lambda: compute_indicators_uncached(df, version))
+    return indicator_df
+
+
+def compute_indicators_uncached(df, version):
+    """从共享缓存获取或直接计算指标，并写入本进程缓存"""
+    if shared_cache is None:
+        indicator_df = add_all_indicators(df)
+    else:
+        indicator_df = shared_cache.get_or_compute(('indicators', version), lambda: (add_all_indicators(df), None))
+    indicator_cache.set(version, indicator_df)
+    return indicator_df
+
+
+def warm_chart(symbol, interval, limit):
+    """K线收盘后预取数据并计算指标，供之后的请求直接命中缓存"""
+    df, version = fetch_klines(symbol, interval, limit)
+    if df is not None:
+        compute_indicators(df, version)
+
+
+# 收盘预取：每个周期收盘后为最常查看的组合预先获取数据（KLINE_PREFETCH_PAIRS=0 时关闭）
+PREFETCH_PAIRS = int(os.environ.get('KLINE_PREFETCH_PAIRS', 20))
+# 后台线程在 start_background() 中启动，导入本模块没有副作用
+prefetcher = PrefetchScheduler(warm_chart, max_pairs=PREFETCH_PAIRS)
+
+
+def data_caches():
+    """数据层的全部缓存（用于 /metrics 统计）"""
+    return [kline_cache, indicator_cache, kline_resampler.cache] + ([shared_cache] if shared_cache else [])
+
+
+def start_background():
+    """
+    启动后台线程：交易所元数据（先读磁盘缓存，过期后刷新）和收盘预取（KLINE_PREFETCH_PAIRS=0 时不启动）
+    重复调用没有影响
+    """
+    binance_client.exchange_info.start()
+    if PREFETCH_PAIRS > 0:
+        prefetcher.start()
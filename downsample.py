@@ -0,0 +1,169 @@
+import numpy as np
+import pandas as pd
+
+# 默认像素预算：单个视图最多发送给浏览器的K线/均线点数
+DEFAULT_POINT_BUDGET = 2000
+
+
+def aggregate_ohlc(df, factor):
+    """
+    每 factor 根K线聚合为一根：开盘取第一根、最高取最大、最低取最小、收盘取最后一根，成交量求和
+    :param df: K线数据，需包含 datetime/open/high/low/close 列
+    :param factor: 聚合倍数
+    :return: 聚合后的K线DataFrame
+    """
+    if factor <= 1:
+        return df[[col for col in ['datetime', 'open', 'high', 'low', 'close', 'volume'] if col in df.columns]]
+
+    starts = np.arange(0, len(df), factor)
+    ends = np.r_[starts[1:], len(df)] - 1
+    result = {
+        'datetime': df['datetime'].to_numpy()[starts],
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends],
+    }
+    if 'volume' in df.columns:
+        result['volume'] = np.add.reduceat(df['volume'].to_numpy(), starts)
+    return pd.DataFrame(result)
+
+
+def lttb(x, y, n_out):
+    """
+    Largest-Triangle-Three-Buckets 降采样
+    :param x: 横坐标（数值，单调递增）
+    :param y: 纵坐标
+    :param n_out: 输出点数
+    :return: 被选中点的下标数组
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+
+    x = np.asarray(x, dtype=float)
+    y = np.asarray(y, dtype=float)
+    edges = (np.arange(n_out - 1) * (n - 2) / (n_out - 2)).astype(int) + 1
+    edges[-1] = n - 1
+
+    # 每个桶的均值一次性算出；最后一个点单独作为最后一个桶
+    bounds = np.r_[edges, n]
+    counts = np.diff(bounds)
+    mean_x = np.add.reduceat(x, bounds[:-1]) / counts
+    mean_y = np.add.reduceat(y, bounds[:-1]) / counts
+
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    anchor = 0
+    for i in range(n_out - 2):
+        start, end = edges[i], edges[i + 1]
+        # 以上一个选中点和下一个桶的均值为顶点，选出三角形面积最大的点
+        area = np.abs((x[anchor] - mean_x[i + 1]) * (y[start:end] - y[anchor]) -
+                      (x[anchor] - x[start:end]) * (mean_y[i + 1] - y[anchor]))
+        anchor = start + int(np.argmax(area))
+        selected[i + 1] = anchor
+    return selected
+
+
+def line_envelope(x, y, factor):
+    """
+    每 factor 个点为一个桶，保留桶内的最小值点和最大值点（按时间顺序），保证缩小后峰谷不丢失
+    :return: (x, y)
+    """
+    valid = ~np.isnan(y)
+    x, y = x[valid], y[valid]
+    if factor <= 1 or len(y) == 0:
+        return x, y
+
+    n_buckets = -(-len(y) // factor)
+    padded = np.full(n_buckets * factor, np.nan)
+    padded[:len(y)] = y
+    buckets = padded.reshape(n_buckets, factor)
+    offsets = np.arange(n_buckets) * factor
+    min_idx = offsets + np.nanargmin(buckets, axis=1)
+    max_idx = offsets + np.nanargmax(buckets, axis=1)
+
+    # 每个桶内按时间先后排列两个点，同一个点只保留一次
+    indices = np.column_stack([np.minimum(min_idx, max_idx), np.maximum(min_idx, max_idx)]).ravel()
+    indices = indices[np.r_[True, indices[1:] != indices[:-1]]]
+    return x[indices], y[indices]
+
+
+class KlinePyramid:
+    """
+    K线与均线的多分辨率金字塔
+    第 k 层为每 2^k 根K线聚合一次的数据（K线按OHLC聚合，均线保留每个桶的最小/最大值点），
+    一次性预先计算；缩放时只对对应层做二分切片，再把均线用 LTTB 降到像素预算以内。
+    """
+
+    def __init__(self, df, line_columns, budget=DEFAULT_POINT_BUDGET):
+        """
+        :param df: 添加指标后的K线数据
+        :param line_columns: 需要降采样的均线列
+        :param budget: 单个视图的点数预算
+        """
+        self.budget = budget
+        self.line_columns = [col for col in line_columns if col in df.columns]
+        times = df['datetime'].to_numpy()
+
+        self.levels = []
+        factor = 1
+        while True:
+            candles = aggregate_ohlc(df, factor)
+            lines = {
+                col: line_envelope(times, df[col].to_numpy(dtype=float), factor)
+                for col in self.line_columns
+            }
+            self.levels.append({
+                'factor': factor,
+                'candles': candles,
+                'times': candles['datetime'].to_numpy(),
+                'lines': lines,
+            })
+            if len(candles) <= budget:
+                break
+            factor *= 2
+
+    @property
+    def nbytes(self):
+        """各层K线、时间和均线数组占用的字节数（用于缓存的内存上限）"""
+        total = 0
+        for level in self.levels:
+            total += int(level['candles'].memory_usage(index=True).sum()) + level['times'].nbytes
+            total += sum(x.nbytes + y.nbytes for x, y in level['lines'].values())
+        return total
+
+    def view(self, start=None, end=None):
+        """
+        获取 [start, end] 时间窗口内满足点数预算的最细一层数据
+        :param start: 窗口开始时间，None表示从头开始
+        :param end: 窗口结束时间，None表示到最后
+        :return: {'factor': 聚合倍数, 'candles': K线DataFrame, 'lines': {列名: (x, y)}}
+        """
+        start = None if start is None else np.datetime64(pd.Timestamp(start))
+        end = None if end is None else np.datetime64(pd.Timestamp(end))
+
+        for level in self.levels:
+            times = level['times']
+            # 窗口两侧各多保留一根，平移时边缘不留空
+            lo = 0 if start is None else max(np.searchsorted(times, start, side='left') - 1, 0)
+            hi = len(times) if end is None else min(np.searchsorted(times, end, side='right') + 1, len(times))
+            if hi - lo <= self.budget or level is self.levels[-1]:
+                break
+
+        lines = {}
+        for col, (x, y) in level['lines'].items():
+            x_lo = 0 if start is None else max(np.searchsorted(x, start, side='left') - 1, 0)
+            x_hi = len(x) if end is None else min(np.searchsorted(x, end, side='right') + 1, len(x))
+            x, y = x[x_lo:x_hi], y[x_lo:x_hi]
+            if len(x) > self.budget:
+                selected = lttb(x.astype('datetime64[ns]').astype(np.int64), y, self.budget)
+                x, y = x[selected], y[selected]
+            lines[col] = (x, y)
+
+        return {
+            'factor': level['factor'],
+            'candles': level['candles'].iloc[lo:hi],
+            'lines': lines,
+        }
@@ -0,0 +1,171 @@
+import json
+import os
+import threading
+import time
+
+# /api/v3/exchangeInfo 的请求权重
+EXCHANGE_INFO_WEIGHT = 20
+
+# 元数据默认每小时刷新一次
+DEFAULT_TTL = 3600
+# 刷新失败后的重试间隔（秒）
+RETRY_INTERVAL = 60
+
+# 落盘时保留的字段（orderTypes、permissions 等字段占了响应的大部分体积且用不到）
+SYMBOL_FIELDS = [
+    'symbol', 'status', 'baseAsset', 'quoteAsset', 'baseAssetPrecision', 'quoteAssetPrecision', 'filters'
+]
+
+# 元数据尚未加载且无法联网时使用的常用交易对
+FALLBACK_SYMBOLS = [
+    {'symbol': f'{base}USDT', 'baseAsset': base, 'quoteAsset': 'USDT'}
+    for base in ['BTC', 'ETH', 'SOL', 'ADA', 'BNB', 'DOGE', 'MATIC', 'AVAX', 'DOT', 'LINK',
+                 'ATOM', 'UNI', 'LTC', 'BCH', 'XLM', 'XRP', 'TRX', 'EOS', 'VET', 'FIL']
+]
+
+
+class ExchangeInfoCache:
+    """
+    交易所元数据缓存
+    exchangeInfo 只在过期后请求一次并写入磁盘，启动时直接读取磁盘文件；
+    交易对按名称和计价资产建立字典索引，查询为 O(1)。
+    调用 start() 后由后台线程按 TTL 刷新，读取方不会因为网络请求而阻塞；
+    没有后台线程时由 ensure_loaded 在过期后同步刷新。
+    """
+
+    def __init__(self, transport, path=None, ttl=DEFAULT_TTL):
+        """
+        :param transport: HttpTransport
+        :param path: 落盘文件路径，为None时只缓存在内存中
+        :param ttl: 刷新间隔（秒）
+        """
+        self.transport = transport
+        self.path = path
+        self.ttl = ttl
+        self.fetched_at = 0
+        self._attempted_at = 0
+        self._by_symbol = {}
+        self._by_quote = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def loaded(self):
+        return bool(self._by_symbol)
+
+    def is_stale(self):
+        return time.time() - self.fetched_at >= self.ttl
+
+    def _index(self, symbols, fetched_at):
+        by_symbol = {info['symbol']: info for info in symbols}
+        by_quote = {}
+        for info in sorted(symbols, key=lambda info: info['symbol']):
+            by_quote.setdefault(info['quoteAsset'], []).append(info)
+        # 整体替换索引，读取方总是看到完整的一份数据
+        with self._lock:
+            self._by_symbol, self._by_quote, self.fetched_at = by_symbol, by_quote, fetched_at
+
+    def load(self):
+        """
+        从磁盘读取上次保存的元数据（即使已过期也先使用）
+        :return: 是否读取成功
+        """
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path) as f:
+                data = json.load(f)
+            self._index(data['symbols'], data['fetched_at'])
+            return True
+        except Exception as e:
+            print(f"读取交易所元数据错误: {e}")
+            return False
+
+    def refresh(self):
+        """
+        请求 exchangeInfo，更新索引并写入磁盘
+        :return: 是否刷新成功
+        """
+        try:
+            data = self.transport.get_json("/api/v3/exchangeInfo", weight=EXCHANGE_INFO_WEIGHT)
+            symbols = [{field: info[field] for field in SYMBOL_FIELDS if field in info} for info in data['symbols']]
+            fetched_at = time.time()
+            self._index(symbols, fetched_at)
+        except Exception as e:
+            print(f"获取交易所元数据错误: {e}")
+            return False
+
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+                tmp_path = f'{self.path}.{os.getpid()}.tmp'
+                with open(tmp_path, 'w') as f:
+                    json.dump({'fetched_at': fetched_at, 'symbols': symbols}, f, separators=(',', ':'))
+                os.replace(tmp_path, self.path)
+            except OSError as e:
+                print(f"保存交易所元数据错误: {e}")
+        return True
+
+    def ensure_loaded(self):
+        """
+        没有可用数据时先读磁盘；数据已过期且没有后台线程负责刷新时（命令行工具等）同步刷新一次，
+        刷新失败时继续使用旧数据，RETRY_INTERVAL 内不再重试
+        """
+        if not self.loaded:
+            self.load()
+        if (self.is_stale() and self._thread is None
+                and (not self.loaded or time.time() - self._attempted_at >= RETRY_INTERVAL)):
+            self._attempted_at = time.time()
+            self.refresh()
+        return self.loaded
+
+    def start(self):
+        """启动后台线程：先读取磁盘缓存，之后过期时刷新（立即返回，不阻塞启动）"""
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name='exchange-info', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        if not self.loaded:
+            self.load()
+        while not self._stop.is_set():
+            if self.is_stale() and not self.refresh():
+                # 刷新失败时一分钟后重试
+                self._stop.wait(min(RETRY_INTERVAL, self.ttl))
+                continue
+            self._stop.wait(max(0, self.fetched_at + self.ttl - time.time()))
+
+    def get(self, symbol):
+        """
+        :return: 交易对信息字典，不存在时返回None
+        """
+        return self._by_symbol.get(symbol)
+
+    def tick_size(self, symbol):
+        """
+        :return: PRICE_FILTER 中的最小价格变动单位（float），元数据未加载或没有该过滤器时返回None
+        """
+        info = self._by_symbol.get(symbol) or {}
+        for price_filter in info.get('filters', []):
+            if price_filter.get('filterType') == 'PRICE_FILTER' and float(price_filter.get('tickSize', 0)) > 0:
+                return float(price_filter['tickSize'])
+        return None
+
+    def symbols(self, quote_asset=None, status='TRADING'):
+        """
+        :param quote_asset: 计价资产，如 'USDT'；为None时返回全部
+        :param status: 只返回该状态的交易对，为None时不过滤
+        :return: 按名称排序的交易对信息列表
+        """
+        if quote_asset is None:
+            candidates = sorted(self._by_symbol.values(), key=lambda info: info['symbol'])
+        else:
+            candidates = self._by_quote.get(quote_asset, [])
+        if status is None:
+            return list(candidates)
+        return [info for info in candidates if info.get('status') == status]
@@ -0,0 +1,183 @@
+import numbers
+
+import numpy as np
+
+from indicators import (
+    CONVERGENCE_LINES,
+    DEFAULT_PERIODS,
+    add_all_indicators,
+    classify_convergence,
+    current_convergence_zone,
+    detect_line_convergence,
+)
+
+
+class RollingMeanState:
+    """MA增量状态：长度为period的环形缓冲区 + 带补偿的滚动和"""
+
+    def __init__(self, period):
+        self.period = period
+        self.reset()
+
+    def reset(self):
+        self.buffer = np.zeros(self.period)
+        self.head = 0
+        self.count = 0
+        self.total = 0.0
+        self.compensation = 0.0
+
+    def _add(self, value):
+        # Neumaier补偿求和，避免长时间滚动后的累计误差
+        new_total = self.total + value
+        if abs(self.total) >= abs(value):
+            self.compensation += (self.total - new_total) + value
+        else:
+            self.compensation += (value - new_total) + self.total
+        self.total = new_total
+
+    def append(self, value):
+        """追加一根已收盘K线的收盘价"""
+        if self.count == self.period:
+            self._add(-self.buffer[self.head])
+        else:
+            self.count += 1
+        self.buffer[self.head] = value
+        self.head = (self.head + 1) % self.period
+        self._add(value)
+
+    def peek(self, value):
+        """假设追加value后的MA值，不修改状态"""
+        total = self.total + self.compensation + value
+        count = self.count
+        if count == self.period:
+            total -= self.buffer[self.head]
+        else:
+            count += 1
+        if count < self.period:
+            return np.nan
+        return total / self.period
+
+    @property
+    def value(self):
+        if self.count < self.period:
+            return np.nan
+        return (self.total + self.compensation) / self.period
+
+
+class EmaState:
+    """EMA增量状态：只保存上一根K线的EMA值，递推公式与 pandas ewm(adjust=False) 一致"""
+
+    def __init__(self, period):
+        self.period = period
+        self.alpha = 2 / (period + 1)
+        self.value = np.nan
+
+    def peek(self, value):
+        """假设追加value后的EMA值，不修改状态"""
+        if np.isnan(self.value) or self.value == value:
+            return value
+        old_weight = 1. - self.alpha
+        return (old_weight * self.value + self.alpha * value) / (old_weight + self.alpha)
+
+    def append(self, value):
+        """追加一根已收盘K线的收盘价"""
+        self.value = self.peek(value)
+
+
+class IncrementalIndicators:
+    """
+    实时K线的增量指标引擎
+    已收盘K线通过 append 写入状态；未收盘K线通过 update 计算，不修改状态。
+    每根K线的计算量与历史长度无关，只与均线数量有关。
+    """
+
+    def __init__(self, ma_periods=DEFAULT_PERIODS, ema_periods=DEFAULT_PERIODS, tolerance=0.01):
+        """
+        :param ma_periods: MA周期列表
+        :param ema_periods: EMA周期列表
+        :param tolerance: 密集容差百分比，默认1%
+        """
+        self.tolerance = tolerance
+        self.ma_states = {f'MA_{period}': RollingMeanState(period) for period in ma_periods}
+        self.ema_states = {f'EMA_{period}': EmaState(period) for period in ema_periods}
+        self.count = 0
+        # 当前连续密集区域: {'type', 'start_index', 'length'}，不在密集区域时为None
+        self.zone = None
+
+    def seed(self, df):
+        """
+        用历史K线初始化状态（批量计算一次）
+        :param df: 已收盘的K线数据DataFrame，需包含close列
+        :return: 添加指标后的DataFrame
+        """
+        ma_periods = [state.period for state in self.ma_states.values()]
+        ema_periods = [state.period for state in self.ema_states.values()]
+        result_df = add_all_indicators(df, ma_periods, ema_periods)
+
+        closes = df['close'].to_numpy(dtype=float)
+        for state in self.ma_states.values():
+            state.reset()
+            for value in closes[-state.period:]:
+                state.append(value)
+        for name, state in self.ema_states.items():
+            state.value = result_df[name].iloc[-1] if len(result_df) else np.nan
+
+        self.count = len(df)
+        convergences = detect_line_convergence(result_df, self.tolerance)
+        self.zone = current_convergence_zone(convergences, self.count - 1)
+
+        return result_df
+
+    def _compute(self, close, commit):
+        row = {'index': self.count, 'close': close}
+        for name, state in self.ma_states.items():
+            if commit:
+                state.append(close)
+                row[name] = state.value
+            else:
+                row[name] = state.peek(close)
+        for name, state in self.ema_states.items():
+            if commit:
+                state.append(close)
+                row[name] = state.value
+            else:
+                row[name] = state.peek(close)
+
+        convergence = None
+        if all(name in row for name in CONVERGENCE_LINES):
+            convergence = classify_convergence(
+                [row[name] for name in CONVERGENCE_LINES], close, self.tolerance
+            )
+        row['convergence'] = convergence
+        return row
+
+    def update(self, bar):
+        """
+        计算未收盘K线的指标，不修改状态（同一根K线可重复调用）
+        :param bar: K线（含close的dict/Series）或收盘价
+        :return: 指标字典
+        """
+        return self._compute(_bar_close(bar), commit=False)
+
+    def append(self, bar):
+        """
+        写入一根已收盘K线并更新密集区域状态
+        :param bar: K线（含close的dict/Series）或收盘价
+        :return: 指标字典
+        """
+        row = self._compute(_bar_close(bar), commit=True)
+        convergence = row['convergence']
+        if convergence is None:
+            self.zone = None
+        elif self.zone is not None and self.zone['type'] == convergence['type']:
+            self.zone['length'] += 1
+        else:
+            self.zone = {'type': convergence['type'], 'start_index': self.count, 'length': 1}
+        self.count += 1
+        return row
+
+
+def _bar_close(bar):
+    if isinstance(bar, numbers.Real):
+        return float(bar)
+    return float(bar['close'])
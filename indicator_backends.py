@@ -0,0 +1,337 @@
+import os
+
+import numpy as np
+import pandas as pd
+
+
+class PandasBackend:
+    """
+    默认后端：MA/EMA 使用 pandas rolling/ewm，交叉和密集检测使用 NumPy 向量化运算
+    其他后端继承该类，只替换各自更快的部分
+    """
+    name = 'pandas'
+
+    def ma(self, data, period):
+        """
+        :param data: 价格数据 (Series)
+        :return: MA值 (Series)
+        """
+        return data.rolling(window=period).mean()
+
+    def ema(self, data, period):
+        """
+        :param data: 价格数据 (Series)
+        :return: EMA值 (Series)，与 ewm(span=period, adjust=False) 一致
+        """
+        return data.ewm(span=period, adjust=False).mean()
+
+    def crossover(self, short_values, long_values, tolerance):
+        """
+        找出短期均线穿越长期均线、且穿越后差异在容差以内的位置（规则见 detect_crossover_loop）
+        :param short_values: 短期均线数组
+        :param long_values: 长期均线数组
+        :param tolerance: 容差
+        :return: (交叉位置, 是否金叉, 差异比例) 三个数组
+        """
+        current_short = short_values[1:]
+        current_long = long_values[1:]
+        prev_short = short_values[:-1]
+        prev_long = long_values[:-1]
+
+        # 当前或前一根存在NaN的位置全部跳过
+        valid = ~(np.isnan(current_short) | np.isnan(current_long) |
+                  np.isnan(prev_short) | np.isnan(prev_long))
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            current_diff = np.abs(current_short - current_long) / current_long
+        within = valid & (current_diff <= tolerance)
+
+        golden = within & (prev_short <= prev_long) & (current_short > current_long)
+        death = within & ~golden & (prev_short >= prev_long) & (current_short < current_long)
+
+        positions = np.flatnonzero(golden | death)
+        return positions + 1, golden[positions], current_diff[positions]
+
+    def line_spread(self, values):
+        """
+        :param values: 二维数组，每行一根K线、每列一条均线
+        :return: 离散度 (max-min)/min，任一均线为NaN或最小值不为正时为NaN
+        """
+        from indicators import line_spread_array
+        return line_spread_array(values)
+
+    def convergence(self, values, close, spread, tolerance):
+        """
+        找出均线离散度在容差以内的K线（规则见 detect_line_convergence_loop）
+        :param values: 二维数组，每行一根K线、每列一条均线（按 CONVERGENCE_LINES 顺序）
+        :param close: 收盘价数组
+        :param spread: 预先计算的离散度数组，为None时现算
+        :param tolerance: 容差
+        :return: (密集位置, 离散度, 均线平均值, 收盘价是否高于平均值) 四个数组
+        """
+        if spread is None:
+            spread = self.line_spread(values)
+        positions = np.flatnonzero(spread <= tolerance)
+        # 按列顺序逐个累加，保证与逐行 sum() 的浮点结果逐位相同
+        selected = values[positions]
+        total = selected[:, 0].copy()
+        for j in range(1, selected.shape[1]):
+            total += selected[:, j]
+        avg_price = total / selected.shape[1]
+        return positions, spread[positions], avg_price, close[positions] > avg_price
+
+
+class NumpyBackend(PandasBackend):
+    """纯 NumPy 后端：MA/EMA 使用 batch_ma / batch_ema（结果与 pandas 在浮点舍入误差范围内一致）"""
+    name = 'numpy'
+
+    def _apply(self, data, kernel, fallback, period):
+        values = np.asarray(data, dtype=float)
+        # 含NaN的序列按 pandas 的NaN语义处理
+        if np.isnan(values).any():
+            return fallback(self, data, period)
+        return pd.Series(kernel(values, period), index=data.index, name=data.name)
+
+    def ma(self, data, period):
+        from indicators import batch_ma
+        return self._apply(data, lambda values, p: batch_ma(values, [p])[0], PandasBackend.ma, period)
+
+    def ema(self, data, period):
+        from indicators import batch_ema
+        # 只有一个周期时用更大的分块，减少块间进位的Python循环次数
+        return self._apply(data, lambda values, p: batch_ema(values, [p], block=256)[0], PandasBackend.ema, period)
+
+
+_numba_kernels = None
+
+
+def _compile_numba_kernels():
+    """首次使用时编译 Numba 内核（cache=True 时编译结果缓存在 __pycache__ 中）"""
+    global _numba_kernels
+    if _numba_kernels is not None:
+        return _numba_kernels
+    from numba import njit
+
+    @njit(cache=True)
+    def neumaier_add(total, compensation, value):
+        new_total = total + value
+        if abs(total) >= abs(value):
+            compensation += (total - new_total) + value
+        else:
+            compensation += (value - new_total) + total
+        return new_total, compensation
+
+    @njit(cache=True)
+    def ma_kernel(values, period):
+        # 滚动和使用 Neumaier 补偿求和，长序列不累计误差
+        n = len(values)
+        out = np.full(n, np.nan)
+        total = 0.0
+        compensation = 0.0
+        for i in range(n):
+            total, compensation = neumaier_add(total, compensation, values[i])
+            if i >= period:
+                total, compensation = neumaier_add(total, compensation, -values[i - period])
+            if i >= period - 1:
+                out[i] = (total + compensation) / period
+        return out
+
+    @njit(cache=True)
+    def ema_kernel(values, period):
+        # 与 pandas ewm(adjust=False) 的递推逐步相同，结果逐位一致
+        alpha = 1. / (1. + (period - 1.) / 2.)
+        old_weight = 1. - alpha
+        n = len(values)
+        out = np.empty(n)
+        if n == 0:
+            return out
+        weighted = values[0]
+        out[0] = weighted
+        for i in range(1, n):
+            value = values[i]
+            if weighted != value:
+                weighted = (old_weight * weighted + alpha * value) / (old_weight + alpha)
+            out[i] = weighted
+        return out
+
+    @njit(cache=True)
+    def crossover_kernel(short_values, long_values, tolerance):
+        n = len(short_values)
+        positions = np.empty(n, dtype=np.int64)
+        golden = np.empty(n, dtype=np.bool_)
+        diffs = np.empty(n)
+        count = 0
+        for i in range(1, n):
+            current_short = short_values[i]
+            current_long = long_values[i]
+            prev_short = short_values[i - 1]
+            prev_long = long_values[i - 1]
+            if np.isnan(current_short) or np.isnan(current_long) or np.isnan(prev_short) or np.isnan(prev_long):
+                continue
+            diff = abs(current_short - current_long) / current_long
+            if not diff <= tolerance:
+                continue
+            if prev_short <= prev_long and current_short > current_long:
+                is_golden = True
+            elif prev_short >= prev_long and current_short < current_long:
+                is_golden = False
+            else:
+                continue
+            positions[count] = i
+            golden[count] = is_golden
+            diffs[count] = diff
+            count += 1
+        return positions[:count], golden[:count], diffs[:count]
+
+    @njit(cache=True)
+    def spread_kernel(values):
+        n, n_lines = values.shape
+        out = np.full(n, np.nan)
+        for i in range(n):
+            min_value = values[i, 0]
+            max_value = values[i, 0]
+            has_nan = np.isnan(min_value)
+            for j in range(1, n_lines):
+                value = values[i, j]
+                if np.isnan(value):
+                    has_nan = True
+                min_value = min(min_value, value)
+                max_value = max(max_value, value)
+            if not has_nan and min_value > 0:
+                out[i] = (max_value - min_value) / min_value
+        return out
+
+    @njit(cache=True)
+    def convergence_kernel(values, close, spread, tolerance):
+        n, n_lines = values.shape
+        positions = np.empty(n, dtype=np.int64)
+        avg_prices = np.empty(n)
+        count = 0
+        for i in range(n):
+            if not spread[i] <= tolerance:
+                continue
+            total = values[i, 0]
+            for j in range(1, n_lines):
+                total += values[i, j]
+            positions[count] = i
+            avg_prices[count] = total / n_lines
+            count += 1
+        positions = positions[:count]
+        avg_prices = avg_prices[:count]
+        return positions, spread[positions], avg_prices, close[positions] > avg_prices
+
+    _numba_kernels = {
+        'ma': ma_kernel, 'ema': ema_kernel, 'crossover': crossover_kernel,
+        'spread': spread_kernel, 'convergence': convergence_kernel,
+    }
+    return _numba_kernels
+
+
+class NumbaBackend(NumpyBackend):
+    """Numba 后端：EMA递推和交叉/密集检测编译为单次循环（需要安装 numba）"""
+    name = 'numba'
+
+    def __init__(self):
+        self.kernels = _compile_numba_kernels()
+
+    def ma(self, data, period):
+        return self._apply(data, self.kernels['ma'], PandasBackend.ma, period)
+
+    def ema(self, data, period):
+        return self._apply(data, self.kernels['ema'], PandasBackend.ema, period)
+
+    def crossover(self, short_values, long_values, tolerance):
+        return self.kernels['crossover'](short_values, long_values, tolerance)
+
+    def line_spread(self, values):
+        return self.kernels['spread'](np.ascontiguousarray(values))
+
+    def convergence(self, values, close, spread, tolerance):
+        values = np.ascontiguousarray(values)
+        if spread is None:
+            spread = self.kernels['spread'](values)
+        return self.kernels['convergence'](values, close, spread, tolerance)
+
+
+class PolarsBackend(PandasBackend):
+    """Polars 后端：大数据量时 MA/EMA 和离散度使用 Polars 的多线程列运算（需要安装 polars）"""
+    name = 'polars'
+
+    def __init__(self):
+        import polars
+        self.pl = polars
+
+    def _apply(self, data, compute):
+        series = self.pl.Series(np.asarray(data, dtype=float), nan_to_null=True)
+        result = compute(series).to_numpy().astype(float, copy=False)
+        return pd.Series(result, index=data.index, name=data.name)
+
+    def ma(self, data, period):
+        return self._apply(data, lambda series: series.rolling_mean(window_size=period))
+
+    def ema(self, data, period):
+        if np.isnan(np.asarray(data, dtype=float)).any():
+            return super().ema(data, period)
+        return self._apply(data, lambda series: series.ewm_mean(span=period, adjust=False))
+
+    def line_spread(self, values):
+        pl = self.pl
+        frame = pl.DataFrame(np.ascontiguousarray(values), orient='row')
+        extremes = frame.select(min=pl.min_horizontal(pl.all()), max=pl.max_horizontal(pl.all()))
+        min_values = extremes['min'].to_numpy()
+        max_values = extremes['max'].to_numpy()
+
+        with np.errstate(divide='ignore', invalid='ignore'):
+            spread = (max_values - min_values) / min_values
+        valid = ~np.isnan(values).any(axis=1) & (min_values > 0)
+        return np.where(valid, spread, np.nan)
+
+
+# 可选的计算后端
+BACKENDS = {
+    'pandas': PandasBackend,
+    'numpy': NumpyBackend,
+    'numba': NumbaBackend,
+    'polars': PolarsBackend,
+}
+
+_active = None
+
+
+def set_backend(name):
+    """
+    切换 indicators 模块使用的计算后端
+    :param name: pandas / numpy / numba / polars
+    :return: 实际使用的后端名称（未安装对应的库时改用 pandas）
+    """
+    global _active
+    if name not in BACKENDS:
+        print(f"未知的计算后端 {name}，改用 pandas")
+        name = 'pandas'
+    try:
+        _active = BACKENDS[name]()
+    except ImportError as e:
+        print(f"计算后端 {name} 不可用（{e}），改用 pandas")
+        _active = PandasBackend()
+    return _active.name
+
+
+def get_backend():
+    """当前的计算后端，默认由环境变量 INDICATOR_BACKEND 指定（未设置时为 pandas）"""
+    if _active is None:
+        set_backend(os.environ.get('INDICATOR_BACKEND', 'pandas'))
+    return _active
+
+
+def available_backends():
+    """
+    :return: 当前环境中可以使用的后端名称列表
+    """
+    names = []
+    for name, backend in BACKENDS.items():
+        try:
+            backend()
+        except ImportError:
+            continue
+        names.append(name)
+    return names
@@ -1,27 +1,109 @@
 import pandas as pd
 import numpy as np
 
+from indicator_backends import available_backends, get_backend, set_backend
+
+# 默认的MA/EMA周期
+DEFAULT_PERIODS = [20, 60, 120]
+# 参与密集检测的6条均线
+CONVERGENCE_LINES = [f'{kind}_{period}' for period in DEFAULT_PERIODS for kind in ('MA', 'EMA')]
+# 6线离散度 (max-min)/min 的列名
+LINE_SPREAD = 'LINE_SPREAD'
+
 def calculate_ma(data, period):
     """
     计算简单移动平均线 (MA)
     :param data: 价格数据 (Series)
     :param period: 周期
-    :return: MA值
+    :return: MA值（由当前计算后端计算，见 indicator_backends）
     """
-    return data.rolling(window=period).mean()
+    return get_backend().ma(data, period)
 
 def calculate_ema(data, period):
     """
     计算指数移动平均线 (EMA)
     :param data: 价格数据 (Series)
     :param period: 周期
-    :return: EMA值
+    :return: EMA值（由当前计算后端计算，见 indicator_backends）
     """
-    return data.ewm(span=period, adjust=False).mean()
+    return get_backend().ema(data, period)
 
-def detect_crossover(short_line, long_line, tolerance=0.01):
+def batch_ma(close, periods, chunk=4096):
+    """
+    一次计算多个周期的简单移动平均
+    所有周期共用同一个累加和数组，每个周期只做一次错位相减；
+    累加和每 chunk 根K线重新开始（向前多取最大周期的长度），避免长序列的累加和过大损失精度
+    :param close: 收盘价数组（不含NaN）
+    :param periods: 周期列表
+    :param chunk: 分段长度
+    :return: 二维数组，形状为 (len(periods), len(close))，每行前 period-1 个值为NaN
+    """
+    close = np.asarray(close, dtype=float)
+    n_bars = len(close)
+    result = np.full((len(periods), n_bars), np.nan)
+    max_period = max(periods, default=1)
+
+    for start in range(0, n_bars, chunk):
+        stop = min(n_bars, start + chunk)
+        base = max(0, start - max_period)
+        cumsum = np.concatenate([[0.0], np.cumsum(close[base:stop])])
+        for row, period in enumerate(periods):
+            first = max(start, period - 1)
+            if first >= stop:
+                continue
+            upper = cumsum[first + 1 - base:stop + 1 - base]
+            lower = cumsum[first + 1 - period - base:stop + 1 - period - base]
+            result[row, first:stop] = (upper - lower) / period
+    return result
+
+def batch_ema(close, periods, block=32):
+    """
+    一次计算多个周期的EMA，按周期向量化
+    EMA是线性递推 y[t] = (1-alpha)*y[t-1] + alpha*x[t]：把序列切成长度为 block 的块，
+    块内用下三角衰减核做一次批量矩阵乘法，块与块之间只递推一个进位值。
+    平滑系数与 pandas ewm(span, adjust=False) 相同，与 calculate_ema 的差异在浮点舍入误差范围内。
+    :param close: 收盘价数组（不含NaN）
+    :param periods: 周期列表
+    :param block: 分块长度
+    :return: 二维数组，形状为 (len(periods), len(close))
     """
-    检测均线交叉点
+    close = np.asarray(close, dtype=float)
+    periods = np.asarray(periods, dtype=float)
+    alpha = 1. / (1. + (periods - 1.) / 2.)
+    decay = 1. - alpha
+    n_bars, n_periods = len(close), len(periods)
+    if n_bars == 0:
+        return np.empty((n_periods, 0))
+
+    # 第一根K线的EMA等于收盘价，之后的K线按块排列（末尾补0）
+    n_blocks = -(-(n_bars - 1) // block)
+    padded = np.zeros(n_blocks * block)
+    padded[:n_bars - 1] = close[1:]
+    blocks = padded.reshape(n_blocks, block)
+
+    # kernel[k, j, i] = alpha * decay^(j-i)（i <= j），每个周期一个 block x block 的下三角核
+    powers = decay[:, None] ** np.arange(block + 1)
+    lag = np.arange(block)[:, None] - np.arange(block)[None, :]
+    kernel = np.where(lag >= 0, alpha[:, None, None] * powers[:, np.maximum(lag, 0)], 0.)
+    partial = np.matmul(blocks, kernel.transpose(0, 2, 1))
+
+    # 块间进位：每块开始前的EMA值
+    carry = np.empty((n_periods, n_blocks))
+    value = np.full(n_periods, close[0])
+    block_last = partial[:, :, -1]
+    for b in range(n_blocks):
+        carry[:, b] = value
+        value = powers[:, block] * value + block_last[:, b]
+    partial += carry[:, :, None] * powers[:, None, 1:]
+
+    result = np.empty((n_periods, n_bars))
+    result[:, 0] = close[0]
+    result[:, 1:] = partial.reshape(n_periods, -1)[:, :n_bars - 1]
+    return result
+
+def detect_crossover_loop(short_line, long_line, tolerance=0.01):
+    """
+    检测均线交叉点（逐行循环参考实现，用于校验向量化版本）
     :param short_line: 短期均线
     :param long_line: 长期均线
     :param tolerance: 容差百分比，默认1%
@@ -66,7 +148,33 @@ def detect_crossover(short_line, long_line, tolerance=0.01):
     
     return pd.DataFrame(crossovers)
 
-def add_all_indicators(df, ma_periods=[20, 60, 120], ema_periods=[20, 60, 120]):
+def detect_crossover(short_line, long_line, tolerance=0.01):
+    """
+    检测均线交叉点（由当前计算后端实现，结果与 detect_crossover_loop 完全一致）
+    :param short_line: 短期均线
+    :param long_line: 长期均线
+    :param tolerance: 容差百分比，默认1%
+    :return: 交叉点信息DataFrame
+    """
+    short_values = np.asarray(short_line, dtype=float)
+    long_values = np.asarray(long_line, dtype=float)
+
+    if len(short_values) < 2:
+        return pd.DataFrame()
+
+    positions, golden, current_diff = get_backend().crossover(short_values, long_values, tolerance)
+    if len(positions) == 0:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        'index': positions,
+        'type': np.where(golden, 'golden_cross', 'death_cross').astype(object),
+        'short_value': short_values[positions],
+        'long_value': long_values[positions],
+        'difference_pct': current_diff * 100
+    })
+
+def add_all_indicators(df, ma_periods=DEFAULT_PERIODS, ema_periods=DEFAULT_PERIODS):
     """
     为K线数据添加所有技术指标
     :param df: K线数据DataFrame
@@ -83,12 +191,16 @@ def add_all_indicators(df, ma_periods=[20, 60, 120], ema_periods=[20, 60, 120]):
     # 添加EMA指标
     for period in ema_periods:
         result_df[f'EMA_{period}'] = calculate_ema(result_df['close'], period)
+
+    # 预先计算6线离散度，调整容差时只需重新比较阈值
+    if all(col in result_df.columns for col in CONVERGENCE_LINES):
+        result_df[LINE_SPREAD] = calculate_line_spread(result_df)
     
     return result_df
 
-def detect_line_convergence(df, tolerance=0.01):
+def detect_line_convergence_loop(df, tolerance=0.01):
     """
-    检测6条均线的密集区域 - 当所有均线之间的差异都在容差范围内时
+    检测6条均线的密集区域（逐行循环参考实现，用于校验向量化版本）
     :param df: 包含MA和EMA指标的DataFrame
     :param tolerance: 容差百分比，默认1%
     :return: 均线密集点信息DataFrame
@@ -141,6 +253,118 @@ def detect_line_convergence(df, tolerance=0.01):
     
     return pd.DataFrame(convergences)
 
+def calculate_line_spread(df):
+    """
+    计算每根K线6条均线的离散度 (max-min)/min
+    任一均线为NaN或最小值不为正时结果为NaN；密集判断只需对该序列做阈值比较
+    :param df: 包含MA和EMA指标的DataFrame
+    :return: 离散度 (Series)
+    """
+    spread = get_backend().line_spread(df[CONVERGENCE_LINES].to_numpy(dtype=float))
+    return pd.Series(spread, index=df.index, name=LINE_SPREAD)
+
+def line_spread_array(values):
+    """
+    计算任意多条均线的离散度 (max-min)/min
+    :param values: 二维数组，每行一根K线、每列一条均线
+    :return: 离散度数组，任一均线为NaN或最小值不为正时为NaN
+    """
+    min_values = values.min(axis=1)
+    max_values = values.max(axis=1)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        spread = (max_values - min_values) / min_values
+    valid = ~np.isnan(values).any(axis=1) & (min_values > 0)
+    return np.where(valid, spread, np.nan)
+
+def calculate_line_average(df):
+    """
+    计算每根K线6条均线的平均值
+    按列顺序逐个累加，保证与逐行 sum() 的浮点结果逐位相同
+    :param df: 包含MA和EMA指标的DataFrame
+    :return: 均线平均值 (Series)
+    """
+    values = df[CONVERGENCE_LINES].to_numpy(dtype=float)
+    total = values[:, 0].copy()
+    for j in range(1, values.shape[1]):
+        total += values[:, j]
+    return pd.Series(total / values.shape[1], index=df.index)
+
+def detect_line_convergence(df, tolerance=0.01):
+    """
+    检测6条均线的密集区域（由当前计算后端实现，结果与 detect_line_convergence_loop 完全一致）
+    对6列均线组成的二维数组做一次 min/max 归约，用布尔掩码完成NaN、除零和容差判断
+    :param df: 包含MA和EMA指标的DataFrame（已有 LINE_SPREAD 列时直接使用）
+    :param tolerance: 容差百分比，默认1%
+    :return: 均线密集点信息DataFrame
+    """
+    if not all(col in df.columns for col in CONVERGENCE_LINES):
+        return pd.DataFrame()
+    if len(df) == 0:
+        return pd.DataFrame()
+
+    spread = df[LINE_SPREAD].to_numpy(dtype=float) if LINE_SPREAD in df.columns else None
+    positions, diff_pct, avg_price, bullish = get_backend().convergence(
+        df[CONVERGENCE_LINES].to_numpy(dtype=float), df['close'].to_numpy(dtype=float), spread, tolerance
+    )
+    if len(positions) == 0:
+        return pd.DataFrame()
+
+    return pd.DataFrame({
+        'index': positions,
+        'type': np.where(bullish, 'bullish_convergence', 'bearish_convergence').astype(object),
+        'avg_price': avg_price,
+        'max_diff_pct': diff_pct,
+        'convergence_strength': 1 - (diff_pct / tolerance)
+    })
+
+def classify_convergence(line_values, close, tolerance=0.01):
+    """
+    判断单根K线的6条均线是否处于密集状态（与 detect_line_convergence 的逐行判断一致）
+    :param line_values: 按 CONVERGENCE_LINES 顺序排列的均线值
+    :param close: 当前收盘价
+    :param tolerance: 容差百分比
+    :return: 密集信息字典（不含index），不密集时返回None
+    """
+    if any(pd.isna(value) for value in line_values):
+        return None
+
+    min_value = min(line_values)
+    max_value = max(line_values)
+    if min_value <= 0:
+        return None
+
+    max_diff_pct = (max_value - min_value) / min_value
+    if max_diff_pct > tolerance:
+        return None
+
+    avg_price = sum(line_values) / len(line_values)
+    return {
+        'type': 'bullish_convergence' if close > avg_price else 'bearish_convergence',
+        'avg_price': avg_price,
+        'max_diff_pct': max_diff_pct,
+        'convergence_strength': 1 - (max_diff_pct / tolerance)
+    }
+
+def current_convergence_zone(convergences, last_index):
+    """
+    找出截至 last_index 仍在持续的同类型连续密集区域
+    :param convergences: detect_line_convergence 的结果
+    :param last_index: 最新K线的位置
+    :return: {'type', 'start_index', 'length'}，最新K线不在密集区域时返回None
+    """
+    if convergences.empty or convergences['index'].iloc[-1] != last_index:
+        return None
+
+    indices = convergences['index'].to_numpy()
+    types = convergences['type'].to_numpy()
+    last_type = types[-1]
+    length = 1
+    while (length < len(indices) and types[-length - 1] == last_type and
+           indices[-length - 1] == indices[-length] - 1):
+        length += 1
+    return {'type': last_type, 'start_index': int(indices[-length]), 'length': length}
+
 def find_all_crossovers(df, tolerance=0.01):
     """
     找出均线密集区域 - 检测6条均线密集的位置
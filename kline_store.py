@@ -0,0 +1,257 @@
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+
+try:
+    import fcntl
+except ImportError:
+    # 非Unix平台没有 flock，只在进程内加锁
+    fcntl = None
+
+# 落盘的K线记录格式（与 /api/v3/klines 返回字段一一对应，去掉无用的 ignore 字段）
+KLINE_DTYPE = np.dtype([
+    ('open_time', 'i8'),
+    ('open', 'f8'),
+    ('high', 'f8'),
+    ('low', 'f8'),
+    ('close', 'f8'),
+    ('volume', 'f8'),
+    ('close_time', 'i8'),
+    ('quote_asset_volume', 'f8'),
+    ('number_of_trades', 'i8'),
+    ('taker_buy_base_asset_volume', 'f8'),
+    ('taker_buy_quote_asset_volume', 'f8'),
+])
+
+# API返回的每根K线的字段数（比 KLINE_DTYPE 多一个 ignore 字段）
+RAW_KLINE_FIELDS = 12
+
+# get_klines 默认返回的列
+KLINE_FRAME_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume', 'close_time']
+
+MINUTE_MS = 60 * 1000
+HOUR_MS = 60 * MINUTE_MS
+DAY_MS = 24 * HOUR_MS
+
+# 各时间间隔的毫秒数（1M 为自然月，长度不固定，不支持本地存储）
+INTERVAL_MS = {
+    '1m': MINUTE_MS, '3m': 3 * MINUTE_MS, '5m': 5 * MINUTE_MS, '15m': 15 * MINUTE_MS,
+    '30m': 30 * MINUTE_MS, '1h': HOUR_MS, '2h': 2 * HOUR_MS, '4h': 4 * HOUR_MS,
+    '6h': 6 * HOUR_MS, '8h': 8 * HOUR_MS, '12h': 12 * HOUR_MS, '1d': DAY_MS,
+    '3d': 3 * DAY_MS, '1w': 7 * DAY_MS,
+}
+
+# 周线从周一 00:00 UTC 开始，1970-01-01 是周四，因此对齐基准偏移4天
+WEEK_OFFSET_MS = 4 * DAY_MS
+
+
+def align_open_time(timestamp, interval):
+    """
+    将毫秒时间戳向下对齐到所在K线的开盘时间
+    :param timestamp: 毫秒时间戳
+    :param interval: 时间间隔
+    :return: 开盘时间（毫秒）
+    """
+    step = INTERVAL_MS[interval]
+    offset = WEEK_OFFSET_MS if interval == '1w' else 0
+    return (timestamp - offset) // step * step + offset
+
+
+def klines_to_records(data):
+    """
+    将API返回的K线列表转换为 KLINE_DTYPE 结构化数组
+    :param data: /api/v3/klines 返回的二维列表
+    :return: 结构化数组
+    """
+    records = np.empty(len(data), dtype=KLINE_DTYPE)
+    if len(data) == 0:
+        return records
+    columns = list(zip(*data))
+    for i, name in enumerate(KLINE_DTYPE.names):
+        records[name] = np.asarray(columns[i], dtype=KLINE_DTYPE[name])
+    return records
+
+
+def parse_klines(payload):
+    """
+    直接从 /api/v3/klines 的原始响应内容解析为 KLINE_DTYPE 结构化数组
+    去掉括号和引号后整体交给 NumPy 按逗号解析，不为每个字段创建Python对象
+    （时间戳和成交笔数都小于 2^53，经 float64 中转不损失精度）
+    :param payload: 响应内容（bytes 或 str）
+    :return: 结构化数组
+    """
+    if isinstance(payload, str):
+        payload = payload.encode()
+    text = payload.translate(None, b'[]" \t\r\n')
+    if not text:
+        return np.empty(0, dtype=KLINE_DTYPE)
+
+    values = np.fromstring(text, sep=',').reshape(-1, RAW_KLINE_FIELDS)
+    records = np.empty(len(values), dtype=KLINE_DTYPE)
+    for i, name in enumerate(KLINE_DTYPE.names):
+        records[name] = values[:, i]
+    return records
+
+
+def records_to_frame(records, columns=None, price_dtype=None):
+    """
+    将结构化数组转换为 get_klines 返回的DataFrame格式
+    :param records: KLINE_DTYPE 结构化数组
+    :param columns: 需要的字段，默认为 KLINE_FRAME_COLUMNS；其余字段仍保存在记录中，需要时再取出
+    :param price_dtype: 价格和成交量列的数据类型，如 np.float32，默认保持 float64
+    :return: K线数据DataFrame
+    """
+    # 只在需要DataFrame时导入 pandas，只做存储读写的进程（如归档导入）不必加载
+    import pandas as pd
+
+    columns = KLINE_FRAME_COLUMNS if columns is None else columns
+    data = {}
+    for name in columns:
+        column = records[name]
+        if price_dtype is not None and column.dtype.kind == 'f':
+            column = column.astype(price_dtype)
+        data[name] = column
+    df = pd.DataFrame(data)
+    df['datetime'] = pd.to_datetime(df['open_time'], unit='ms')
+    return df
+
+
+class KlineStore:
+    """
+    本地K线列式存储，每个 (symbol, interval) 对应一个追加写入的二进制记录文件
+    - 写入: 只追加，不修改已有数据
+    - 读取: 内存映射，按 open_time 二分查找切片
+    - 压缩: 追加了乱序或重复数据后，按 open_time 排序去重并原子替换文件
+    只保存已收盘的K线，未收盘K线永远从API获取。
+    多个进程（如 gunicorn 的多个 worker）可以共用同一个存储目录：追加、压缩和读取时的自动压缩
+    都在 (symbol, interval) 的文件锁（同目录下的 .lock 文件，flock）内进行。
+    """
+
+    def __init__(self, root_dir):
+        """
+        :param root_dir: 存储根目录
+        """
+        self.root_dir = root_dir
+        self._locks = {}
+        self._locks_guard = threading.Lock()
+
+    def path(self, symbol, interval):
+        return os.path.join(self.root_dir, symbol, f'{interval}.bin')
+
+    @contextmanager
+    def _lock(self, symbol, interval):
+        """
+        (symbol, interval) 的排他锁：先加进程内的线程锁（flock 对同一进程内的多个线程不互斥），
+        再对 .lock 文件加跨进程的 flock
+        """
+        with self._locks_guard:
+            thread_lock = self._locks.setdefault((symbol, interval), threading.Lock())
+        with thread_lock:
+            if fcntl is None:
+                yield
+                return
+            path = self.path(symbol, interval)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 关闭文件即释放 flock
+            with open(path + '.lock', 'a') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                yield
+
+    def _map(self, path):
+        """内存映射整个文件；末尾不完整的记录（写入中断）会被忽略"""
+        if not os.path.exists(path):
+            return np.empty(0, dtype=KLINE_DTYPE)
+        count = os.path.getsize(path) // KLINE_DTYPE.itemsize
+        if count == 0:
+            return np.empty(0, dtype=KLINE_DTYPE)
+        return np.memmap(path, dtype=KLINE_DTYPE, mode='r', shape=(count,))
+
+    def append(self, symbol, interval, records):
+        """
+        追加已收盘K线记录
+        :param records: KLINE_DTYPE 结构化数组
+        """
+        if len(records) == 0:
+            return
+        path = self.path(symbol, interval)
+        with self._lock(symbol, interval):
+            with open(path, 'ab') as f:
+                f.write(np.ascontiguousarray(records, dtype=KLINE_DTYPE).tobytes())
+
+    def compact(self, symbol, interval):
+        """
+        按 open_time 排序去重（保留最后写入的记录），写入临时文件后原子替换
+        :return: 压缩后的记录数
+        """
+        with self._lock(symbol, interval):
+            return self._compact_locked(self.path(symbol, interval))
+
+    def _compact_locked(self, path):
+        """compact 的实现，调用方需持有该文件的锁"""
+        records = np.array(self._map(path))
+        if len(records) == 0:
+            return 0
+        # 逆序后 unique 取到的是每个 open_time 最后写入的那条
+        reversed_records = records[::-1]
+        _, first = np.unique(reversed_records['open_time'], return_index=True)
+        compacted = reversed_records[first]
+
+        # 每次压缩使用独立的临时文件，避免与其他进程的临时文件互相覆盖
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=os.path.basename(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(compacted.tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return len(compacted)
+
+    def read(self, symbol, interval, start_time=None, end_time=None):
+        """
+        读取 [start_time, end_time] 范围内（按 open_time）的记录
+        文件无序时先自动压缩；返回内存映射上的切片，不复制数据
+        :return: KLINE_DTYPE 结构化数组
+        """
+        path = self.path(symbol, interval)
+        if not os.path.exists(path):
+            return np.empty(0, dtype=KLINE_DTYPE)
+        with self._lock(symbol, interval):
+            records = self._map(path)
+            open_times = records['open_time']
+            if len(records) > 1 and not np.all(open_times[1:] > open_times[:-1]):
+                self._compact_locked(path)
+                records = self._map(path)
+                open_times = records['open_time']
+
+        lo = 0 if start_time is None else np.searchsorted(open_times, start_time, side='left')
+        hi = len(records) if end_time is None else np.searchsorted(open_times, end_time, side='right')
+        return records[lo:hi]
+
+    def missing_ranges(self, symbol, interval, start_time, end_time):
+        """
+        计算 [start_time, end_time] 范围内本地缺失的K线区间
+        :return: [(起始open_time, 结束open_time), ...]
+        """
+        if start_time > end_time:
+            return []
+        step = INTERVAL_MS[interval]
+        open_times = self.read(symbol, interval, start_time, end_time)['open_time']
+        if len(open_times) == 0:
+            return [(start_time, end_time)]
+
+        ranges = []
+        if open_times[0] > start_time:
+            ranges.append((start_time, int(open_times[0]) - step))
+        gap_positions = np.flatnonzero(np.diff(open_times) > step)
+        for pos in gap_positions:
+            ranges.append((int(open_times[pos]) + step, int(open_times[pos + 1]) - step))
+        if open_times[-1] < end_time:
+            ranges.append((int(open_times[-1]) + step, end_time))
+        return ranges
@@ -0,0 +1,203 @@
+import json
+import random
+import threading
+import time
+from collections import OrderedDict
+
+import pandas as pd
+from websockets.sync.client import connect
+
+from incremental import IncrementalIndicators
+
+# 内存中为每个 (symbol, interval) 保留的最近K线数量
+BUFFER_BARS = 500
+
+
+def stream_name(symbol, interval):
+    """Binance K线流名称，如 btcusdt@kline_4h"""
+    return f"{symbol.lower()}@kline_{interval}"
+
+
+class LiveKlineBuffer:
+    """
+    单个 (symbol, interval) 的实时K线缓冲区
+    K线推送事件先更新未收盘K线，收盘事件写入增量指标引擎；每根K线附带最新的MA/EMA值。
+    """
+
+    def __init__(self, symbol, interval, tolerance=0.01):
+        self.symbol = symbol
+        self.interval = interval
+        self.engine = IncrementalIndicators(tolerance=tolerance)
+        self.bars = OrderedDict()
+        self.forming = None
+        # 最后一根写入增量引擎的已收盘K线的开盘时间
+        self.last_closed = None
+        self._lock = threading.Lock()
+
+    def seed(self, df):
+        """
+        用REST获取的K线初始化（最后一根若未收盘则作为当前K线）
+        :param df: get_klines 返回的DataFrame
+        """
+        now = int(time.time() * 1000)
+        closed = df[df['close_time'] < now]
+        with self._lock:
+            self.engine.seed(closed)
+            self.bars.clear()
+            self.forming = None
+            self.last_closed = int(closed['open_time'].iloc[-1]) if len(closed) else None
+            if len(closed) < len(df):
+                last = df.iloc[-1]
+                self._apply_locked({
+                    'open_time': int(last['open_time']), 'open': float(last['open']),
+                    'high': float(last['high']), 'low': float(last['low']),
+                    'close': float(last['close']), 'closed': False,
+                })
+
+    def _apply_locked(self, bar):
+        # 上一根K线错过了收盘事件时，在新K线到来时补写入引擎
+        if self.forming is not None and bar['open_time'] > self.forming['open_time']:
+            self.engine.append(self.forming)
+            self.last_closed = self.forming['open_time']
+            self.forming = None
+
+        if bar['closed']:
+            row = self.engine.append(bar)
+            self.last_closed = bar['open_time']
+            self.forming = None
+        else:
+            row = self.engine.update(bar)
+            self.forming = bar
+
+        entry = dict(bar)
+        entry['datetime'] = pd.to_datetime(bar['open_time'], unit='ms')
+        entry.update({name: value for name, value in row.items() if name.startswith(('MA_', 'EMA_'))})
+        self.bars[bar['open_time']] = entry
+        while len(self.bars) > BUFFER_BARS:
+            self.bars.popitem(last=False)
+
+    def apply(self, kline):
+        """
+        应用一条K线推送（payload 中的 'k' 对象）
+        :param kline: {'t': 开盘时间, 'o', 'h', 'l', 'c', 'x': 是否收盘, ...}
+        """
+        bar = {
+            'open_time': int(kline['t']), 'open': float(kline['o']), 'high': float(kline['h']),
+            'low': float(kline['l']), 'close': float(kline['c']), 'closed': bool(kline['x']),
+        }
+        with self._lock:
+            last_open = next(reversed(self.bars)) if self.bars else None
+            # 重连后可能收到早于已有数据的推送，直接忽略
+            if last_open is not None and bar['open_time'] < last_open:
+                return
+            # 已收盘K线的重复推送（包括重连后重放的收盘事件）不能再次写入增量引擎，否则同一收盘价会被计入两次
+            if self.last_closed is not None and bar['open_time'] <= self.last_closed:
+                return
+            self._apply_locked(bar)
+
+    def bars_since(self, open_time):
+        """
+        :param open_time: 起始开盘时间（包含）
+        :return: 该时间之后（含）的K线列表，按时间排序
+        """
+        with self._lock:
+            return [bar for key, bar in self.bars.items() if key >= open_time]
+
+
+class LiveKlineFeed:
+    """
+    后台K线推送消费者：一个 WebSocket 连接订阅所有关注的K线流，写入各自的内存缓冲区
+    断线后带抖动的指数退避重连，并自动重新订阅。
+    """
+
+    def __init__(self, stream_url="wss://stream.binance.com:9443/stream", tolerance=0.01):
+        """
+        :param stream_url: 组合流地址，可指向本地模拟服务器
+        :param tolerance: 增量密集判断的容差（小数）
+        """
+        self.stream_url = stream_url
+        self.tolerance = tolerance
+        self.buffers = {}
+        self._pending = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._stop = threading.Event()
+        self._request_id = 0
+
+    def watch(self, symbol, interval, df):
+        """
+        开始（或重新）关注一个 (symbol, interval)，用REST数据初始化缓冲区
+        :return: LiveKlineBuffer
+        """
+        key = (symbol, interval)
+        with self._lock:
+            buffer = self.buffers.get(key)
+            if buffer is None:
+                buffer = LiveKlineBuffer(symbol, interval, self.tolerance)
+                self.buffers[key] = buffer
+                self._pending.append(stream_name(symbol, interval))
+        buffer.seed(df)
+        self.start()
+        return buffer
+
+    def bars_since(self, symbol, interval, open_time):
+        buffer = self.buffers.get((symbol, interval))
+        return buffer.bars_since(open_time) if buffer is not None else []
+
+    def start(self):
+        """启动后台消费线程（已启动时忽略）"""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='kline-stream', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+
+    def _subscribe(self, websocket, streams):
+        self._request_id += 1
+        websocket.send(json.dumps({'method': 'SUBSCRIBE', 'params': streams, 'id': self._request_id}))
+
+    def _handle(self, message):
+        payload = json.loads(message)
+        data = payload.get('data', payload)
+        if data.get('e') != 'kline':
+            return
+        kline = data['k']
+        buffer = self.buffers.get((kline['s'], kline['i']))
+        if buffer is not None:
+            buffer.apply(kline)
+
+    def _run(self):
+        attempt = 0
+        while not self._stop.is_set():
+            try:
+                with connect(self.stream_url) as websocket:
+                    attempt = 0
+                    with self._lock:
+                        self._pending = []
+                        streams = [stream_name(*key) for key in self.buffers]
+                    if streams:
+                        self._subscribe(websocket, streams)
+
+                    while not self._stop.is_set():
+                        with self._lock:
+                            pending, self._pending = self._pending, []
+                        if pending:
+                            self._subscribe(websocket, pending)
+                        try:
+                            message = websocket.recv(timeout=1)
+                        except TimeoutError:
+                            continue
+                        self._handle(message)
+            except Exception as e:
+                if self._stop.is_set():
+                    break
+                delay = min(30.0, 0.5 * 2 ** attempt)
+                attempt += 1
+                print(f"K线推送连接中断: {e}，{delay:.1f}秒后重连")
+                self._stop.wait(delay / 2 + random.uniform(0, delay / 2))
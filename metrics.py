@@ -0,0 +1,303 @@
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# 延迟直方图的默认分桶（秒）
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+# 数据大小直方图的默认分桶（字节）
+SIZE_BUCKETS = tuple(1024 * 4 ** i for i in range(10))
+
+
+def _format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+               for value in labels.values())
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(labels, escaped)) + '}'
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """带标签的指标基类：每组标签值对应一个独立的样本"""
+    kind = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} 需要标签 {self.labelnames}，实际为 {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_sample(dict(zip(self.labelnames, key)), value))
+        return lines
+
+
+class Counter(_Metric):
+    """单调递增计数器"""
+    kind = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_sample(self, labels, value):
+        return [f'{self.name}{_format_labels(labels)} {_format_value(value)}']
+
+
+class Gauge(Counter):
+    """可任意设置的瞬时值"""
+    kind = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+
+class Histogram(_Metric):
+    """累计分桶直方图"""
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets) + (float('inf'),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state['counts'][i] += 1
+                    break
+            state['sum'] += value
+            state['count'] += 1
+
+    def _render_sample(self, labels, state):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets, state['counts']):
+            cumulative += count
+            lines.append(f'{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {cumulative}')
+        lines.append(f'{self.name}_sum{_format_labels(labels)} {_format_value(state["sum"])}')
+        lines.append(f'{self.name}_count{_format_labels(labels)} {state["count"]}')
+        return lines
+
+
+class MetricsRegistry:
+    """
+    指标注册表，按 Prometheus 文本格式输出
+    除了直接记录的指标，还可以注册采集函数，在每次输出时读取缓存、传输层等对象的统计快照
+    """
+
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+        self._lock = threading.Lock()
+
+    def _register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def register_collector(self, collect):
+        """
+        :param collect: 无参函数，返回 [(指标名, 类型, 说明, [(标签字典, 值), ...]), ...]
+        """
+        with self._lock:
+            self._collectors.append(collect)
+
+    def render(self):
+        """
+        :return: Prometheus 文本格式 (text/plain; version=0.0.4)
+        """
+        with self._lock:
+            metrics = list(self._metrics)
+            collectors = list(self._collectors)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        for collect in collectors:
+            for name, kind, documentation, samples in collect():
+                lines.append(f'# HELP {name} {documentation}')
+                lines.append(f'# TYPE {name} {kind}')
+                for labels, value in samples:
+                    lines.append(f'{name}{_format_labels(labels)} {_format_value(value)}')
+        return '\n'.join(lines) + '\n'
+
+
+# 全局注册表和热路径指标
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'kline_stage_seconds',
+    "图表请求各阶段耗时（binance_request/parse/store_read/fetch/indicators/detection/figure/serialize）", ['stage'])
+API_REQUEST_SECONDS = REGISTRY.histogram(
+    'binance_request_seconds', "Binance REST 请求延迟（含重试的每一次尝试）", ['endpoint', 'status'])
+API_RESPONSE_BYTES = REGISTRY.histogram(
+    'binance_response_bytes', "Binance REST 响应大小", ['endpoint'], buckets=SIZE_BUCKETS)
+API_WEIGHT = REGISTRY.counter(
+    'binance_request_weight_total', "本进程发出的请求权重合计", ['endpoint'])
+API_USED_WEIGHT = REGISTRY.gauge(
+    'binance_used_weight', "最近一次响应头 X-MBX-USED-WEIGHT-1M 的值（包含其他进程的请求）")
+PAYLOAD_BYTES = REGISTRY.histogram(
+    'kline_payload_bytes', "发送给浏览器的数据大小", ['kind'], buckets=SIZE_BUCKETS)
+CALLBACK_BYTES = REGISTRY.histogram(
+    'dash_callback_bytes', "各回调的响应大小（size=raw 为压缩前，size=wire 为实际发送）", ['callback', 'size'],
+    buckets=SIZE_BUCKETS)
+
+
+@contextmanager
+def timed(stage):
+    """记录一段代码的耗时到 kline_stage_seconds{stage=...}"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - start, stage=stage)
+
+
+def cache_collector(caches):
+    """
+    生成 LRUCache 统计的采集函数
+    :param caches: LRUCache 列表
+    """
+    def collect():
+        stats = [(cache.name, cache.stats()) for cache in caches]
+        return [
+            (f'kline_cache_{field}_total', 'counter', f"缓存{label}次数",
+             [({'cache': name}, snapshot[field]) for name, snapshot in stats])
+            for field, label in [('hits', '命中'), ('misses', '未命中'), ('expired', '过期'), ('evictions', '淘汰')]
+        ] + [
+            ('kline_cache_entries', 'gauge', "缓存条目数", [({'cache': name}, s['entries']) for name, s in stats]),
+            ('kline_cache_bytes', 'gauge', "缓存估算内存", [({'cache': name}, s['bytes']) for name, s in stats]),
+        ]
+    return collect
+
+
+def singleflight_collector(flights):
+    """生成 SingleFlight 统计（调用次数、合并次数）的采集函数"""
+    def collect():
+        stats = [(flight.name, flight.stats()) for flight in flights]
+        return [
+            ('kline_singleflight_calls_total', 'counter', "调用次数", [({'name': name}, s['calls']) for name, s in stats]),
+            ('kline_singleflight_shared_total', 'counter', "合并到进行中调用的次数",
+             [({'name': name}, s['shared']) for name, s in stats]),
+        ]
+    return collect
+
+
+def transport_collector(transport):
+    """生成 HttpTransport 统计（请求、重试、错误、限速等待）的采集函数"""
+    def collect():
+        stats = transport.stats()
+        return [
+            ('binance_requests_total', 'counter', "请求次数（含重试）", [({}, stats['requests'])]),
+            ('binance_retries_total', 'counter', "重试次数", [({}, stats['retries'])]),
+            ('binance_errors_total', 'counter', "重试耗尽后失败的请求数", [({}, stats['errors'])]),
+            ('binance_throttle_seconds_total', 'counter', "令牌桶限速等待的总秒数", [({}, stats['throttle_seconds'])]),
+        ]
+    return collect
+
+
+# 支持的性能剖析方式
+PROFILE_KINDS = ('cprofile', 'pyinstrument')
+
+# 同一进程同时只能有一个剖析器处于开启状态（cProfile 重复 enable 会抛出 ValueError）
+_profile_lock = threading.Lock()
+
+
+class RequestProfiler:
+    """
+    单个请求的性能剖析：默认使用 cProfile，输出 .prof 文件（可用 snakeviz 等工具查看）；
+    指定 pyinstrument 且已安装时输出 .html 调用树。
+    进程内同一时间只剖析一个请求，其他并发请求不做剖析
+    """
+
+    def __init__(self, output_dir='profiles', kind='cprofile'):
+        """
+        :param kind: cprofile 或 pyinstrument
+        """
+        if kind not in PROFILE_KINDS:
+            raise ValueError(f"不支持的性能剖析方式: {kind}")
+        self.output_dir = output_dir
+        self.kind = kind
+        self._profiler = None
+
+    def start(self):
+        """
+        开始剖析
+        :return: 是否已开始；已有其他请求在剖析时返回False（本次请求不剖析）
+        """
+        if not _profile_lock.acquire(blocking=False):
+            return False
+        try:
+            if self.kind == 'pyinstrument':
+                try:
+                    from pyinstrument import Profiler
+                except ImportError:
+                    print("未安装 pyinstrument，改用 cProfile")
+                    self.kind = 'cprofile'
+                else:
+                    self._profiler = Profiler()
+                    self._profiler.start()
+                    return True
+            import cProfile
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+            return True
+        except Exception:
+            _profile_lock.release()
+            raise
+
+    def stop(self, label):
+        """
+        停止剖析并写入文件
+        :param label: 文件名前缀
+        :return: 输出文件路径
+        """
+        try:
+            if self.kind == 'pyinstrument':
+                self._profiler.stop()
+            else:
+                self._profiler.disable()
+        finally:
+            _profile_lock.release()
+        os.makedirs(self.output_dir, exist_ok=True)
+        stamp = time.strftime('%Y%m%d-%H%M%S') + f'-{time.time_ns() % 1_000_000_000:09d}'
+        if self.kind == 'pyinstrument':
+            path = os.path.join(self.output_dir, f'{label}-{stamp}.html')
+            with open(path, 'w') as f:
+                f.write(self._profiler.output_html())
+        else:
+            path = os.path.join(self.output_dir, f'{label}-{stamp}.prof')
+            self._profiler.dump_stats(path)
+        return path
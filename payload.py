@@ -0,0 +1,137 @@
+import base64
+from decimal import Decimal
+
+import numpy as np
+import pandas as pd
+
+# plotly.js 类型化数组支持的数据类型（小端序）
+TYPED_ARRAY_DTYPES = {'f8': '<f8', 'f4': '<f4', 'u1': 'u1'}
+
+CANDLE_FIELDS = ['open', 'high', 'low', 'close']
+
+
+def encode_array(values, dtype='f8'):
+    """
+    编码为 plotly.js 的类型化数组 {'dtype', 'bdata'}（base64），
+    浏览器端直接还原为 Float64Array 等，不需要逐个解析十进制文本
+    :param values: 数值数组
+    :param dtype: f8 / f4 / u1
+    :return: 类型化数组字典
+    """
+    data = np.ascontiguousarray(values, dtype=TYPED_ARRAY_DTYPES[dtype])
+    return {'dtype': dtype, 'bdata': base64.b64encode(data.tobytes()).decode('ascii')}
+
+
+def tick_decimals(tick_size):
+    """
+    :param tick_size: 最小价格变动单位，如 0.01
+    :return: 对应的小数位数，如 2
+    """
+    return max(0, -Decimal(repr(float(tick_size))).normalize().as_tuple().exponent)
+
+
+def round_to_tick(values, tick_size=None):
+    """
+    按最小价格变动单位取整（均线等计算值也取整到同样的精度）
+    :param tick_size: 最小价格变动单位，为None时不取整
+    :return: 浮点数组
+    """
+    values = np.asarray(values, dtype=float)
+    if not tick_size:
+        return values
+    return np.round(np.round(values / tick_size) * tick_size, tick_decimals(tick_size))
+
+
+def encode_prices(values, tick_size=None):
+    """
+    按价格精度取整后编码；float32 与取整值的误差都小于半个价格单位时使用 f4（大小减半），
+    配合按价格精度格式化的悬停文本，显示的数值与 f8 相同
+    :param values: 价格数组
+    :param tick_size: 最小价格变动单位，为None时不取整且使用 f8
+    :return: 类型化数组字典
+    """
+    values = round_to_tick(values, tick_size)
+    if tick_size:
+        single = values.astype('<f4')
+        error = np.abs(single.astype(float) - values)
+        if np.all((error < tick_size / 2) | np.isnan(values)):
+            return encode_array(single, 'f4')
+    return encode_array(values, 'f8')
+
+
+def to_epoch_ms(times):
+    """
+    :param times: 时间数组（datetime64、Timestamp 或时间字符串）
+    :return: 毫秒时间戳（float64，date 类型的坐标轴按毫秒时间戳解释数值）
+    """
+    return pd.DatetimeIndex(times).as_unit('ms').asi8.astype(float)
+
+
+def encode_time_axis(times):
+    """
+    编码横坐标：等间隔时只发送 {'x0': 首个时间, 'dx': 间隔}，多条曲线共用同一组K线时间时不再重复发送；
+    存在缺口时发送毫秒时间戳的类型化数组
+    :param times: 时间数组
+    :return: 可直接合并到曲线中的字段字典
+    """
+    ms = to_epoch_ms(times)
+    if len(ms) > 1:
+        steps = np.diff(ms)
+        if (steps == steps[0]).all():
+            return {'x0': ms[0], 'dx': steps[0]}
+    return {'x': encode_array(ms)}
+
+
+def encode_candles(times, ohlc, tick_size=None):
+    """
+    编码K线曲线的数据字段（Candlestick 不支持 x0/dx，时间总是以类型化数组发送）
+    :param times: 时间数组
+    :param ohlc: {'open': 数组, 'high': ..., 'low': ..., 'close': ...}
+    :return: 可直接合并到K线曲线中的字段字典
+    """
+    fields = {'x': encode_array(to_epoch_ms(times))}
+    for field in CANDLE_FIELDS:
+        fields[field] = encode_prices(ohlc[field], tick_size)
+    return fields
+
+
+def encode_line(times, values, tick_size=None, shared_axis=True):
+    """
+    编码均线曲线的数据字段，开头的NaN（均线预热期）直接去掉
+    :param shared_axis: 为True时等间隔的时间用 x0/dx 表示；增量替换已有曲线的数据时应为False
+                        （曲线已有 x 数组时 x0/dx 不生效）
+    :return: 可直接合并到均线曲线中的字段字典
+    """
+    values = np.asarray(values, dtype=float)
+    valid = np.flatnonzero(~np.isnan(values))
+    start = valid[0] if len(valid) else len(values)
+    times = np.asarray(times)[start:]
+    fields = encode_time_axis(times) if shared_axis else {'x': encode_array(to_epoch_ms(times))}
+    fields['y'] = encode_prices(values[start:], tick_size)
+    return fields
+
+
+def compact_figure(fig, tick_size=None):
+    """
+    把 build_figure 生成的图表转换为精简的 plotly JSON 字典：
+    K线和均线数据使用类型化数组，价格取整到最小价格变动单位，等间隔的均线共用K线的时间轴（x0/dx）
+    需要 plotly.js 2.28 及以上版本（支持 bdata 类型化数组）
+    :param fig: go.Figure
+    :param tick_size: 最小价格变动单位，为None时不取整
+    :return: 图表字典，可直接作为 dcc.Graph 的 figure
+    """
+    figure = fig.to_plotly_json()
+    # 数据从曲线对象读取原始数组（新版 plotly 的 to_plotly_json 可能已经把数值数组转为 f8 类型化数组）
+    for source, trace in zip(fig.data, figure['data']):
+        if source.type == 'candlestick':
+            trace.update(encode_candles(source.x, {field: source[field] for field in CANDLE_FIELDS}, tick_size))
+        elif source.y is not None:
+            trace.pop('x', None)
+            trace.update(encode_line(source.x, source.y, tick_size))
+
+    layout = figure.setdefault('layout', {})
+    # 横坐标为毫秒时间戳，需要明确指定为时间轴
+    layout.setdefault('xaxis', {})['type'] = 'date'
+    if tick_size:
+        layout.setdefault('yaxis', {})['hoverformat'] = f'.{tick_decimals(tick_size)}f'
+    return figure
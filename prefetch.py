@@ -0,0 +1,111 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from kline_store import INTERVAL_MS, align_open_time
+from metrics import REGISTRY
+
+PREFETCH_TOTAL = REGISTRY.counter('kline_prefetch_total', "K线收盘后预取的次数", ['interval', 'status'])
+
+
+def next_close_time(interval, now_ms):
+    """
+    :param interval: 时间间隔
+    :param now_ms: 当前毫秒时间戳
+    :return: 当前这根K线收盘后的第一个毫秒时间戳（即下一根K线的开盘时间）
+    """
+    return align_open_time(now_ms, interval) + INTERVAL_MS[interval]
+
+
+class PrefetchScheduler:
+    """
+    K线收盘预取
+    记录每个 (交易对, 周期) 的查看次数，后台线程只在各周期K线收盘时唤醒，
+    收盘后立即为该周期最常查看的交易对重新获取数据，用户请求到达时缓存已经是最新的。
+    查看次数在每次预取后按 decay 衰减，长时间没人看的组合会逐渐退出预取列表。
+    """
+
+    def __init__(self, warm, max_pairs=20, delay=1.0, decay=0.5, workers=4):
+        """
+        :param warm: 预取函数 warm(symbol, interval, limit)
+        :param max_pairs: 每个周期收盘时最多预取的组合数
+        :param delay: 收盘后等待的秒数（给交易所生成新K线的时间）
+        :param decay: 每次预取后查看次数的衰减系数
+        :param workers: 并发预取的线程数
+        """
+        self.warm = warm
+        self.max_pairs = max_pairs
+        self.delay = delay
+        self.decay = decay
+        self.workers = workers
+        self._views = {}
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def record(self, symbol, interval, limit):
+        """记录一次查看（limit 取最近一次查看的值）"""
+        if interval not in INTERVAL_MS:
+            return
+        with self._lock:
+            view = self._views.get((symbol, interval))
+            new_interval = not any(key[1] == interval for key in self._views)
+            self._views[(symbol, interval)] = {'count': (view['count'] if view else 0) + 1, 'limit': limit}
+        # 出现新的周期时重新计算唤醒时间
+        if new_interval:
+            self._wakeup.set()
+
+    def top_pairs(self, interval):
+        """
+        :return: 该周期查看次数最多的 [(symbol, limit), ...]
+        """
+        with self._lock:
+            views = [(view['count'], symbol, view['limit'])
+                     for (symbol, view_interval), view in self._views.items() if view_interval == interval]
+        views.sort(reverse=True)
+        return [(symbol, limit) for _, symbol, limit in views[:self.max_pairs]]
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name='kline-prefetch', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._wakeup.set()
+
+    def _run(self):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while not self._stop.is_set():
+                with self._lock:
+                    intervals = {interval for _, interval in self._views}
+                now_ms = int(time.time() * 1000)
+                closes = {interval: next_close_time(interval, now_ms) for interval in intervals}
+
+                # 睡到最近的一次收盘；没有记录时一直等到第一次查看
+                self._wakeup.clear()
+                timeout = (min(closes.values()) - now_ms) / 1000 + self.delay if closes else None
+                if self._wakeup.wait(timeout):
+                    continue
+
+                now_ms = int(time.time() * 1000)
+                for interval in sorted(interval for interval, close in closes.items() if close <= now_ms):
+                    pairs = self.top_pairs(interval)
+                    list(pool.map(lambda pair: self._prefetch(pair[0], interval, pair[1]), pairs))
+                    self._decay(interval)
+
+    def _prefetch(self, symbol, interval, limit):
+        try:
+            self.warm(symbol, interval, limit)
+            PREFETCH_TOTAL.inc(interval=interval, status='ok')
+        except Exception as e:
+            print(f"预取 {symbol} {interval} 错误: {e}")
+            PREFETCH_TOTAL.inc(interval=interval, status='error')
+
+    def _decay(self, interval):
+        with self._lock:
+            for key in [key for key in self._views if key[1] == interval]:
+                self._views[key]['count'] *= self.decay
+                if self._views[key]['count'] < 0.01:
+                    del self._views[key]
@@ -0,0 +1,67 @@
+import threading
+import time
+
+
+# 现货 /api/v3/klines 的请求权重，与 limit 无关
+# （见 Binance 现货 REST API 文档 Market Data endpoints → Kline/Candlestick data；
+#  按 limit 分 1/2/5/10 档的是合约 /fapi/v1/klines 的权重表，不适用于现货接口）
+SPOT_KLINES_WEIGHT = 2
+
+
+def klines_weight(limit):
+    """
+    /api/v3/klines 的请求权重
+    :param limit: 返回数据条数（现货接口的权重不随 limit 变化）
+    :return: 权重
+    """
+    return SPOT_KLINES_WEIGHT
+
+
+class TokenBucket:
+    """
+    本地令牌桶，用于在客户端侧遵守Binance请求权重限制
+    令牌以 rate 个/秒 匀速补充，最多累积 capacity 个；每次请求按权重消耗令牌，不足时阻塞等待。
+    """
+
+    def __init__(self, capacity=6000, period=60.0):
+        """
+        :param capacity: 桶容量（每个周期允许的总权重），默认对应Binance的 6000/分钟
+        :param period: 补满整个桶所需的秒数
+        """
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def acquire(self, weight=1):
+        """
+        获取指定权重的令牌，不足时阻塞直到补充完成
+        :param weight: 本次请求的权重
+        :return: 等待的秒数
+        """
+        weight = min(weight, self.capacity)
+        waited = 0.0
+        while True:
+            with self._lock:
+                self._refill()
+                if self.tokens >= weight:
+                    self.tokens -= weight
+                    return waited
+                delay = (weight - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+    def sync(self, used_weight):
+        """
+        根据服务端返回的已用权重校正本地令牌数（服务端统计包含其他进程的请求）
+        :param used_weight: X-MBX-USED-WEIGHT-1M 响应头的值
+        """
+        with self._lock:
+            self._refill()
+            self.tokens = min(self.tokens, float(self.capacity - used_weight))
@@ -0,0 +1,150 @@
+import time
+
+import numpy as np
+import pandas as pd
+
+from binance_client import MAX_KLINES_PER_REQUEST
+from cache import LRUCache
+from kline_store import INTERVAL_MS, WEEK_OFFSET_MS, align_open_time
+
+# 聚合时求和的字段（存在时才聚合）
+SUM_COLUMNS = [
+    'volume', 'quote_asset_volume', 'number_of_trades',
+    'taker_buy_base_asset_volume', 'taker_buy_quote_asset_volume'
+]
+
+
+def can_resample(base_interval, interval):
+    """
+    判断 interval 能否由 base_interval 的K线精确聚合得到
+    （周期是基础周期的整数倍，且桶的对齐边界落在基础K线的开盘时间上）
+    """
+    if base_interval not in INTERVAL_MS or interval not in INTERVAL_MS:
+        return False
+    base_step = INTERVAL_MS[base_interval]
+    step = INTERVAL_MS[interval]
+    if step <= base_step or step % base_step:
+        return False
+    return interval != '1w' or WEEK_OFFSET_MS % base_step == 0
+
+
+def resample_klines(df, interval, drop_partial=True):
+    """
+    将K线聚合为更高周期，桶的划分与Binance一致（按UTC对齐，周线从周一开始）
+    开盘价取桶内第一根，最高/最低取极值，收盘价取最后一根，成交量等字段求和
+    :param df: 基础周期的K线数据，按时间排序
+    :param interval: 目标时间间隔
+    :param drop_partial: 丢弃从桶中间开始的第一根聚合K线（数据不完整，开盘价和高低点不准确）
+    :return: 聚合后的K线DataFrame
+    """
+    if df.empty:
+        return df.copy()
+
+    step = INTERVAL_MS[interval]
+    open_time = df['open_time'].to_numpy()
+    buckets = align_open_time(open_time, interval)
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(df)] - 1
+
+    result = {
+        'open_time': buckets[starts],
+        'open': df['open'].to_numpy()[starts],
+        'high': np.maximum.reduceat(df['high'].to_numpy(), starts),
+        'low': np.minimum.reduceat(df['low'].to_numpy(), starts),
+        'close': df['close'].to_numpy()[ends],
+        'close_time': buckets[starts] + step - 1,
+    }
+    for col in SUM_COLUMNS:
+        if col in df.columns:
+            result[col] = np.add.reduceat(df[col].to_numpy(), starts)
+
+    resampled = pd.DataFrame({col: result[col] for col in df.columns if col in result})
+    if drop_partial and open_time[0] != buckets[0]:
+        resampled = resampled.iloc[1:].reset_index(drop=True)
+    resampled['datetime'] = pd.to_datetime(resampled['open_time'], unit='ms')
+    return resampled
+
+
+class KlineResampler:
+    """
+    用一个基础周期的K线在本地派生更高周期，切换周期时不再逐个请求API
+    基础K线按交易对缓存到最新一根K线收盘；每个派生周期的聚合结果按基础数据版本缓存。
+    所需基础K线超过 max_base_bars 或周期无法派生时，直接向客户端请求该周期。
+    """
+
+    def __init__(self, client, base_interval='1h', max_base_bars=20000, cache=None):
+        """
+        :param client: BinanceClient
+        :param base_interval: 基础周期
+        :param max_base_bars: 单次派生允许获取的最大基础K线数量
+        :param cache: 结果缓存，默认新建
+        """
+        self.client = client
+        self.base_interval = base_interval
+        self.max_base_bars = max_base_bars
+        self.cache = cache or LRUCache('resampled', max_entries=256, max_bytes=256 * 1024 * 1024)
+
+    def get_klines(self, symbol, interval, limit, refresh=False):
+        """
+        获取最近 limit 根K线
+        :param refresh: 为True时忽略缓存，重新获取基础K线
+        :return: K线DataFrame，获取失败时返回None
+        """
+        if interval != self.base_interval and not can_resample(self.base_interval, interval):
+            return self.fetch(symbol, interval, limit)
+
+        ratio = INTERVAL_MS[interval] // INTERVAL_MS[self.base_interval]
+        # 多取一个桶，抵消第一根聚合K线不完整被丢弃的情况
+        base_bars = (limit + 1) * ratio if ratio > 1 else limit
+        if base_bars > self.max_base_bars:
+            return self.fetch(symbol, interval, limit)
+
+        base = self._get_base(symbol, base_bars, refresh)
+        if base is None:
+            return None
+        base_df, version, expires_at = base
+        if ratio == 1:
+            return base_df.tail(limit).reset_index(drop=True)
+
+        key = (symbol, interval)
+        cached = self.cache.get(key)
+        if cached is not None and cached[0] == version:
+            derived = cached[1]
+        else:
+            derived = resample_klines(base_df, interval)
+            self.cache.set(key, (version, derived), expires_at=expires_at)
+        return derived.tail(limit).reset_index(drop=True)
+
+    def _get_base(self, symbol, n_bars, refresh):
+        """
+        获取至少 n_bars 根基础K线（已缓存的数量足够时直接返回）
+        :return: (K线DataFrame, 数据版本, 过期时间戳)，获取失败时返回None
+        """
+        key = (symbol, self.base_interval)
+        cached = None if refresh else self.cache.get(key)
+        if cached is not None and cached[1] >= n_bars:
+            return cached[0]
+
+        df = self.fetch(symbol, self.base_interval, n_bars)
+        if df is None or df.empty:
+            return None
+        version = (int(df['open_time'].iloc[0]), int(df['open_time'].iloc[-1]), len(df),
+                   float(df['close'].iloc[-1]))
+        expires_at = (int(df['close_time'].iloc[-1]) + 1) / 1000
+        base = (df, version, expires_at)
+        self.cache.set(key, (base, n_bars), expires_at=expires_at)
+        return base
+
+    def fetch(self, symbol, interval, limit):
+        """
+        直接向客户端请求最近 limit 根K线
+        启用本地存储时由 get_klines 自动分页补齐；否则超过单次请求上限时按时间范围分页回补
+        """
+        if limit <= MAX_KLINES_PER_REQUEST or interval not in INTERVAL_MS or self.client.store is not None:
+            return self.client.get_klines(symbol, interval, limit)
+
+        start_time = int(time.time() * 1000) - limit * INTERVAL_MS[interval]
+        df = self.client.get_klines_range(symbol, interval, start_time)
+        if df is not None:
+            df = df.tail(limit).reset_index(drop=True)
+        return df
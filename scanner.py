@@ -0,0 +1,161 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, ThreadPoolExecutor, wait
+
+import pandas as pd
+
+from binance_client import BinanceClient
+from indicators import add_all_indicators, current_convergence_zone, detect_line_convergence
+
+# 排名表的列顺序
+RESULT_COLUMNS = [
+    'symbol', 'interval', 'in_convergence', 'type', 'convergence_strength',
+    'zone_bars', 'max_diff_pct', 'close', 'bars'
+]
+
+
+def analyze_closes(symbol, interval, closes, tolerance):
+    """
+    计算单个 (交易对, 时间间隔) 当前的均线密集状态（在进程池中执行）
+    :param symbol: 交易对符号
+    :param interval: 时间间隔
+    :param closes: 收盘价数组
+    :param tolerance: 密集容差（小数，如0.03）
+    :return: 结果字典
+    """
+    df = add_all_indicators(pd.DataFrame({'close': closes}))
+    convergences = detect_line_convergence(df, tolerance)
+    zone = current_convergence_zone(convergences, len(df) - 1)
+
+    result = {
+        'symbol': symbol,
+        'interval': interval,
+        'in_convergence': zone is not None,
+        'type': None,
+        'convergence_strength': 0.0,
+        'zone_bars': 0,
+        'max_diff_pct': None,
+        'close': float(closes[-1]) if len(closes) else None,
+        'bars': len(closes),
+    }
+    if zone is not None:
+        latest = convergences.iloc[-1]
+        result.update({
+            'type': zone['type'],
+            'convergence_strength': float(latest['convergence_strength']),
+            'zone_bars': zone['length'],
+            'max_diff_pct': float(latest['max_diff_pct']),
+        })
+    return result
+
+
+def rank_results(results):
+    """
+    按当前密集强度、密集持续K线数排序
+    :param results: analyze_closes 的结果列表
+    :return: 排名后的DataFrame
+    """
+    if not results:
+        return pd.DataFrame(columns=RESULT_COLUMNS)
+    ranked = pd.DataFrame(results, columns=RESULT_COLUMNS)
+    ranked = ranked.sort_values(
+        ['in_convergence', 'convergence_strength', 'zone_bars'], ascending=False
+    )
+    return ranked.reset_index(drop=True)
+
+
+def scan(client, symbols, intervals, limit=500, tolerance=0.03, fetch_workers=8, compute_workers=None,
+         on_result=None):
+    """
+    并发扫描多个交易对、多个时间间隔的均线密集状态
+    K线在线程池中并发获取（共享客户端的连接池和权重限速），指标计算在进程池中并行执行。
+    :param client: BinanceClient
+    :param symbols: 交易对符号列表
+    :param intervals: 时间间隔列表
+    :param limit: 每个组合获取的K线数量
+    :param tolerance: 密集容差（小数）
+    :param fetch_workers: 并发请求线程数
+    :param compute_workers: 计算进程数，默认为CPU核数
+    :param on_result: 每得到一个结果时的回调，用于流式输出
+    :return: 排名后的DataFrame
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=fetch_workers) as fetch_pool, \
+            ProcessPoolExecutor(max_workers=compute_workers) as compute_pool:
+        fetches = {
+            fetch_pool.submit(client.get_klines, symbol, interval, limit): (symbol, interval)
+            for symbol in symbols for interval in intervals
+        }
+        # 获取和计算的任务在同一个循环中等待：每个组合的K线一到就提交计算，计算完成即输出结果，
+        # 不必等全部K线获取完成
+        pending = set(fetches)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future in fetches:
+                    symbol, interval = fetches[future]
+                    df = future.result()
+                    if df is None or df.empty:
+                        print(f"跳过 {symbol} {interval}: 无法获取数据", file=sys.stderr)
+                        continue
+                    pending.add(compute_pool.submit(
+                        analyze_closes, symbol, interval, df['close'].to_numpy(), tolerance
+                    ))
+                else:
+                    result = future.result()
+                    results.append(result)
+                    if on_result is not None:
+                        on_result(result)
+
+    return rank_results(results)
+
+
+def load_symbols(client, symbols_file=None):
+    """
+    读取交易对列表：指定文件时每行一个交易对（#开头为注释），否则使用 get_all_symbols
+    """
+    if symbols_file:
+        with open(symbols_file) as f:
+            return [line.strip() for line in f if line.strip() and not line.startswith('#')]
+    return [symbol['symbol'] for symbol in client.get_all_symbols()]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="多交易对、多周期均线密集扫描")
+    parser.add_argument('--symbols-file', help="交易对列表文件，每行一个；默认使用全部USDT交易对")
+    parser.add_argument('--intervals', nargs='+', default=['1h', '4h', '1d', '1w'])
+    parser.add_argument('--limit', type=int, default=500, help="每个组合获取的K线数量")
+    parser.add_argument('--tolerance', type=float, default=3.0, help="密集容差(%%)")
+    parser.add_argument('--fetch-workers', type=int, default=8)
+    parser.add_argument('--compute-workers', type=int, default=None)
+    parser.add_argument('--stream', action='store_true', help="每完成一个组合即输出一行JSON")
+    parser.add_argument('--top', type=int, default=None, help="只输出排名前N的结果")
+    parser.add_argument('--store-dir', default=os.environ.get('KLINE_STORE_DIR'),
+                        help="本地K线存储目录")
+    args = parser.parse_args()
+
+    client = BinanceClient(store_dir=args.store_dir)
+    symbols = load_symbols(client, args.symbols_file)
+
+    on_result = None
+    if args.stream:
+        on_result = lambda result: print(json.dumps(result, ensure_ascii=False), flush=True)
+
+    start = time.perf_counter()
+    ranked = scan(client, symbols, args.intervals, args.limit, args.tolerance / 100,
+                  args.fetch_workers, args.compute_workers, on_result)
+    elapsed = time.perf_counter() - start
+
+    if not args.stream:
+        if args.top:
+            ranked = ranked.head(args.top)
+        print(ranked.to_string(index=False))
+    print(f"扫描 {len(symbols)} 个交易对 x {len(args.intervals)} 个周期，耗时 {elapsed:.2f}s",
+          file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,201 @@
+import hashlib
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    # 非Unix平台没有 flock，只在进程内加锁
+    fcntl = None
+
+
+class SharedCache:
+    """
+    多进程共享的结果缓存（SQLite，WAL模式）
+    同一台机器上的多个 worker 进程（如 gunicorn）共用一个数据库文件，值用 pickle 序列化；
+    get_or_compute 通过文件锁保证同一时间只有一个进程在计算某个键，
+    其他进程等待锁释放后直接读取结果。键按哈希分到固定数量的锁分段上（键中含数据版本，
+    不断产生新键），锁对象和锁文件的数量不随键增长。接口与 LRUCache 保持一致（get/set/invalidate/clear/stats）。
+    """
+
+    def __init__(self, path, name='shared', max_bytes=1024 * 1024 * 1024, default_ttl=None, lock_timeout=30,
+                 lock_stripes=256):
+        """
+        :param path: 数据库文件路径，锁文件放在同名的 .locks 目录下
+        :param name: 缓存名称（用于统计输出）
+        :param max_bytes: 序列化后的总大小上限，超出时淘汰最早写入的条目
+        :param default_ttl: 默认存活秒数，None表示不过期
+        :param lock_timeout: 等待其他进程计算的最长秒数，超时后自行计算
+        :param lock_stripes: 锁分段数量（不同的键可能共用一个分段，只会多等待，不影响正确性）
+        """
+        self.path = path
+        self.name = name
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self.lock_stripes = lock_stripes
+        self.lock_dir = f'{path}.locks'
+        os.makedirs(self.lock_dir, exist_ok=True)
+        self._local = threading.local()
+        self._thread_locks = [threading.Lock() for _ in range(lock_stripes)]
+        self._lock = threading.Lock()
+        self._stats = {'hits': 0, 'misses': 0, 'expired': 0, 'evictions': 0, 'lock_waits': 0}
+
+        conn = self._connection()
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('CREATE TABLE IF NOT EXISTS entries ('
+                     'key TEXT PRIMARY KEY, value BLOB, expires_at REAL, size INTEGER, stored_at REAL)')
+        conn.execute('CREATE INDEX IF NOT EXISTS entries_stored_at ON entries (stored_at)')
+
+    def _connection(self):
+        """每个线程使用自己的连接（sqlite3 连接不能跨线程共用）"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.lock_timeout, isolation_level=None)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            self._local.conn = conn
+        return conn
+
+    def _record(self, field, amount=1):
+        with self._lock:
+            self._stats[field] += amount
+
+    @staticmethod
+    def _key(key):
+        return repr(key)
+
+    def _read(self, key):
+        """
+        :return: (值, 状态)，状态为 hit / miss / expired，未命中时值为None
+        """
+        row = self._connection().execute(
+            'SELECT value, expires_at FROM entries WHERE key = ?', (self._key(key),)).fetchone()
+        if row is None:
+            return None, 'miss'
+        value, expires_at = row
+        if expires_at is not None and time.time() >= expires_at:
+            self.invalidate(key)
+            return None, 'expired'
+        return pickle.loads(value), 'hit'
+
+    def get(self, key, default=None):
+        value, status = self._read(key)
+        if status == 'hit':
+            self._record('hits')
+            return value
+        if status == 'expired':
+            self._record('expired')
+        self._record('misses')
+        return default
+
+    def set(self, key, value, ttl=None, expires_at=None):
+        """
+        写入缓存
+        :param ttl: 存活秒数，默认使用 default_ttl
+        :param expires_at: 绝对过期时间戳（秒），优先于 ttl
+        """
+        if expires_at is None:
+            ttl = self.default_ttl if ttl is None else ttl
+            expires_at = time.time() + ttl if ttl is not None else None
+        data = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        # 单个条目超过上限时不缓存
+        if len(data) > self.max_bytes:
+            return
+
+        conn = self._connection()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)',
+                         (self._key(key), data, expires_at, len(data), now))
+            conn.execute('DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?', (now,))
+            total = conn.execute('SELECT COALESCE(SUM(size), 0) FROM entries').fetchone()[0]
+            evicted = 0
+            while total > self.max_bytes:
+                key_, size = conn.execute('SELECT key, size FROM entries ORDER BY stored_at LIMIT 1').fetchone()
+                conn.execute('DELETE FROM entries WHERE key = ?', (key_,))
+                total -= size
+                evicted += 1
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        if evicted:
+            self._record('evictions', evicted)
+
+    def invalidate(self, key):
+        self._connection().execute('DELETE FROM entries WHERE key = ?', (self._key(key),))
+
+    def clear(self):
+        self._connection().execute('DELETE FROM entries')
+
+    @contextmanager
+    def lock(self, key):
+        """
+        按键所在的分段加跨进程的排他锁（flock），等待超过 lock_timeout 后不再等待
+        """
+        stripe = int(hashlib.sha1(self._key(key).encode()).hexdigest(), 16) % self.lock_stripes
+        # flock 对同一进程内的多个线程不互斥，先加进程内的锁
+        thread_lock = self._thread_locks[stripe]
+        acquired = thread_lock.acquire(timeout=self.lock_timeout)
+        f = None
+        try:
+            if fcntl is not None:
+                f = open(os.path.join(self.lock_dir, f'{stripe}.lock'), 'a')
+                deadline = time.time() + self.lock_timeout
+                while True:
+                    try:
+                        fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.time() >= deadline:
+                            print(f"等待共享缓存锁超时: {key}")
+                            break
+                        time.sleep(0.05)
+            yield
+        finally:
+            if f is not None:
+                # 关闭文件即释放 flock
+                f.close()
+            if acquired:
+                thread_lock.release()
+
+    def get_or_compute(self, key, compute, refresh=False):
+        """
+        读取缓存，未命中时在锁内计算并写入；其他进程同时请求同一个键时等待并复用结果
+        :param compute: 无参函数，返回 (值, 过期时间戳)；值为None时不缓存
+        :param refresh: 为True时忽略已有的缓存重新计算
+        :return: 缓存或计算得到的值
+        """
+        if not refresh:
+            value = self.get(key)
+            if value is not None:
+                return value
+
+        with self.lock(key):
+            if not refresh:
+                # 等锁期间其他进程可能已经写入
+                value, _ = self._read(key)
+                if value is not None:
+                    self._record('lock_waits')
+                    return value
+            value, expires_at = compute()
+            if value is not None:
+                self.set(key, value, expires_at=expires_at)
+            return value
+
+    def stats(self):
+        """
+        :return: 统计数据快照：命中等计数为本进程的统计，条目数和大小为所有进程共享的数据
+        """
+        with self._lock:
+            stats = dict(self._stats)
+        stats['entries'], stats['bytes'] = self._connection().execute(
+            'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries').fetchone()
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_rate'] = stats['hits'] / lookups if lookups else 0.0
+        return stats
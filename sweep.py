@@ -0,0 +1,153 @@
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
+
+import numpy as np
+import pandas as pd
+
+from binance_client import BinanceClient
+from indicators import DEFAULT_PERIODS, batch_ema, batch_ma, line_spread_array
+from scanner import load_symbols
+
+# 汇总表的列顺序
+SWEEP_COLUMNS = ['periods', 'tolerance', 'frequency', 'zones', 'avg_zone_bars', 'series']
+
+# 默认扫描的周期组合（每个组合同时作为MA和EMA的周期）
+DEFAULT_PERIOD_SETS = [
+    [10, 30, 60], [20, 50, 100], DEFAULT_PERIODS, [20, 60, 200], [30, 90, 180], [50, 100, 200]
+]
+
+
+def score_series(closes, period_sets, tolerances):
+    """
+    统计一条收盘价序列在每个 (周期组合, 容差) 下的均线密集情况（在进程池中执行）
+    所有组合用到的周期只批量计算一次；同一组合的多个容差共用一次离散度计算
+    :param closes: 收盘价数组
+    :param period_sets: 周期组合列表
+    :param tolerances: 容差列表（小数）
+    :return: 结果字典列表，frequency 为密集K线占有效K线的比例，zones 为连续密集区域数量
+    """
+    periods = sorted({period for period_set in period_sets for period in period_set})
+    row_of = {period: row for row, period in enumerate(periods)}
+    ma = batch_ma(closes, periods)
+    ema = batch_ema(closes, periods)
+    tolerances = np.asarray(tolerances, dtype=float)
+
+    results = []
+    for period_set in period_sets:
+        rows = [row_of[period] for period in period_set]
+        spread = line_spread_array(np.vstack([ma[rows], ema[rows]]).T)
+        valid_bars = int((~np.isnan(spread)).sum())
+
+        # 每行对应一个容差；NaN 与任何阈值比较都为False
+        mask = spread[None, :] <= tolerances[:, None]
+        convergence_bars = mask.sum(axis=1)
+        zones = mask[:, 0] + (mask[:, 1:] & ~mask[:, :-1]).sum(axis=1)
+
+        for tolerance, bars, zone_count in zip(tolerances, convergence_bars, zones):
+            results.append({
+                'periods': ','.join(str(period) for period in period_set),
+                'tolerance': float(tolerance),
+                'frequency': float(bars / valid_bars) if valid_bars else 0.0,
+                'zones': int(zone_count),
+                'avg_zone_bars': float(bars / zone_count) if zone_count else 0.0,
+            })
+    return results
+
+
+def summarize(results):
+    """
+    按 (周期组合, 容差) 汇总所有序列的结果，按密集频率排序
+    :param results: score_series 的结果列表
+    :return: 汇总后的DataFrame
+    """
+    if not results:
+        return pd.DataFrame(columns=SWEEP_COLUMNS)
+    summary = pd.DataFrame(results).groupby(['periods', 'tolerance'], sort=False).agg(
+        frequency=('frequency', 'mean'),
+        zones=('zones', 'mean'),
+        avg_zone_bars=('avg_zone_bars', 'mean'),
+        series=('frequency', 'size'),
+    ).reset_index()
+    return summary[SWEEP_COLUMNS].sort_values('frequency', ascending=False).reset_index(drop=True)
+
+
+def sweep(series, period_sets, tolerances, workers=None):
+    """
+    在全部CPU核上并行扫描参数网格
+    每条序列的周期组合按进程数切块，单条序列也能用满所有核
+    :param series: {名称: 收盘价数组}
+    :param period_sets: 周期组合列表
+    :param tolerances: 容差列表（小数）
+    :param workers: 进程数，默认为CPU核数
+    :return: 汇总后的DataFrame
+    """
+    workers = workers or os.cpu_count() or 1
+    chunk_size = -(-len(period_sets) // max(1, workers // max(1, len(series))))
+    chunks = [period_sets[i:i + chunk_size] for i in range(0, len(period_sets), chunk_size)]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            pool.submit(score_series, closes, chunk, tolerances)
+            for closes in series.values() for chunk in chunks
+        ]
+        for future in as_completed(futures):
+            results.extend(future.result())
+    return summarize(results)
+
+
+def fetch_closes(client, symbols, interval, limit, fetch_workers=8):
+    """
+    并发获取各交易对的收盘价
+    :return: {交易对: 收盘价数组}
+    """
+    series = {}
+    with ThreadPoolExecutor(max_workers=fetch_workers) as pool:
+        futures = {pool.submit(client.get_klines, symbol, interval, limit): symbol for symbol in symbols}
+        for future in as_completed(futures):
+            df = future.result()
+            if df is None or df.empty:
+                print(f"跳过 {futures[future]}: 无法获取数据", file=sys.stderr)
+                continue
+            series[futures[future]] = df['close'].to_numpy()
+    return series
+
+
+def parse_period_set(text):
+    """'20,60,120' -> [20, 60, 120]"""
+    return [int(period) for period in text.split(',') if period]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="均线周期组合与密集容差的参数扫描")
+    parser.add_argument('--symbols-file', help="交易对列表文件，每行一个；默认使用全部USDT交易对")
+    parser.add_argument('--interval', default='4h')
+    parser.add_argument('--limit', type=int, default=1000, help="每个交易对获取的K线数量")
+    parser.add_argument('--period-sets', type=parse_period_set, nargs='+', default=DEFAULT_PERIOD_SETS,
+                        help="周期组合，如 20,60,120 10,30,60")
+    parser.add_argument('--tolerances', type=float, nargs='+', default=[1.0, 2.0, 3.0, 5.0], help="密集容差(%%)")
+    parser.add_argument('--workers', type=int, default=None, help="计算进程数，默认为CPU核数")
+    parser.add_argument('--top', type=int, default=None, help="只输出排名前N的结果")
+    parser.add_argument('--store-dir', default=os.environ.get('KLINE_STORE_DIR'), help="本地K线存储目录")
+    args = parser.parse_args()
+
+    client = BinanceClient(store_dir=args.store_dir)
+    symbols = load_symbols(client, args.symbols_file)
+    series = fetch_closes(client, symbols, args.interval, args.limit)
+
+    start = time.perf_counter()
+    summary = sweep(series, args.period_sets, [tolerance / 100 for tolerance in args.tolerances], args.workers)
+    elapsed = time.perf_counter() - start
+
+    if args.top:
+        summary = summary.head(args.top)
+    print(summary.to_string(index=False))
+    print(f"{len(series)} 个交易对 x {len(args.period_sets)} 个周期组合 x {len(args.tolerances)} 个容差，"
+          f"计算耗时 {elapsed:.2f}s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
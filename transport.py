@@ -0,0 +1,157 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import API_REQUEST_SECONDS, API_RESPONSE_BYTES, API_USED_WEIGHT, API_WEIGHT
+from rate_limiter import TokenBucket
+
+# 可重试的HTTP状态码：429为触发限频，5xx为服务端临时错误
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+
+
+class HttpTransport:
+    """
+    Binance REST 请求的共享传输层
+    - 连接池 + keep-alive 的 requests.Session，避免每次请求重新握手
+    - 可配置的连接/读取超时
+    - 对网络错误、429 和 5xx 做带抖动的指数退避重试（优先遵守 Retry-After）
+    - 解析 X-MBX-USED-WEIGHT-1M 响应头，同步到本地令牌桶，在触及限额之前主动限速
+    - 统计请求数、重试数、错误数和延迟
+    """
+
+    def __init__(self, base_url="https://api.binance.com", timeout=(3.05, 10), max_retries=3,
+                 backoff_base=0.5, backoff_max=8.0, weight_limit=6000, weight_headroom=0.9,
+                 pool_size=10):
+        """
+        :param base_url: API地址
+        :param timeout: (连接超时, 读取超时) 秒
+        :param max_retries: 最大重试次数
+        :param backoff_base: 指数退避的初始等待秒数
+        :param backoff_max: 单次退避的最长等待秒数
+        :param weight_limit: 每分钟请求权重上限
+        :param weight_headroom: 允许使用的权重比例，为其他进程/突发留出余量
+        :param pool_size: 连接池大小
+        """
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.rate_limiter = TokenBucket(capacity=int(weight_limit * weight_headroom))
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {
+            'requests': 0,
+            'retries': 0,
+            'errors': 0,
+            'latency_total': 0.0,
+            'latency_max': 0.0,
+            'throttle_seconds': 0.0,
+            'used_weight': 0,
+        }
+
+    def _record(self, **changes):
+        with self._stats_lock:
+            for key, value in changes.items():
+                if key == 'latency':
+                    self._stats['latency_total'] += value
+                    self._stats['latency_max'] = max(self._stats['latency_max'], value)
+                elif key == 'used_weight':
+                    self._stats['used_weight'] = value
+                else:
+                    self._stats[key] += value
+
+    def stats(self):
+        """
+        :return: 统计数据快照（含平均延迟）
+        """
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['latency_avg'] = stats['latency_total'] / stats['requests'] if stats['requests'] else 0.0
+        return stats
+
+    def _backoff(self, attempt, response=None):
+        """计算第 attempt 次重试前的等待秒数"""
+        if response is not None and response.headers.get('Retry-After'):
+            try:
+                return float(response.headers['Retry-After'])
+            except ValueError:
+                pass
+        delay = min(self.backoff_max, self.backoff_base * 2 ** attempt)
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def get_json(self, endpoint, params=None, weight=1):
+        """
+        发送GET请求并返回解析后的JSON
+        :param endpoint: 接口路径，如 '/api/v3/klines'
+        :param params: 查询参数
+        :param weight: 本次请求的权重
+        :return: 响应JSON
+        :raises requests.exceptions.RequestException: 重试耗尽后仍失败
+        """
+        return self._get(endpoint, params, weight).json()
+
+    def get_content(self, endpoint, params=None, weight=1):
+        """
+        发送GET请求并返回原始响应内容，由调用方自行解析（如K线数据直接解析为NumPy数组）
+        :return: 响应内容 bytes
+        :raises requests.exceptions.RequestException: 重试耗尽后仍失败
+        """
+        return self._get(endpoint, params, weight).content
+
+    def _get(self, endpoint, params, weight):
+        """带限速和重试的GET请求，返回成功的响应对象"""
+        url = self.base_url + endpoint
+        attempt = 0
+        while True:
+            waited = self.rate_limiter.acquire(weight)
+            if waited:
+                self._record(throttle_seconds=waited)
+
+            start = time.perf_counter()
+            response = None
+            try:
+                response = self.session.get(url, params=params, timeout=self.timeout)
+                error = None
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            latency = time.perf_counter() - start
+            self._record(requests=1, latency=latency)
+            API_REQUEST_SECONDS.observe(latency, endpoint=endpoint,
+                                        status='error' if response is None else response.status_code)
+            API_WEIGHT.inc(weight, endpoint=endpoint)
+
+            if response is not None:
+                API_RESPONSE_BYTES.observe(len(response.content), endpoint=endpoint)
+                used_weight = response.headers.get('X-MBX-USED-WEIGHT-1M')
+                if used_weight is not None and used_weight.isdigit():
+                    self._record(used_weight=int(used_weight))
+                    self.rate_limiter.sync(int(used_weight))
+                    API_USED_WEIGHT.set(int(used_weight))
+
+            retryable = error is not None or response.status_code in RETRY_STATUS_CODES
+            if not retryable:
+                try:
+                    response.raise_for_status()
+                except requests.exceptions.HTTPError:
+                    self._record(errors=1)
+                    raise
+                return response
+
+            if attempt >= self.max_retries:
+                self._record(errors=1)
+                if error is not None:
+                    raise error
+                response.raise_for_status()
+
+            time.sleep(self._backoff(attempt, response))
+            attempt += 1
+            self._record(retries=1)